@@ -1,33 +1,258 @@
-from flask import Flask, request, jsonify, send_file
+from flask import Flask, request, jsonify, send_file, Response, g
 from flask_cors import CORS
 import pandas as pd
+import numpy as np
 import os
+from werkzeug.exceptions import ClientDisconnected
 from werkzeug.utils import secure_filename
 from datetime import datetime
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from openpyxl import load_workbook
+from openpyxl.utils.exceptions import InvalidFileException
+from pandas.io.parsers import TextParser
+from pyarrow import feather as pa_feather, ipc as pa_ipc, json as pa_json
+import bisect
+import csv
+import hashlib
+import io
 import json
+import logging
+import pickle
+import re
+import shutil
+import threading
+import time
+import uuid
+import zipfile
+import zlib
 
 app = Flask(__name__)
 CORS(app)
 
+# Levelled logging; set LOG_LEVEL=DEBUG for sheet dumps and per-stage detail
+logging.basicConfig(level=os.environ.get('LOG_LEVEL', 'INFO').upper(),
+                    format='%(asctime)s %(levelname)s [%(process)d] %(message)s')
+logger = logging.getLogger('sellersuite')
+
 # Configuration
 UPLOAD_FOLDER = 'uploads'
 OUTPUT_FOLDER = 'output'
-ALLOWED_EXTENSIONS = {'csv', 'xlsx', 'xls'}
+DATASET_FOLDER = 'datasets'  # Parsed uploads, kept server-side under a dataset id
+PARSE_CACHE_FOLDER = 'parse_cache'  # Parse results keyed by file content hash
+PARTIALS_FOLDER = 'partials'  # Monthly B2CS/B2B partial sums per GSTIN, merged into period summaries
+UPLOAD_SESSION_FOLDER = 'upload_sessions'  # Chunked uploads in progress, one folder per upload id
+ALLOWED_EXTENSIONS = {'csv', 'xlsx'}  # openpyxl reads .xlsx only; legacy .xls has no reader here
+
+# Bump whenever parser output changes, so cached parses from older code are not reused
+PARSER_VERSION = 7
+PARSE_CACHE_MAX_BYTES = 1024 * 1024 * 1024  # 1GB
+
+# Stored datasets unused for this long are removed; past the size cap the least recently
+# used go first, like parse cache entries
+DATASET_RETENTION_SECONDS = 30 * 24 * 60 * 60
+DATASET_MAX_BYTES = 5 * 1024 * 1024 * 1024  # 5GB
+
+# Background jobs: worker processes for parsing (one per core; set JOB_WORKERS lower on
+# small hosts), and how long finished jobs stay queryable
+JOB_WORKERS = int(os.environ.get('JOB_WORKERS', os.cpu_count() or 1))
+JOB_RETENTION_SECONDS = 60 * 60
+
+# Generated files in OUTPUT_FOLDER are removed once they are older than this
+OUTPUT_RETENTION_SECONDS = 24 * 60 * 60
+
+# Chunked uploads: the largest file accepted, the chunk size clients are asked to send,
+# and how long an unfinished upload is kept for resuming after its last chunk
+MAX_CHUNKED_UPLOAD_BYTES = 5 * 1024 * 1024 * 1024  # 5GB
+UPLOAD_CHUNK_BYTES = 8 * 1024 * 1024
+UPLOAD_SESSION_RETENTION_SECONDS = 24 * 60 * 60
+
+# Rows encoded per chunk when streaming a CSV export into the response
+EXPORT_CHUNK_ROWS = 20000
+
+# Encoded bytes collected before a streamed JSON export hands them to the response
+EXPORT_BUFFER_BYTES = 64 * 1024
+
+# Offline tool format version written into GSTR-1 JSON exports
+GSTR1_JSON_VERSION = 'GST3.0.4'
+
+# GSTR-1 JSON invoice type codes for the B2B invoice types in the CSV
+GSTR1_INVOICE_TYPES = {
+    'Regular B2B': 'R',
+    'Regular': 'R',
+    'SEZ supplies with payment': 'SEWP',
+    'SEZ supplies without payment': 'SEWOP',
+    'Deemed Exp': 'DE'
+}
+
+# Request body types /api/generate-csv loads straight into a DataFrame, besides JSON
+NDJSON_TYPES = {'application/x-ndjson', 'application/jsonl', 'application/jsonlines'}
+ARROW_FILE_TYPES = {'application/vnd.apache.arrow.file', 'application/x-feather'}
+ARROW_STREAM_TYPES = {'application/vnd.apache.arrow.stream'}
+
+# Bytes of NDJSON parsed per block; blocks are read off the request as they arrive
+NDJSON_BLOCK_BYTES = 1024 * 1024
+
+# Upper bounds (seconds) of the latency histogram buckets reported by /api/metrics
+LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60]
 
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(OUTPUT_FOLDER, exist_ok=True)
+os.makedirs(DATASET_FOLDER, exist_ok=True)
+os.makedirs(PARSE_CACHE_FOLDER, exist_ok=True)
+os.makedirs(PARTIALS_FOLDER, exist_ok=True)
+os.makedirs(UPLOAD_SESSION_FOLDER, exist_ok=True)
 
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
-app.config['MAX_CONTENT_LENGTH'] = 50 * 1024 * 1024  # 50MB max file size
+app.config['MAX_CONTENT_LENGTH'] = 500 * 1024 * 1024  # 500MB max file size
 
-# Portal report frequency mapping
-PORTAL_FREQUENCY = {
-    'amazon': 'quarterly',      # Amazon provides quarterly reports
-    'flipkart': 'monthly',      # Flipkart provides monthly reports
-    'pepperfry': 'monthly',     # Pepperfry provides monthly reports
-    'custom': 'monthly'         # Default to monthly
+# What openpyxl raises for files that aren't .xlsx workbooks, or are damaged ones
+UNREADABLE_WORKBOOK_ERRORS = (zipfile.BadZipFile, InvalidFileException, KeyError)
+
+# Files at least this large are parsed in streaming mode, in chunks of STREAM_CHUNK_ROWS rows
+STREAMING_THRESHOLD = 25 * 1024 * 1024
+STREAM_CHUNK_ROWS = 50000
+
+# Rows read from the top of a sheet when probing a workbook or looking for its GSTIN
+PROBE_ROWS = 20
+# Most rows /api/probe returns per sheet when asked for more
+PROBE_MAX_ROWS = 1000
+
+# CSV reports are read in chunks of this many rows, so memory stays flat however large the file
+CSV_CHUNK_ROWS = 200000
+
+# Report column names tried, in order, for each invoice record column of generic reports
+CUSTOM_REPORT_COLUMNS = {
+    'invoice_date': ['Invoice Date', 'Date', 'Order Date', 'Bill Date'],
+    'invoice_no': ['Invoice No', 'Invoice Number', 'Invoice ID', 'Order ID', 'Bill No'],
+    'hsn_code': ['HSN', 'HSN Code', 'HSN/SAC'],
+    'product_name': ['Description', 'Product Name', 'Product', 'Item', 'Product Title'],
+    'quantity': ['Quantity', 'Qty'],
+    'taxable_value': ['Taxable Value', 'Taxable Amount', 'Net Amount', 'Selling Price'],
+    'cgst_rate': ['CGST Rate', 'CGST %'],
+    'sgst_rate': ['SGST Rate', 'SGST %'],
+    'igst_rate': ['IGST Rate', 'IGST %'],
+    'gst_rate': ['GST Rate', 'GST %', 'Tax Rate', 'Rate'],
+    'cgst_amount': ['CGST', 'CGST Amount'],
+    'sgst_amount': ['SGST', 'SGST Amount'],
+    'igst_amount': ['IGST', 'IGST Amount'],
+    'total_amount': ['Total', 'Total Amount', 'Invoice Value', 'Invoice Amount'],
+    'place_of_supply': ['Place Of Supply', 'POS', 'State', 'Ship To State'],
+    'seller_gstin': ['Seller GSTIN', 'Merchant GSTIN', 'Supplier GSTIN', 'GSTIN']
 }
 
+# Declarative report schemas, one per portal. Each is compiled into a vectorized
+# invoice extractor (compile_portal_schema), so adding a portal is configuration:
+#   label        portal name written into the records
+#   frequency    how often the portal issues reports ('monthly' or 'quarterly')
+#   sheets       sheet-match rules tried in order: the first sheet whose lower-cased
+#                name contains every word in 'match' is read, skipping 'skiprows'
+#                rows above its header; otherwise the first sheet is read
+#   columns      invoice record column -> report column name(s), matched ignoring
+#                case, spaces and underscores; 'gst_rate' names a whole GST rate,
+#                split per row into CGST + SGST or IGST by the row's tax amounts, or
+#                else by its place of supply against 'seller_gstin'
+#   required     record column a row must have to count as an invoice
+#   rates        'from_amounts' (derive rates from tax amounts), 'percent',
+#                'fraction' (0.18 means 18%) or 'auto' (values below 1 are fractions)
+#   dayfirst     whether ambiguous dates are day-first (31/01 vs 01/31)
+#   ready_to_file  Amazon Ready to File extras: aggregated B2C Small layout, B2B
+#                sheet and Merchant GSTIN
+PORTAL_SCHEMAS = {
+    'amazon': {
+        'label': 'Amazon',
+        'frequency': 'quarterly',
+        'sheets': [{'match': ['b2c', 'small'], 'skiprows': 2}],
+        # Second names are the Merchant Tax Report (MTR) CSV headers
+        'columns': {
+            'invoice_date': 'Invoice Date',
+            'invoice_no': ['Invoice No', 'Invoice Number'],
+            'hsn_code': ['HSN', 'Hsn/sac'],
+            'product_name': ['Description', 'Item Description'],
+            'quantity': 'Quantity',
+            'taxable_value': ['Taxable Value', 'Tax Exclusive Gross'],
+            'cgst_amount': ['CGST', 'Cgst Tax'],
+            'sgst_amount': ['SGST', 'Sgst Tax'],
+            'igst_amount': ['IGST', 'Igst Tax'],
+            'total_amount': ['Total', 'Invoice Amount'],
+            'place_of_supply': ['Place Of Supply', 'Ship To State']
+        },
+        'required': 'invoice_date',
+        'rates': 'from_amounts',
+        'dayfirst': False,
+        'ready_to_file': True
+    },
+    'flipkart': {
+        'label': 'Flipkart',
+        'frequency': 'monthly',
+        'sheets': [{'match': ['sales'], 'skiprows': 0}],
+        'columns': {
+            'invoice_date': 'date',
+            'invoice_no': 'invoice_id',
+            'hsn_code': 'hsn',
+            'product_name': 'product_title',
+            'quantity': 'quantity',
+            'taxable_value': 'selling_price',
+            'cgst_rate': 'cgst',
+            'sgst_rate': 'sgst',
+            'igst_rate': 'igst',
+            'cgst_amount': 'cgst_value',
+            'sgst_amount': 'sgst_value',
+            'igst_amount': 'igst_value',
+            'total_amount': 'total_price',
+            'place_of_supply': ['place_of_supply', 'state']
+        },
+        'required': 'invoice_date',
+        'rates': 'percent',
+        'dayfirst': True
+    },
+    'pepperfry': {
+        'label': 'Pepperfry',
+        'frequency': 'monthly',
+        'sheets': [],
+        'columns': CUSTOM_REPORT_COLUMNS,
+        'required': 'taxable_value',
+        'rates': 'auto',
+        'dayfirst': True
+    },
+    'custom': {
+        'label': 'Custom',
+        'frequency': 'monthly',
+        'sheets': [],
+        'columns': CUSTOM_REPORT_COLUMNS,
+        'required': 'taxable_value',
+        'rates': 'auto',
+        'dayfirst': True
+    }
+}
+
+# Schema columns read as text from CSV reports; the others are read as floats
+INVOICE_TEXT_COLUMNS = {'invoice_date', 'invoice_no', 'hsn_code', 'product_name', 'place_of_supply', 'seller_gstin'}
+
+# GSTR-1 B2B CSV columns read by extract_amazon_b2b, by position, with their dtypes
+B2B_CSV_COLUMNS = {0: str, 2: str, 3: str, 4: float, 5: str, 10: float, 11: float}
+
+# Besides the recipient GSTIN, a GSTR-1 B2B CSV header has these; a CSV whose first column
+# is a bare 'GSTIN' (often the seller's own) is only read as B2B when it has them all
+B2B_CSV_LABELS = ['invoice number', 'invoice value', 'rate', 'taxable value']
+
+# Aggregated B2CS CSV header -> (position in Amazon's B2C Small sheet, dtype)
+B2CS_CSV_COLUMNS = {'place of supply': (1, str), 'rate': (3, float), 'taxable value': (4, float)}
+
+# CSV header labels whose first value is the seller's own GSTIN
+SELLER_GSTIN_LABELS = ['seller gstin', 'merchant gstin', 'supplier gstin']
+
+# Portal report frequency mapping
+PORTAL_FREQUENCY = {portal: schema['frequency'] for portal, schema in PORTAL_SCHEMAS.items()}
+
+# Portals whose reports can be uploaded
+SUPPORTED_PORTALS = list(PORTAL_SCHEMAS)
+
+# Most report files accepted in one batch upload (zip members included)
+MAX_BATCH_FILES = 100
+
 # State code mapping for B2CS format
 STATE_MAPPING = {
     '01': 'Jammu & Kashmir', '02': 'Himachal Pradesh', '03': 'Punjab', '04': 'Chandigarh',
@@ -42,576 +267,3106 @@ STATE_MAPPING = {
     '36': 'Telangana', '37': 'Andhra Pradesh', '38': 'Ladakh'
 }
 
+# GSTIN layout: state code, PAN (5 letters, 4 digits, a letter), entity number, 'Z', check character
+GSTIN_PATTERN = r'\d{2}[A-Z]{5}\d{4}[A-Z][1-9A-Z]Z[0-9A-Z]'
+GSTIN_CHARS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# GST rate slabs (%) a GSTR-1 line can carry
+GST_RATE_SLABS = [0, 0.1, 0.25, 1, 1.5, 3, 5, 6, 7.5, 12, 18, 28, 40]
+
+# Rates worked out from rounded tax amounts land near a slab rather than on it; within
+# this many percentage points they are taken as that slab
+RATE_SLAB_TOLERANCE = 0.5
+
+# Record columns that identify one invoice (or note) line, for the duplicate check
+DUPLICATE_KEYS = {
+    'b2cs': ['invoice_no', 'hsn_code', 'taxable_value'],
+    'b2b': ['invoice_no', 'rate'],
+    'cdnr': ['note_no', 'rate']
+}
+
+# Columns of the row-level validation report, one row per problem found; rows count
+# records from 1 within their section, and row 0 is the dataset itself
+VALIDATION_COLUMNS = ['section', 'row', 'column', 'value', 'code', 'severity', 'message']
+
+# Problems listed in a JSON validation response; the CSV report has all of them
+VALIDATION_REPORT_ROWS = 1000
+
+# Columns of the B2B invoice records produced by the B2B parsers
+B2B_RECORD_COLUMNS = [
+    'buyer_gstin', 'buyer_name', 'invoice_no', 'invoice_date', 'invoice_value', 'place_of_supply',
+    'state_code', 'reverse_charge', 'applicable_tax_rate', 'invoice_type', 'ecommerce_gstin',
+    'rate', 'taxable_value', 'cess_amount'
+]
+
+# GSTR-1 B2B CSV headers for each B2B record column, with the default used when a column is missing
+GSTR1_B2B_COLUMNS = [
+    ('buyer_gstin', 'GSTIN/UIN of Recipient', ''),
+    ('buyer_name', 'Receiver Name', ''),
+    ('invoice_no', 'Invoice Number', ''),
+    ('invoice_date', 'Invoice date', ''),
+    ('invoice_value', 'Invoice Value', 0),
+    ('place_of_supply', 'Place Of Supply', ''),
+    ('reverse_charge', 'Reverse Charge', 'N'),
+    ('applicable_tax_rate', 'Applicable % of Tax Rate', ''),
+    ('invoice_type', 'Invoice Type', 'Regular B2B'),
+    ('ecommerce_gstin', 'E-Commerce GSTIN', ''),
+    ('rate', 'Rate', 0),
+    ('taxable_value', 'Taxable Value', 0),
+    ('cess_amount', 'Cess Amount', 0)
+]
+
+# Columns of the credit/debit note records produced from the CDNR sheet
+CDNR_RECORD_COLUMNS = [
+    'buyer_gstin', 'buyer_name', 'note_no', 'note_date', 'note_type', 'place_of_supply', 'state_code',
+    'reverse_charge', 'note_supply_type', 'note_value', 'applicable_tax_rate', 'rate', 'taxable_value', 'cess_amount'
+]
+
+# GSTR-1 CDNR CSV headers for each note record column, with the default used when a column is missing
+GSTR1_CDNR_COLUMNS = [
+    ('buyer_gstin', 'GSTIN/UIN of Recipient', ''),
+    ('buyer_name', 'Receiver Name', ''),
+    ('note_no', 'Note Number', ''),
+    ('note_date', 'Note Date', ''),
+    ('note_type', 'Note Type', 'C'),
+    ('place_of_supply', 'Place Of Supply', ''),
+    ('reverse_charge', 'Reverse Charge', 'N'),
+    ('note_supply_type', 'Note Supply Type', 'Regular B2B'),
+    ('note_value', 'Note Value', 0),
+    ('applicable_tax_rate', 'Applicable % of Tax Rate', ''),
+    ('rate', 'Rate', 0),
+    ('taxable_value', 'Taxable Value', 0),
+    ('cess_amount', 'Cess Amount', 0)
+]
+
+# Sections a stored dataset can export as GSTR-1 CSVs
+EXPORT_SECTIONS = ['b2cs', 'b2b', 'cdnr']
+
+# Columns of the invoice records produced from detailed invoice sheets
+INVOICE_RECORD_COLUMNS = [
+    'invoice_date', 'invoice_no', 'hsn_code', 'product_name', 'quantity', 'taxable_value',
+    'cgst_rate', 'sgst_rate', 'igst_rate', 'cgst_amount', 'sgst_amount', 'igst_amount',
+    'total_amount', 'place_of_supply', 'portal'
+]
+
+# Columns of the pre-aggregated B2CS records (one per place of supply and rate)
+B2CS_RECORD_COLUMNS = ['place_of_supply', 'rate', 'taxable_value', 'portal']
+
+# Extra columns of streamed B2CS totals from dated reports, which are also kept per month
+B2CS_PERIOD_COLUMNS = ['month', 'invoices']
+
+# Columns of the stored monthly partial sums, one row per portal, section, month, state code and rate
+PARTIAL_COLUMNS = ['portal', 'section', 'month', 'state_code', 'rate', 'taxable_value', 'cess_amount', 'invoices']
+
+# Summary index kept with each dataset: sums and record counts per section, month, state code and rate
+SUMMARY_COLUMNS = ['section', 'month', 'state_code', 'rate', 'taxable_value', 'cess_amount', 'invoices', 'records']
+SUMMARY_KEYS = SUMMARY_COLUMNS[:4]
+
+# How each section's records write their invoice dates
+RECORD_DATE_FORMATS = {'b2cs': '%d/%m/%Y', 'b2b': '%d-%b-%y'}
+
+# Months in period requests and partial file names
+MONTH_PATTERN = re.compile(r'\d{4}-(0[1-9]|1[0-2])')
+
+# Record columns with few distinct values, stored as categoricals
+CATEGORY_COLUMNS = [
+    'place_of_supply', 'state_code', 'portal', 'invoice_type', 'reverse_charge', 'applicable_tax_rate', 'hsn_code',
+    'note_type', 'note_supply_type'
+]
+
+# Record columns holding GSTINs; they share one categorical dictionary
+GSTIN_COLUMNS = ['gstin', 'buyer_gstin', 'ecommerce_gstin']
+
+# Labels of the taxable value totals portals print above a sheet's data, checked against the parsed records
+REPORTED_TOTAL_LABELS = ['total taxable value', 'total taxable']
+
+# First-cell labels of the header row Amazon repeats at the top of its B2B sheet data
+B2B_HEADER_LABELS = ['buyer gstin', 'gstin/uin of recipient', 'gstin']
+
+# GSTR-1 B2CS CSV headers
+B2CS_COLUMNS = [
+    'Type', 'Place Of Supply', 'Rate', 'Applicable % of Tax Rate', 'Taxable Value', 'Cess Amount', 'E-Commerce GSTIN'
+]
+
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def extract_gstin_from_amazon_file(file_path):
-    """Extract GSTIN from Amazon file - looks in first sheet for 'Merchant GSTIN' label"""
+def frame_to_records(df):
+    """List of row dicts with native Python values; much cheaper than DataFrame.to_dict('records')"""
+    keys = df.columns.tolist()
+    return [dict(zip(keys, row)) for row in zip(*(df[key].tolist() for key in keys))]
+
+def round_half_up(values, scale):
+    """values * scale rounded to whole numbers half away from zero, as GST amounts are; NaN stays NaN"""
+    values = np.asarray(values, dtype=float)
+    # Scaling turns 1.005 into 100.49999999999999; snap that binary noise off before rounding
+    scaled = np.round(np.abs(values) * scale, 6)
+    return np.copysign(np.floor(scaled + 0.5), values)
+
+def round_values(values, decimals=2):
+    """Vectorized GST rounding of amounts to decimals places, halves away from zero"""
+    return round_half_up(values, 10 ** decimals) / 10 ** decimals
+
+def to_paise(values):
+    """Rupee amounts as exact int64 paise, rounded half away from zero; NaN counts as 0"""
+    return round_half_up(np.nan_to_num(np.asarray(values, dtype=float)), 100).astype(np.int64)
+
+def from_paise(paise):
+    """int64 paise back as rupees, each the float nearest its exact 2-decimal amount"""
+    return np.asarray(paise, dtype=np.int64) / 100
+
+def money_total(values):
+    """Exact sum of rupee amounts, added up in paise"""
+    return int(to_paise(values).sum()) / 100
+
+def money_sums(df, keys, amounts, counts=(), sort=True):
+    """Per-group sums of rupee amount columns (added up exactly in paise) and of count columns"""
+    columns = list(amounts) + list(counts)
+    work = df[list(keys) + list(counts)].assign(**{column: to_paise(df[column]) for column in amounts})
+    sums = work.groupby(list(keys), sort=sort)[columns].sum().reset_index()
+    return sums.assign(**{column: from_paise(sums[column]) for column in amounts})
+
+def typed_frame(df):
+    """Compact parsed records: categoricals for repeated labels and one shared GSTIN dictionary.
+
+    Amounts and rates already come out of the extractors as int64/float64 arrays.
+    Rows only become dicts at the API boundary, via frame_to_records.
+    """
+    typed = df.copy(deep=False)
+    for column in CATEGORY_COLUMNS:
+        if column in typed.columns and typed[column].dtype == object:
+            typed[column] = typed[column].astype('category')
+    gstin_columns = [column for column in GSTIN_COLUMNS if column in typed.columns and typed[column].dtype == object]
+    if gstin_columns:
+        gstins = pd.unique(np.concatenate([typed[column].dropna().to_numpy(dtype=object) for column in gstin_columns]))
+        gstin_dtype = pd.CategoricalDtype(gstins)
+        for column in gstin_columns:
+            typed[column] = typed[column].astype(gstin_dtype)
+    return typed
+
+class Metrics:
+    """Counters and latency histograms for requests and pipeline stages, per process"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.started_at = time.time()
+        self.counters = {}
+        self.timings = {}
+    
+    def count(self, name, value=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+    
+    def observe(self, name, seconds, rows=None):
+        """Record one duration (and optionally the rows it processed) under a name"""
+        with self._lock:
+            timing = self.timings.get(name)
+            if timing is None:
+                timing = self.timings[name] = {
+                    'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0, 'rows': 0,
+                    'buckets': [0] * (len(LATENCY_BUCKETS) + 1)
+                }
+            timing['count'] += 1
+            timing['total_seconds'] += seconds
+            timing['max_seconds'] = max(timing['max_seconds'], seconds)
+            timing['rows'] += rows or 0
+            timing['buckets'][bisect.bisect_left(LATENCY_BUCKETS, seconds)] += 1
+    
+    def drain(self):
+        """Raw counters and timings recorded so far, resetting them"""
+        with self._lock:
+            recorded = {'counters': self.counters, 'timings': self.timings}
+            self.counters = {}
+            self.timings = {}
+        return recorded
+    
+    def merge(self, recorded):
+        """Add raw counters and timings drained from another process"""
+        with self._lock:
+            for name, value in recorded['counters'].items():
+                self.counters[name] = self.counters.get(name, 0) + value
+            for name, other in recorded['timings'].items():
+                timing = self.timings.get(name)
+                if timing is None:
+                    self.timings[name] = other
+                    continue
+                timing['count'] += other['count']
+                timing['total_seconds'] += other['total_seconds']
+                timing['max_seconds'] = max(timing['max_seconds'], other['max_seconds'])
+                timing['rows'] += other['rows']
+                timing['buckets'] = [a + b for a, b in zip(timing['buckets'], other['buckets'])]
+    
+    def snapshot(self):
+        """JSON-friendly view with cumulative histogram buckets"""
+        with self._lock:
+            timings = {}
+            for name, timing in sorted(self.timings.items()):
+                cumulative = np.cumsum(timing['buckets']).tolist()
+                timings[name] = {
+                    'count': timing['count'],
+                    'total_seconds': round(timing['total_seconds'], 6),
+                    'mean_seconds': round(timing['total_seconds'] / timing['count'], 6),
+                    'max_seconds': round(timing['max_seconds'], 6),
+                    'rows': timing['rows'],
+                    'histogram': [{'le': bound, 'count': n} for bound, n in zip(LATENCY_BUCKETS + ['+Inf'], cumulative)]
+                }
+            return {
+                'uptime_seconds': round(time.time() - self.started_at, 3),
+                'counters': dict(sorted(self.counters.items())),
+                'timings': timings
+            }
+
+METRICS = Metrics()
+
+# Stages timed for the current request or job, so its time can be broken down
+_stage_log = threading.local()
+
+@contextmanager
+def stage(name):
+    """Time a named pipeline stage; set record['rows'] inside the block to count rows processed"""
+    record = {'rows': None}
+    start = time.perf_counter()
     try:
-        # Read the first sheet without headers
-        df = pd.read_excel(file_path, sheet_name=0, header=None)
-        print(f"Reading first sheet for GSTIN extraction")
-        print(f"First few rows:\n{df.head(20)}")
-        
-        # Search through the first 20 rows to find "Merchant GSTIN" label
-        for idx in range(min(20, len(df))):
-            row = df.iloc[idx]
-            row_str = ' '.join([str(cell) for cell in row if pd.notna(cell)])
-            
-            # Check if this row contains "Merchant GSTIN"
-            if 'merchant' in row_str.lower() and 'gstin' in row_str.lower():
-                print(f"Found 'Merchant GSTIN' label in row {idx}")
-                # The GSTIN value is typically in the next row (idx+1)
-                if idx + 1 < len(df):
-                    next_row = df.iloc[idx + 1]
-                    # GSTIN is usually in the first few columns of the next row
-                    for col in range(min(5, len(next_row))):
-                        gstin = str(next_row.iloc[col])
-                        gstin = gstin.strip()
-                        print(f"Checking cell ({idx+1}, {col}): '{gstin}'")
-                        # GSTIN format is 15 characters (e.g., 29AICPN1083C1ZI)
-                        if gstin and len(gstin) >= 10 and gstin.replace('-', '').replace('_', '').isalnum() and not gstin.lower() in ['merchant gstin', 'gstin', 'nan']:
-                            print(f"Valid GSTIN found: {gstin}")
-                            return gstin
-        
-        print("No GSTIN found in first 20 rows")
+        yield record
+    finally:
+        elapsed = time.perf_counter() - start
+        METRICS.observe(f"stage.{name}", elapsed, record['rows'])
+        stages = getattr(_stage_log, 'stages', None)
+        if stages is not None:
+            stages.append({'stage': name, 'seconds': round(elapsed, 6), 'rows': record['rows']})
+        logger.debug("Stage %s took %.3fs (rows: %s)", name, elapsed, record['rows'])
+
+def run_instrumented(func, *args):
+    """Call func(*args) in a worker, returning its result with the stages and metrics it recorded"""
+    METRICS.drain()
+    _stage_log.stages = []
+    try:
+        result = func(*args)
+    finally:
+        stages = _stage_log.stages
+        _stage_log.stages = None
+    return result, stages, METRICS.drain()
+
+def collect_instrumented(outcome):
+    """Merge a run_instrumented outcome into this process; returns (result, stages)"""
+    result, stages, recorded = outcome
+    METRICS.merge(recorded)
+    return result, stages
+
+class WorkbookSession:
+    """One openpyxl load of an uploaded workbook, shared by every parser in a request.
+
+    Each sheet's cells are read once and cached; frames for different
+    skiprows/header combinations are built from those cached cells the same
+    way pd.read_excel would build them.
+    """
+
+    def __init__(self, file_path):
+        self.file_path = file_path
+        with stage('workbook_open'):
+            self.workbook = load_workbook(file_path, read_only=True, data_only=True, keep_links=False)
+        self.sheet_names = list(self.workbook.sheetnames)
+        self._sheet_rows = {}
+        self._frames = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.close()
+
+    def close(self):
+        self.workbook.close()
+
+    def _sheet_name(self, sheet_name):
+        # Accept sheet positions like pd.read_excel does
+        if isinstance(sheet_name, int):
+            return self.sheet_names[sheet_name]
+        return sheet_name
+
+    @staticmethod
+    def _convert_cell(cell):
+        # Same conversions pandas' openpyxl reader applies
+        if cell.value is None:
+            return ''
+        if cell.data_type == 'e':
+            return float('nan')
+        if cell.data_type == 'n':
+            value = int(cell.value)
+            return value if value == cell.value else float(cell.value)
+        return cell.value
+
+    def sheet_rows(self, sheet_name=0):
+        """Raw cell values of a sheet, trimmed and padded like pd.read_excel"""
+        sheet_name = self._sheet_name(sheet_name)
+        if sheet_name not in self._sheet_rows:
+            sheet = self.workbook[sheet_name]
+            sheet.reset_dimensions()
+            rows = []
+            last_row_with_data = -1
+            for row_number, row in enumerate(sheet.rows):
+                converted = [self._convert_cell(cell) for cell in row]
+                while converted and converted[-1] == '':
+                    converted.pop()
+                if converted:
+                    last_row_with_data = row_number
+                rows.append(converted)
+            rows = rows[:last_row_with_data + 1]
+            if rows:
+                width = max(len(row) for row in rows)
+                rows = [row + [''] * (width - len(row)) for row in rows]
+            self._sheet_rows[sheet_name] = rows
+        return self._sheet_rows[sheet_name]
+
+    def read_sheet(self, sheet_name=0, skiprows=None, header=0):
+        """Equivalent of pd.read_excel(file_path, sheet_name, skiprows, header), cached.
+
+        Cached frames are shared between callers, so don't modify them in place.
+        """
+        sheet_name = self._sheet_name(sheet_name)
+        key = (sheet_name, skiprows, header)
+        if key not in self._frames:
+            with stage('sheet_read') as record:
+                rows = self.sheet_rows(sheet_name)
+                if rows:
+                    parser = TextParser(rows, header=header, skiprows=skiprows, skip_blank_lines=False)
+                    self._frames[key] = parser.read()
+                else:
+                    self._frames[key] = pd.DataFrame()
+                record['rows'] = len(self._frames[key])
+        return self._frames[key]
+
+    def head_rows(self, sheet_name=0, nrows=20):
+        """First nrows rows of a sheet as raw cell values, read without loading the rest"""
+        sheet = self.workbook[self._sheet_name(sheet_name)]
+        sheet.reset_dimensions()
+        rows = []
+        for row in sheet.iter_rows(values_only=True):
+            if len(rows) >= nrows:
+                break
+            rows.append(row)
+        return rows
+
+    def iter_sheet_chunks(self, sheet_name=0, skiprows=0, chunk_rows=STREAM_CHUNK_ROWS):
+        """Yield a sheet's rows as DataFrames of at most chunk_rows rows, without caching them.
+
+        The first row after skiprows names the columns, like the header row in pd.read_excel.
+        """
+        sheet = self.workbook[self._sheet_name(sheet_name)]
+        sheet.reset_dimensions()
+        rows = sheet.iter_rows(min_row=skiprows + 1, values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= chunk_rows:
+                yield self._chunk_frame(header, chunk)
+                chunk = []
+        if chunk:
+            yield self._chunk_frame(header, chunk)
+
+    @staticmethod
+    def _chunk_frame(header, rows):
+        frame = pd.DataFrame(rows)
+        # Name columns from the header row; blanks and repeats are named like pd.read_excel names them
+        names = []
+        seen = {}
+        for i in range(len(frame.columns)):
+            name = header[i] if i < len(header) and header[i] not in (None, '') else f'Unnamed: {i}'
+            count = seen.get(name, 0)
+            seen[name] = count + 1
+            names.append(f'{name}.{count}' if count else name)
+        frame.columns = names
+        # Empty cells and empty strings become NaN, as in pd.read_excel
+        return frame.where(frame.notna() & (frame != ''), np.nan)
+
+@contextmanager
+def workbook_session(file_path, session=None):
+    """Reuse the caller's WorkbookSession, or open (and close) one for file_path"""
+    if session is not None:
+        yield session
+        return
+    with WorkbookSession(file_path) as session:
+        yield session
+
+def dataset_path(dataset_id, name=None):
+    """Directory of a stored dataset, or the file of one of its frames; None for malformed ids"""
+    if not dataset_id or not re.fullmatch(r'[0-9a-f]{32}', str(dataset_id)):
         return None
-    except Exception as e:
-        print(f"Error extracting GSTIN: {str(e)}")
-        import traceback
-        traceback.print_exc()
+    path = os.path.join(DATASET_FOLDER, dataset_id)
+    return os.path.join(path, f"{name}.arrow") if name else path
+
+def save_dataset(frames, metadata):
+    """Store parsed frames (by section name) and their metadata; returns the new dataset id"""
+    dataset_id = uuid.uuid4().hex
+    os.makedirs(dataset_path(dataset_id))
+    for name, df in frames.items():
+        save_dataset_frame(dataset_id, name, df)
+    save_dataset_meta(dataset_id, metadata)
+    evict_datasets(keep=dataset_id)
+    return dataset_id
+
+def save_dataset_frame(dataset_id, name, df):
+    """Store one section frame of a dataset as an uncompressed Arrow IPC (Feather) file, which loads memory-map"""
+    path = dataset_path(dataset_id, name)
+    # Write aside and rename: a reader may have the old file mapped, and must keep seeing all of it
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    df.reset_index(drop=True).to_feather(temp_path, compression='uncompressed')
+    os.replace(temp_path, path)
+
+def load_dataset_frame(dataset_id, name):
+    """Load one section frame of a stored dataset, or None if it isn't stored"""
+    path = dataset_path(dataset_id, name)
+    if not path or not os.path.exists(path):
         return None
+    return pa_feather.read_table(path, memory_map=True).to_pandas()
 
-def parse_amazon_file(file_path):
-    """Parse Amazon seller reports - Ready to File format"""
+def evict_datasets(max_bytes=None, max_age=DATASET_RETENTION_SECONDS, keep=None):
+    """Delete datasets unused for max_age seconds, then least recently used ones until the rest fit in max_bytes"""
+    max_bytes = DATASET_MAX_BYTES if max_bytes is None else max_bytes
+    cutoff = time.time() - max_age
+    entries = []
+    for entry in os.scandir(DATASET_FOLDER):
+        try:
+            # Loading a dataset's metadata touches it, so its modification time is the last use
+            last_used = os.stat(os.path.join(entry.path, 'meta.json')).st_mtime
+            size = sum(item.stat().st_size for item in os.scandir(entry.path))
+        except OSError:
+            continue  # Removed concurrently, or still being written
+        entries.append((last_used, size, entry.name))
+    total = sum(size for _, size, _ in entries)
+    for last_used, size, dataset_id in sorted(entries):
+        if dataset_id == keep or (total <= max_bytes and last_used >= cutoff):
+            continue
+        shutil.rmtree(dataset_path(dataset_id), ignore_errors=True)
+        total -= size
+
+def load_dataset_meta(dataset_id):
+    """Metadata of a stored dataset, or None if there is no such dataset; loading it marks the dataset as used"""
+    path = dataset_path(dataset_id)
+    if not path or not os.path.exists(os.path.join(path, 'meta.json')):
+        return None
+    with open(os.path.join(path, 'meta.json')) as f:
+        metadata = json.load(f)
+    os.utime(os.path.join(path, 'meta.json'))
+    return metadata
+
+def save_dataset_meta(dataset_id, metadata):
+    """Write a stored dataset's metadata, replacing it in one step"""
+    path = os.path.join(dataset_path(dataset_id), 'meta.json')
+    temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(metadata, f)
+    os.replace(temp_path, path)
+
+def save_upload(stream, file_path):
+    """Stream an uploaded file to disk, returning the SHA-256 of its content"""
+    digest = hashlib.sha256()
+    with stage('file_save'), open(file_path, 'wb') as out:
+        for block in iter(lambda: stream.read(1024 * 1024), b''):
+            digest.update(block)
+            out.write(block)
+    return digest.hexdigest()
+
+def upload_session_path(upload_id, name=None):
+    """Directory of a chunked upload, or one of its files; None for malformed ids"""
+    if not upload_id or not re.fullmatch(r'[0-9a-f]{32}', str(upload_id)):
+        return None
+    path = os.path.join(UPLOAD_SESSION_FOLDER, upload_id)
+    return os.path.join(path, name) if name else path
+
+def load_upload_session(upload_id):
+    """Options and received byte count of a chunked upload, or None if there is no such upload"""
+    path = upload_session_path(upload_id)
     try:
-        # Read all sheets
-        xls = pd.ExcelFile(file_path)
-        
-        print(f"Available sheets: {xls.sheet_names}")
+        with open(os.path.join(path, 'meta.json')) as f:
+            session = json.load(f)
+        session['offset'] = os.path.getsize(os.path.join(path, 'data'))
+    except (TypeError, OSError, ValueError):
+        return None
+    return session
+
+# Running SHA-256 of each chunked upload in this process, as (bytes hashed, hash object)
+UPLOAD_DIGESTS = {}
+UPLOAD_LOCKS = {}
+UPLOAD_SESSIONS_LOCK = threading.Lock()
+
+def upload_session_lock(upload_id):
+    """Lock held while a chunk is appended to (or the file taken from) a chunked upload"""
+    with UPLOAD_SESSIONS_LOCK:
+        return UPLOAD_LOCKS.setdefault(upload_id, threading.Lock())
+
+def upload_session_digest(upload_id, offset):
+    """SHA-256 of the first offset bytes of a chunked upload.
+    
+    Hashes carry over between chunks in memory; after a restart, or in another
+    worker, the received bytes are hashed again from disk once.
+    """
+    entry = UPLOAD_DIGESTS.get(upload_id)
+    if entry is not None and entry[0] == offset:
+        return entry[1]
+    digest = hashlib.sha256()
+    with open(upload_session_path(upload_id, 'data'), 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest
+
+def append_upload_chunk(upload_id, stream, offset):
+    """Stream a chunk onto the end of a chunked upload, hashing it as it is written; returns the new offset.
+    
+    A dropped connection keeps the bytes that arrived, so the client resumes from the new offset.
+    """
+    digest = upload_session_digest(upload_id, offset)
+    with stage('file_save'), open(upload_session_path(upload_id, 'data'), 'ab') as out:
+        try:
+            for block in iter(lambda: stream.read(1024 * 1024), b''):
+                out.write(block)
+                digest.update(block)
+                offset += len(block)
+        except ClientDisconnected:
+            logger.info("Upload %s interrupted at byte %d", upload_id, offset)
+    UPLOAD_DIGESTS[upload_id] = (offset, digest)
+    return offset
+
+def discard_upload_session(upload_id):
+    """Remove a chunked upload's folder and in-memory state"""
+    shutil.rmtree(upload_session_path(upload_id), ignore_errors=True)
+    UPLOAD_DIGESTS.pop(upload_id, None)
+    with UPLOAD_SESSIONS_LOCK:
+        UPLOAD_LOCKS.pop(upload_id, None)
+
+def cleanup_upload_sessions(max_age=UPLOAD_SESSION_RETENTION_SECONDS):
+    """Remove chunked uploads that have received nothing for max_age seconds"""
+    cutoff = time.time() - max_age
+    for entry in os.scandir(UPLOAD_SESSION_FOLDER):
+        try:
+            if os.stat(os.path.join(entry.path, 'data')).st_mtime < cutoff:
+                discard_upload_session(entry.name)
+        except OSError:
+            pass  # Removed concurrently, or not fully created yet
+
+def parse_cache_key(content_hash, portal, streaming):
+    """Cache key for a parse of some file content; parser changes bump PARSER_VERSION"""
+    mode = 'stream' if streaming else 'full'
+    return f"{content_hash}-{portal}-{mode}-v{PARSER_VERSION}"
+
+def load_parse_cache(cache_key):
+    """Cached parse results for a key, or None"""
+    path = os.path.join(PARSE_CACHE_FOLDER, f"{cache_key}.pkl")
+    try:
+        with open(path, 'rb') as f:
+            entry = pickle.load(f)
+        # The modification time doubles as the entry's last use, for LRU eviction
+        os.utime(path)
+        METRICS.count('parse_cache.hits')
+        return entry
+    except (OSError, pickle.UnpicklingError, EOFError):
+        METRICS.count('parse_cache.misses')
+        return None
+
+def store_parse_cache(cache_key, entry):
+    """Cache parse results for a key, then evict least recently used entries over the size cap"""
+    path = os.path.join(PARSE_CACHE_FOLDER, f"{cache_key}.pkl")
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(entry, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, path)
+    evict_parse_cache()
+
+def update_parse_cache(cache_key, **results):
+    """Add results (like the datasets stored for it) to an existing cache entry"""
+    entry = load_parse_cache(cache_key)
+    if entry is not None:
+        entry.update(results)
+        store_parse_cache(cache_key, entry)
+
+def evict_parse_cache(max_bytes=None):
+    """Delete least recently used cache entries until the cache fits in max_bytes"""
+    max_bytes = PARSE_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+    entries = []
+    for name in os.listdir(PARSE_CACHE_FOLDER):
+        if name.endswith('.pkl'):
+            stat = os.stat(os.path.join(PARSE_CACHE_FOLDER, name))
+            entries.append((stat.st_mtime, stat.st_size, name))
+    total = sum(size for _, size, _ in entries)
+    for _, size, name in sorted(entries):
+        if total <= max_bytes:
+            break
+        try:
+            os.remove(os.path.join(PARSE_CACHE_FOLDER, name))
+        except OSError:
+            pass
+        total -= size
+
+def partials_path(gstin, month=None):
+    """Directory of a GSTIN's stored partials, or the file of one month; None for malformed GSTINs
+
+    Partials live under the current PARSER_VERSION, so sums an older parser stored are
+    left on disk but never merged with new ones."""
+    if not gstin or not re.fullmatch(r'[0-9A-Z]{15}', str(gstin)):
+        return None
+    path = os.path.join(PARTIALS_FOLDER, f"v{PARSER_VERSION}", gstin)
+    return os.path.join(path, f"{month}.pkl") if month else path
+
+_partials_lock = threading.Lock()
+
+def store_period_partials(gstin, portal, partials):
+    """Store monthly partial sums of a GSTIN; returns the months written.
+
+    A report replaces whatever the same portal stored earlier for its months and
+    sections, so re-uploading a corrected month doesn't count it twice.
+    """
+    partials = [frame for frame in partials if not frame.empty]
+    directory = partials_path(gstin)
+    if directory is None or not partials:
+        return []
+    partials = pd.concat(partials, ignore_index=True).assign(portal=portal)[PARTIAL_COLUMNS]
+    os.makedirs(directory, exist_ok=True)
+    with _partials_lock:
+        for month, rows in partials.groupby('month'):
+            path = partials_path(gstin, month)
+            if os.path.exists(path):
+                stored = pd.read_pickle(path)
+                replaced = (stored['portal'] == portal) & stored['section'].isin(rows['section'].unique())
+                rows = pd.concat([stored[~replaced], rows], ignore_index=True)
+            # Write aside and rename, so readers never see a half-written month
+            temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            rows.to_pickle(temp_path)
+            os.replace(temp_path, path)
+    return sorted(partials['month'].unique())
+
+def load_period_partials(gstin, from_month, to_month):
+    """Stored partial sums of a GSTIN for the months from_month to to_month, inclusive"""
+    directory = partials_path(gstin)
+    months = []
+    if directory is not None and os.path.isdir(directory):
+        months = sorted(name[:-4] for name in os.listdir(directory)
+                        if name.endswith('.pkl') and from_month <= name[:-4] <= to_month)
+    frames = [pd.read_pickle(partials_path(gstin, month)) for month in months]
+    return pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=PARTIAL_COLUMNS)
+
+def find_b2c_small_sheet(sheet_names):
+    """Name of the B2C Small sheet in an Amazon Ready to File workbook, if any"""
+    for sheet_name in sheet_names:
+        if 'b2c' in sheet_name.lower() and 'small' in sheet_name.lower():
+            return sheet_name
+    return None
+
+def find_b2b_sheet(sheet_names):
+    """Name of the B2B invoice sheet (not the B2B credit notes) in an Amazon workbook, if any"""
+    for sheet_name in sheet_names:
+        sheet_lower = sheet_name.lower()
+        if 'b2b' in sheet_lower and 'cn' not in sheet_lower and 'cdnr' not in sheet_lower:
+            return sheet_name
+    return None
+
+def find_cdnr_sheet(sheet_names):
+    """Name of the credit/debit notes sheet ('CDNR' or 'B2B CN') in an Amazon workbook, if any"""
+    for sheet_name in sheet_names:
+        sheet_lower = sheet_name.lower()
+        if 'cdnr' in sheet_lower or ('b2b' in sheet_lower and 'cn' in sheet_lower):
+            return sheet_name
+    return None
+
+def sheet_reported_total(rows):
+    """Taxable value total printed in a sheet's preamble rows, below or next to its label; None if there is none"""
+    for r, row in enumerate(rows):
+        for c, cell in enumerate(row):
+            if not isinstance(cell, str) or normalize_header(cell) not in REPORTED_TOTAL_LABELS:
+                continue
+            below = rows[r + 1][c] if r + 1 < len(rows) and c < len(rows[r + 1]) else None
+            right = row[c + 1] if c + 1 < len(row) else None
+            for value in (below, right):
+                if isinstance(value, (int, float)) and not isinstance(value, bool):
+                    return float(value)
+    return None
+
+def workbook_reported_totals(session):
+    """Taxable value totals printed at the top of each section sheet of a Ready to File workbook"""
+    totals = {}
+    for section, find_sheet in (('b2cs', find_b2c_small_sheet), ('b2b', find_b2b_sheet), ('cdnr', find_cdnr_sheet)):
+        sheet_name = find_sheet(session.sheet_names)
+        total = sheet_reported_total(session.head_rows(sheet_name, 3)) if sheet_name else None
+        if total is not None:
+            totals[section] = total
+    return totals
+
+def is_truthy(value):
+    """Whether a form or JSON flag like 'true', '1' or True is set"""
+    return value is not None and str(value).lower() in ('1', 'true', 'yes')
+
+def should_stream(file_path, requested=None):
+    """Whether to parse a file in streaming mode: when asked to, or when it is very large"""
+    return is_truthy(requested) or os.path.getsize(file_path) >= STREAMING_THRESHOLD
+
+def extract_gstin_from_amazon_file(file_path, session=None):
+    """Extract GSTIN from Amazon file - looks in first sheet for 'Merchant GSTIN' label"""
+    try:
+        # Only the top of the first sheet is searched, so don't load the rest of it
+        with workbook_session(file_path, session) as workbook:
+            rows = workbook.head_rows(0, PROBE_ROWS + 1)
+        logger.debug("Reading first sheet for GSTIN extraction")
+        return find_merchant_gstin(rows)
+    except Exception as e:
+        logger.exception("Error extracting GSTIN: %s", e)
+        return None
+
+def find_merchant_gstin(rows):
+    """GSTIN in the row below a 'Merchant GSTIN' label among the first rows of a report"""
+    logger.debug("First few rows: %s", rows[:PROBE_ROWS])
+    
+    # Search through the first 20 rows to find "Merchant GSTIN" label
+    for idx in range(min(PROBE_ROWS, len(rows))):
+        row_str = ' '.join([str(cell) for cell in rows[idx] if cell is not None and cell != ''])
         
-        # Try to read from B2C Small sheet (Amazon Ready to File format)
-        # Find sheet name with case-insensitive matching
-        b2c_sheet = None
-        for sheet_name in xls.sheet_names:
-            sheet_lower = sheet_name.lower()
-            print(f"Checking sheet: '{sheet_name}' -> '{sheet_lower}'")
-            if 'b2c' in sheet_lower and 'small' in sheet_lower:
-                b2c_sheet = sheet_name
-                print(f"Found B2C sheet: {b2c_sheet}")
-                break
+        # Check if this row contains "Merchant GSTIN"
+        if 'merchant' in row_str.lower() and 'gstin' in row_str.lower():
+            logger.debug("Found 'Merchant GSTIN' label in row %s", idx)
+            # The GSTIN value is typically in the next row (idx+1)
+            if idx + 1 < len(rows):
+                next_row = rows[idx + 1]
+                # GSTIN is usually in the first few columns of the next row
+                for col in range(min(5, len(next_row))):
+                    if next_row[col] is None:
+                        continue
+                    gstin = str(next_row[col]).strip()
+                    logger.debug("Checking cell (%s, %s): '%s'", idx + 1, col, gstin)
+                    # GSTIN format is 15 characters (e.g., 29AICPN1083C1ZI)
+                    if gstin and len(gstin) >= 10 and gstin.replace('-', '').replace('_', '').isalnum() and not gstin.lower() in ['merchant gstin', 'gstin', 'nan']:
+                        logger.debug("Valid GSTIN found: %s", gstin)
+                        return gstin
+    
+    logger.debug("No GSTIN found in first 20 rows")
+    return None
+
+def row_labels(row):
+    """Header cells of a raw sheet row as strings, without trailing blanks"""
+    labels = ['' if cell is None else str(cell) for cell in (row or ())]
+    while labels and labels[-1] == '':
+        labels.pop()
+    return labels
+
+def probe_workbook(file_path, session=None, nrows=PROBE_ROWS):
+    """Sheet names, GSTIN, sales layout and header offsets, reading only the top rows of each sheet.
+
+    Header offsets are 0-based sheet rows: data starts on the row after header_row.
+    """
+    start = time.perf_counter()
+    with stage('probe'), workbook_session(file_path, session) as workbook:
+        sheet_names = workbook.sheet_names
+        gstin = extract_gstin_from_amazon_file(file_path, session=workbook)
         
-        if b2c_sheet:
-            print(f"Reading from {b2c_sheet} sheet")
-            # Skip first 2 rows and use row 2 (0-indexed) as header
-            df = pd.read_excel(file_path, sheet_name=b2c_sheet, skiprows=2)
+        # Sales come from the B2C Small sheet below its two preamble rows, else the first sheet
+        b2c_sheet = find_b2c_small_sheet(sheet_names)
+        sales_sheet = b2c_sheet or sheet_names[0]
+        skiprows = 2 if b2c_sheet else 0
+        rows = workbook.head_rows(sales_sheet, max(nrows, skiprows + 2))
+        first_data = rows[skiprows + 1] if len(rows) > skiprows + 1 else ()
+        if first_data and isinstance(first_data[0], str) and first_data[0].lower() == 'type':
+            # Aggregated B2CS sheets repeat their own header in the first data row
+            layout, header_row = 'aggregated_b2cs', skiprows + 1
         else:
-            # Try first sheet
-            print(f"B2C Small sheet not found. Reading from first sheet: {xls.sheet_names[0]}")
-            df = pd.read_excel(file_path, sheet_name=0)
+            header = row_labels(rows[skiprows]) if len(rows) > skiprows else []
+            layout = 'detailed_invoices' if 'Invoice Date' in header else 'unknown'
+            header_row = skiprows
+        sales = {
+            'sheet': sales_sheet,
+            'layout': layout,
+            'header_row': header_row,
+            'columns': row_labels(rows[header_row]) if len(rows) > header_row else [],
+            'sample_rows': max(0, len(rows) - header_row - 1)
+        }
         
-        print(f"Columns in sheet: {df.columns.tolist()}")
-        print(f"Number of rows: {len(df)}")
-        print(f"First few rows:\n{df.head()}")
+        b2b = None
+        b2b_sheet = find_b2b_sheet(sheet_names)
+        if b2b_sheet:
+            rows = workbook.head_rows(b2b_sheet, max(nrows, 4))
+            first_data = rows[3] if len(rows) > 3 else ()
+            header_row = 3 if first_data and str(first_data[0]).lower() in B2B_HEADER_LABELS else 2
+            b2b = {
+                'sheet': b2b_sheet,
+                'header_row': header_row,
+                'columns': row_labels(rows[header_row]) if len(rows) > header_row else [],
+                'sample_rows': max(0, len(rows) - header_row - 1)
+            }
+    
+    return {
+        'sheet_names': sheet_names,
+        'gstin': gstin,
+        'layout': layout,
+        'sales': sales,
+        'b2b': b2b,
+        'elapsed_ms': round((time.perf_counter() - start) * 1000, 3)
+    }
+
+def parse_amazon_file(file_path, session=None):
+    """Parse Amazon seller reports - Ready to File format"""
+    try:
+        with workbook_session(file_path, session) as workbook:
+            logger.debug("Available sheets: %s", workbook.sheet_names)
+            
+            # Try to read from B2C Small sheet (Amazon Ready to File format)
+            # Find sheet name with case-insensitive matching
+            b2c_sheet = find_b2c_small_sheet(workbook.sheet_names)
+            if b2c_sheet:
+                logger.debug("Reading from B2C sheet: %s", b2c_sheet)
+                # Skip first 2 rows and use row 2 (0-indexed) as header
+                df = workbook.read_sheet(b2c_sheet, skiprows=2)
+            else:
+                # Try first sheet
+                logger.debug("B2C Small sheet not found. Reading from first sheet: %s", workbook.sheet_names[0])
+                df = workbook.read_sheet(0)
+        
+        logger.debug("Columns in sheet: %s", df.columns.tolist())
+        logger.debug("Number of rows: %s", len(df))
+        logger.debug("First few rows:\n%s", df.head())
         
         # Check if this is already in aggregated format (Amazon Ready to File B2CS format)
         # The columns will be: Type, Place Of Supply, Rate, Taxable Value, etc.
         # Check if first row is header by looking at first row's first column
         first_row_first_col = df.iloc[0, 0] if len(df) > 0 else None
-        is_header = (isinstance(first_row_first_col, str) and first_row_first_col.lower() == 'type')
-        
-        if is_header:
-            print("Detected aggregated B2CS format with header row")
+        if isinstance(first_row_first_col, str) and first_row_first_col.lower() == 'type':
             # First row is header, skip it and parse data
-            data = []
-            for idx, row in df.iterrows():
-                # Skip header row (first row)
-                if idx == 0:
-                    continue
-                
-                # Get values by position since columns may not be named correctly
-                # Row structure: Type, Place Of Supply, Applicable % of Tax Rate, Rate, Taxable Value, Cess Amount, E-Commerce GSTIN
-                place_of_supply = str(row.iloc[1]) if len(row) > 1 else ''
-                
-                if not place_of_supply or place_of_supply == 'nan' or place_of_supply == '':
-                    continue
-                
-                # Get the rate from column 3 (index 3)
-                rate = row.iloc[3] if len(row) > 3 else 0
-                
-                # Convert rate from decimal (0.18) to percentage (18)
-                if rate > 0 and rate < 1:
-                    rate = int(rate * 100)
-                else:
-                    rate = int(rate)
-                
-                # Get taxable value from column 4 (index 4)
-                taxable_val = row.iloc[4] if len(row) > 4 else 0
-                taxable_val = float(taxable_val or 0)
-                
-                if taxable_val == 0:
-                    continue
-                
-                data.append({
-                    'place_of_supply': place_of_supply,
-                    'rate': rate,
-                    'taxable_value': round(taxable_val, 2),
-                    'portal': 'Amazon'
-                })
+            logger.debug("Detected aggregated B2CS format with header row")
+            return typed_frame(amazon_b2cs_frame(df.iloc[1:]))
+        
+        # Handle detailed format with individual invoices
+        return typed_frame(PORTAL_PARSERS['amazon'](df))
+    except Exception as e:
+        logger.exception("Error parsing Amazon file: %s", e)
+        return None
+
+def normalize_header(name):
+    """Report column name for schema matching: lower case, single spaces, no underscores"""
+    return ' '.join(str(name).replace('_', ' ').lower().split())
+
+def select_sheet(sheet_names, schema):
+    """(sheet name, rows to skip above the header) to read for a portal schema"""
+    for rule in schema['sheets']:
+        for sheet_name in sheet_names:
+            if all(word in sheet_name.lower() for word in rule['match']):
+                return sheet_name, rule.get('skiprows', 0)
+    return sheet_names[0], 0
+
+def schema_candidates(schema):
+    """Normalized report column names tried for each invoice record column of a schema"""
+    return {
+        record_column: [normalize_header(name) for name in ([names] if isinstance(names, str) else names)]
+        for record_column, names in schema['columns'].items()
+    }
+
+def resolve_columns(columns, candidates):
+    """Map each invoice record column to the first report column matching one of its candidates"""
+    headers = {}
+    for column in columns:
+        headers.setdefault(normalize_header(column), column)
+    resolved = {}
+    for record_column, names in candidates.items():
+        for name in names:
+            if name in headers:
+                resolved[record_column] = headers[name]
+                break
+    return resolved
+
+def compile_portal_schema(schema):
+    """Compile a portal schema into extract(df), turning a report sheet into an invoice record frame.
+
+    Every column is converted in one vectorized pass; nothing iterates over rows.
+    """
+    candidates = schema_candidates(schema)
+    rates = schema.get('rates', 'percent')
+    dayfirst = schema.get('dayfirst', False)
+    label = schema['label']
+    
+    def extract(df):
+        resolved = resolve_columns(df.columns, candidates)
+        
+        def number_column(record_column):
+            # Blank cells stay NaN and missing columns count as 0, as float(value or 0) did
+            if record_column not in resolved:
+                return np.zeros(len(df))
+            return pd.to_numeric(df[resolved[record_column]]).to_numpy(dtype=float)
+        
+        def text_column(record_column):
+            if record_column not in resolved:
+                return ''
+            return df[resolved[record_column]].astype(str).to_numpy(dtype=object)
+        
+        required = resolved.get(schema['required'])
+        if required is None:
+            return pd.DataFrame(columns=INVOICE_RECORD_COLUMNS)
+        
+        # Skip empty rows
+        df = df[df[required].notna() & (df[required] != '')]
+        if len(df) == 0:
+            return pd.DataFrame(columns=INVOICE_RECORD_COLUMNS)
+        
+        if 'invoice_date' in resolved:
+            # Parse dates in one pass; mixed cells are parsed one by one like pd.to_datetime(cell)
+            invoice_dates = df[resolved['invoice_date']]
+            if not pd.api.types.is_datetime64_any_dtype(invoice_dates):
+                invoice_dates = pd.to_datetime(invoice_dates, format='mixed', dayfirst=dayfirst)
+            # A quarter only has ~90 distinct days, so format each day once
+            day_codes, days = pd.factorize(invoice_dates.dt.normalize())
+            invoice_dates = np.append(np.asarray(days.strftime('%d/%m/%Y'), dtype=object), '')[day_codes]
+        else:
+            invoice_dates = ''
+        
+        if 'place_of_supply' in resolved:
+            place_column = df[resolved['place_of_supply']]
+            place_of_supply = place_column.astype(str).where(place_column.notna(), '').to_numpy(dtype=object)
+        else:
+            place_of_supply = ''
+        
+        taxable_val = number_column('taxable_value')
+        if rates == 'from_amounts':
+            cgst_amt = number_column('cgst_amount')
+            sgst_amt = number_column('sgst_amount')
+            igst_amt = number_column('igst_amount')
             
-            print(f"Parsed {len(data)} rows from aggregated B2CS format")
-            print(f"Sample data: {data[:3] if len(data) >= 3 else data}")
-            return data
+            # CGST (and matching SGST) rate for intra-state rows, IGST rate otherwise
+            with np.errstate(divide='ignore', invalid='ignore'):
+                has_cgst = (taxable_val > 0) & (cgst_amt > 0)
+                has_igst = (taxable_val > 0) & ~has_cgst & (igst_amt > 0)
+                cgst_rate = np.where(has_cgst, cgst_amt / taxable_val * 100, 0.0)
+                igst_rate = np.where(has_igst, igst_amt / taxable_val * 100, 0.0)
+            cgst_rate = sgst_rate = round_values(cgst_rate)
         else:
-            # Handle detailed format with individual invoices
-            data = []
-            for _, row in df.iterrows():
-                # Skip empty rows
-                if pd.isna(row.get('Invoice Date', '')) or row.get('Invoice Date', '') == '':
-                    continue
-                    
-                # Parse date
-                invoice_date = row.get('Invoice Date', '')
-                if not pd.isna(invoice_date):
-                    invoice_date = pd.to_datetime(invoice_date).strftime('%d/%m/%Y')
-                
-                # Get Place of Supply if available
-                place_of_supply = str(row.get('Place Of Supply', '')) if not pd.isna(row.get('Place Of Supply', '')) else ''
-                
-                # Get tax rates - calculate from amounts if needed
-                taxable_val = float(row.get('Taxable Value', 0) or 0)
-                cgst_amt = float(row.get('CGST', 0) or 0)
-                sgst_amt = float(row.get('SGST', 0) or 0)
-                igst_amt = float(row.get('IGST', 0) or 0)
+            def rate_column(record_column):
+                rate = np.nan_to_num(number_column(record_column))
+                if rates == 'fraction':
+                    return rate * 100
+                if rates == 'auto':
+                    return np.where((rate > 0) & (rate < 1), rate * 100, rate)
+                return rate
+            
+            cgst_rate = rate_column('cgst_rate')
+            sgst_rate = rate_column('sgst_rate') if 'sgst_rate' in resolved else cgst_rate
+            igst_rate = rate_column('igst_rate')
+            if 'gst_rate' in resolved:
+                # A whole rate is paid as CGST + SGST within the seller's state and as IGST
+                # outside it; rows that already give split rates keep them
+                whole_rate = rate_column('gst_rate')
+                unsplit = (cgst_rate == 0) & (sgst_rate == 0) & (igst_rate == 0)
+                if any(column in resolved for column in ('cgst_amount', 'sgst_amount', 'igst_amount')):
+                    intra = (np.nan_to_num(number_column('cgst_amount')) + np.nan_to_num(number_column('sgst_amount'))) > 0
+                elif 'seller_gstin' in resolved and 'place_of_supply' in resolved:
+                    seller_states = df[resolved['seller_gstin']].astype(str).str[:2].to_numpy(dtype=object)
+                    intra = place_state_codes(place_of_supply).to_numpy(dtype=object) == seller_states
+                else:
+                    intra = np.zeros(len(df), dtype=bool)
+                cgst_rate = np.where(unsplit & intra, whole_rate / 2, cgst_rate)
+                sgst_rate = np.where(unsplit & intra, whole_rate / 2, sgst_rate)
+                igst_rate = np.where(unsplit & ~intra, whole_rate, igst_rate)
+            cgst_rate = round_values(cgst_rate)
+            sgst_rate = round_values(sgst_rate)
+            # Reports without tax amounts get them from the rates
+            cgst_amt = number_column('cgst_amount') if 'cgst_amount' in resolved else taxable_val * cgst_rate / 100
+            sgst_amt = number_column('sgst_amount') if 'sgst_amount' in resolved else taxable_val * sgst_rate / 100
+            igst_amt = number_column('igst_amount') if 'igst_amount' in resolved else taxable_val * igst_rate / 100
+        
+        if 'total_amount' in resolved:
+            total_amt = number_column('total_amount')
+        else:
+            total_amt = np.nan_to_num(taxable_val) + np.nan_to_num(cgst_amt) + np.nan_to_num(sgst_amt) + np.nan_to_num(igst_amt)
+        
+        columns = {
+            'invoice_date': invoice_dates,
+            'invoice_no': text_column('invoice_no'),
+            'hsn_code': text_column('hsn_code'),
+            'product_name': text_column('product_name'),
+            'quantity': number_column('quantity'),
+            'taxable_value': round_values(taxable_val),
+            'cgst_rate': cgst_rate,
+            'sgst_rate': sgst_rate,
+            'igst_rate': round_values(igst_rate),
+            'cgst_amount': round_values(cgst_amt),
+            'sgst_amount': round_values(sgst_amt),
+            'igst_amount': round_values(igst_amt),
+            'total_amount': round_values(total_amt),
+            'place_of_supply': place_of_supply,
+            'portal': label
+        }
+        return pd.DataFrame(columns, index=df.index)
+    
+    return extract
+
+# Compiled invoice extractors, by portal
+PORTAL_PARSERS = {portal: compile_portal_schema(schema) for portal, schema in PORTAL_SCHEMAS.items()}
+
+def parse_portal_file(file_path, portal, session=None):
+    """Parse an invoice workbook with its portal's compiled schema; returns a typed record frame or None
+
+    CSV reports go through parse_csv_report instead."""
+    schema = PORTAL_SCHEMAS.get(portal, PORTAL_SCHEMAS['custom'])
+    try:
+        with workbook_session(file_path, session) as workbook:
+            sheet_name, skiprows = select_sheet(workbook.sheet_names, schema)
+            logger.debug("Reading %s report from sheet %s", schema['label'], sheet_name)
+            df = workbook.read_sheet(sheet_name, skiprows=skiprows or None)
+        
+        data = typed_frame(PORTAL_PARSERS.get(portal, PORTAL_PARSERS['custom'])(df))
+        logger.debug("Parsed %s %s invoice records", len(data), schema['label'])
+        return data
+    except Exception as e:
+        logger.exception("Error parsing %s file: %s", schema['label'], e)
+        return None
+
+def amazon_b2cs_frame(df):
+    """Read aggregated B2C Small rows (without the header row) by column position"""
+    # Row structure: Type, Place Of Supply, Applicable % of Tax Rate, Rate, Taxable Value, Cess Amount, E-Commerce GSTIN
+    sheet = df.iloc[:, :5]
+    sheet.columns = range(len(sheet.columns))
+    if 1 not in sheet.columns:
+        return pd.DataFrame(columns=B2CS_RECORD_COLUMNS)
+    
+    # Skip rows without a place of supply
+    place_of_supply = sheet[1].astype(str)
+    has_place = ((place_of_supply != 'nan') & (place_of_supply != '')).to_numpy()
+    sheet, place_of_supply = sheet[has_place], place_of_supply[has_place]
+    
+    # Convert rate from decimal (0.18) to percentage (18)
+    rate = pd.to_numeric(sheet[3]).fillna(0).to_numpy(dtype=float) if 3 in sheet.columns else np.zeros(len(sheet))
+    rate = np.trunc(np.where((rate > 0) & (rate < 1), rate * 100, rate)).astype(int)
+    
+    # Skip rows with no taxable value
+    taxable_val = pd.to_numeric(sheet[4]).to_numpy(dtype=float) if 4 in sheet.columns else np.zeros(len(sheet))
+    keep = taxable_val != 0
+    
+    return pd.DataFrame({
+        'place_of_supply': place_of_supply.to_numpy(dtype=object)[keep],
+        'rate': rate[keep],
+        'taxable_value': round_values(taxable_val[keep]),
+        'portal': 'Amazon'
+    }, columns=B2CS_RECORD_COLUMNS)
+
+def gstr1_dates(raw_dates):
+    """Dates as GSTR-1 CSVs write them, "9-May-25"; cells that aren't dates are kept as text"""
+    parsed = raw_dates
+    if not pd.api.types.is_datetime64_any_dtype(parsed):
+        parsed = pd.to_datetime(raw_dates, format='mixed', errors='coerce')
+    day_codes, days = pd.factorize(parsed.dt.normalize())
+    labels = [f"{day.day}-{day.strftime('%b')}-{day.strftime('%y')}" for day in days]
+    # NaT gets code -1, which picks up the trailing '' label
+    dates = pd.Series(np.array(labels + [''], dtype=object)[day_codes], index=raw_dates.index)
+    unparsed = parsed.isna() & raw_dates.notna()
+    dates[unparsed] = raw_dates[unparsed].astype(str)
+    return dates
+
+def extract_amazon_b2b(df):
+    """Map an Amazon B2B sheet to B2B invoice records by column position, one column at a time"""
+    # B2B column order: 0=GSTIN, 1=ReceiverName, 2=InvoiceNumber, 3=InvoiceDate, 
+    # 4=InvoiceValue, 5=PlaceOfSupply, 6=ReverseCharge, 7=App%TaxRate, 8=InvoiceType
+    # 9=E-CommerceGSTIN, 10=Rate, 11=TaxableValue, 12=CessAmount
+    sheet = df.iloc[:, :13]
+    sheet.columns = range(len(sheet.columns))
+    
+    def text_column(position):
+        return sheet[position].astype(str) if position in sheet.columns else ''
+    
+    def number_column(position):
+        return pd.to_numeric(sheet[position]).astype(float) if position in sheet.columns else 0.0
+    
+    # Skip rows without a buyer GSTIN, then zero-value invoices
+    if 0 not in sheet.columns:
+        return pd.DataFrame(columns=B2B_RECORD_COLUMNS)
+    sheet = sheet[sheet[0].notna() & (sheet[0] != '') & (sheet[0].astype(str).str.lower() != 'nan')]
+    sheet = sheet[number_column(4) != 0]
+    if len(sheet) == 0:
+        return pd.DataFrame(columns=B2B_RECORD_COLUMNS)
+    
+    # Format invoice dates as "9-May-25" (day without leading zero, abbreviated month, 2-digit year)
+    invoice_date = gstr1_dates(sheet[3]) if 3 in sheet.columns else ''
+    
+    # Extract state code from place of supply (format: "06-Haryana")
+    place_of_supply = text_column(5)
+    state_code = ''
+    if 5 in sheet.columns:
+        state_code = place_of_supply.str.split('-', n=1).str[0].where(place_of_supply.str.contains('-', regex=False), '')
+    
+    # If rate is a decimal (e.g., 0.18), convert to percentage (18)
+    rate = number_column(10)
+    if 10 in sheet.columns:
+        rate = rate.fillna(0)
+        rate = rate.where(~((rate > 0) & (rate < 1)), rate * 100).astype(int)
+    
+    b2b_df = pd.DataFrame({
+        'buyer_gstin': text_column(0),
+        'buyer_name': '',
+        'invoice_no': text_column(2),
+        'invoice_date': invoice_date,
+        'invoice_value': round_values(number_column(4)),
+        'place_of_supply': place_of_supply,
+        'state_code': state_code,
+        'reverse_charge': 'N',
+        'applicable_tax_rate': '',
+        'invoice_type': 'Regular B2B',
+        'ecommerce_gstin': '',
+        'rate': int(rate) if np.isscalar(rate) else rate,
+        'taxable_value': round_values(number_column(11)) if 11 in sheet.columns else 0.0,
+        'cess_amount': 0
+    }, index=sheet.index)
+    return b2b_df.reset_index(drop=True)
+
+def parse_amazon_b2b(file_path, session=None):
+    """Parse Amazon B2B sheet from Ready to File report"""
+    try:
+        with workbook_session(file_path, session) as workbook:
+            logger.debug("Available sheets: %s", workbook.sheet_names)
+            
+            # Find B2B sheet
+            b2b_sheet = find_b2b_sheet(workbook.sheet_names)
+            if not b2b_sheet:
+                logger.debug("B2B sheet not found")
+                return pd.DataFrame(columns=B2B_RECORD_COLUMNS)
+            logger.debug("Found B2B sheet: %s", b2b_sheet)
+            
+            # Read B2B sheet
+            df = workbook.read_sheet(b2b_sheet, skiprows=2)
+        
+        logger.debug("B2B Columns: %s", df.columns.tolist())
+        logger.debug("B2B Rows: %s", len(df))
+        logger.debug("B2B Sample:\n%s", df.head())
+        
+        if len(df) > 0:
+            # Check if first row is header
+            first_cell = str(df.iloc[0, 0]) if len(df.columns) > 0 else ''
+            if first_cell and first_cell.lower() in B2B_HEADER_LABELS:
+                logger.debug("First row appears to be header, skipping it")
+                # Skip the first row
+                df = df.iloc[1:].reset_index(drop=True)
+                logger.debug("After skipping header, %s rows remain", len(df))
+        
+        b2b_df = typed_frame(extract_amazon_b2b(df))
+        logger.debug("Parsed %s B2B records", len(b2b_df))
+        return b2b_df
+    except Exception as e:
+        logger.exception("Error parsing Amazon B2B: %s", e)
+        return pd.DataFrame(columns=B2B_RECORD_COLUMNS)
+
+def extract_amazon_cdnr(df):
+    """Map an Amazon CDNR sheet to credit/debit note records by column position"""
+    # CDNR column order: 0=GSTIN, 1=ReceiverName, 2=NoteNumber, 3=NoteDate, 4=NoteType,
+    # 5=PlaceOfSupply, 6=ReverseCharge, 7=NoteSupplyType, 8=NoteValue, 9=App%TaxRate,
+    # 10=Rate, 11=TaxableValue, 12=CessAmount
+    sheet = df.iloc[:, :13]
+    sheet.columns = range(len(sheet.columns))
+    
+    def text_column(position, default=''):
+        if position not in sheet.columns:
+            return default
+        return sheet[position].fillna('').astype(str).str.strip().replace('', default)
+    
+    def amount_column(position):
+        # The GSTR-1 CSV takes note amounts as positive numbers; the note type says which way they go
+        return round_values(pd.to_numeric(sheet[position]).astype(float).fillna(0).abs()) if position in sheet.columns else 0.0
+    
+    # Skip rows without a buyer GSTIN, then zero-value notes
+    if 0 not in sheet.columns:
+        return pd.DataFrame(columns=CDNR_RECORD_COLUMNS)
+    sheet = sheet[sheet[0].notna() & (sheet[0] != '') & (sheet[0].astype(str).str.lower() != 'nan')]
+    if 8 in sheet.columns:
+        sheet = sheet[pd.to_numeric(sheet[8]).fillna(0) != 0]
+    if len(sheet) == 0:
+        return pd.DataFrame(columns=CDNR_RECORD_COLUMNS)
+    
+    place_of_supply = text_column(5)
+    rate = pd.to_numeric(sheet[10]).fillna(0) if 10 in sheet.columns else pd.Series(0, index=sheet.index)
+    rate = rate.where(~((rate > 0) & (rate < 1)), rate * 100).astype(int)
+    
+    cdnr_df = pd.DataFrame({
+        'buyer_gstin': text_column(0),
+        'buyer_name': text_column(1),
+        'note_no': text_column(2),
+        'note_date': gstr1_dates(sheet[3]) if 3 in sheet.columns else '',
+        'note_type': text_column(4, 'C').str[0].str.upper() if 4 in sheet.columns else 'C',
+        'place_of_supply': place_of_supply,
+        'state_code': place_state_codes(place_of_supply).to_numpy() if 5 in sheet.columns else '',
+        'reverse_charge': text_column(6, 'N'),
+        'note_supply_type': text_column(7, 'Regular B2B'),
+        'note_value': amount_column(8),
+        'applicable_tax_rate': '',
+        'rate': rate,
+        'taxable_value': amount_column(11),
+        'cess_amount': amount_column(12)
+    }, index=sheet.index)
+    return cdnr_df.reset_index(drop=True)
+
+def parse_amazon_cdnr(file_path, session=None):
+    """Parse the Amazon credit/debit notes (CDNR) sheet from a Ready to File report"""
+    try:
+        with workbook_session(file_path, session) as workbook:
+            cdnr_sheet = find_cdnr_sheet(workbook.sheet_names)
+            if not cdnr_sheet:
+                logger.debug("CDNR sheet not found")
+                return pd.DataFrame(columns=CDNR_RECORD_COLUMNS)
+            # Same preamble as the B2B sheet: two summary rows above the header
+            df = workbook.read_sheet(cdnr_sheet, skiprows=2)
+        
+        if len(df) > 0 and len(df.columns) > 0 and str(df.iloc[0, 0]).lower() in B2B_HEADER_LABELS:
+            df = df.iloc[1:].reset_index(drop=True)
+        
+        cdnr_df = typed_frame(extract_amazon_cdnr(df))
+        logger.debug("Parsed %s CDNR records", len(cdnr_df))
+        return cdnr_df
+    except Exception as e:
+        logger.exception("Error parsing Amazon CDNR: %s", e)
+        return pd.DataFrame(columns=CDNR_RECORD_COLUMNS)
+
+def b2cs_partial(records):
+    """Place of supply, GST rate and taxable value of each sales record, ready to be summed"""
+    partial = pd.DataFrame({
+        'place_of_supply': records['place_of_supply'],
+        'rate': b2cs_rates(records),
+        'taxable_value': records['taxable_value'].astype(float)
+    })
+    if 'invoice_date' in records.columns:
+        # Dated records keep their month, so streamed totals can still be split by period
+        partial.insert(0, 'month', record_months(records['invoice_date'], RECORD_DATE_FORMATS['b2cs']))
+        partial['invoices'] = 1
+    return partial
+
+def sum_b2cs_partials(partials):
+    """Combine partial B2CS totals into one row per place of supply and rate (and month, when dated)"""
+    combined = pd.concat(partials, ignore_index=True)
+    keys = [column for column in ['month', 'place_of_supply', 'rate'] if column in combined.columns]
+    counts = ['invoices'] if 'invoices' in combined.columns else []
+    return money_sums(combined, keys, ['taxable_value'], counts, sort=False)
+
+def b2cs_total_columns(totals):
+    """Record columns of summed B2CS totals, with their month and invoice count when they have them"""
+    return B2CS_RECORD_COLUMNS + [column for column in B2CS_PERIOD_COLUMNS if column in totals.columns]
+
+def stream_amazon_file(file_path, session=None, chunk_rows=STREAM_CHUNK_ROWS):
+    """Parse an Amazon report in chunks, keeping only running B2CS totals in memory.
+
+    Returns pre-aggregated B2CS records (one per place of supply and rate) for both the
+    aggregated B2C Small layout and detailed invoice sheets.
+    """
+    try:
+        with workbook_session(file_path, session) as workbook:
+            b2c_sheet = find_b2c_small_sheet(workbook.sheet_names)
+            # Skip first 2 rows and use row 2 (0-indexed) as header, as parse_amazon_file does
+            chunks = workbook.iter_sheet_chunks(b2c_sheet or 0, skiprows=2 if b2c_sheet else 0, chunk_rows=chunk_rows)
+            
+            totals = None
+            is_header = None
+            rows_read = 0
+            for chunk in chunks:
+                if is_header is None:
+                    # Aggregated B2CS sheets repeat their own header in the first row
+                    first_cell = chunk.iloc[0, 0] if len(chunk) > 0 else None
+                    is_header = isinstance(first_cell, str) and first_cell.lower() == 'type'
+                    if is_header:
+                        chunk = chunk.iloc[1:]
+                rows_read += len(chunk)
                 
-                # Calculate rates
-                cgst_rate = 0
-                sgst_rate = 0
-                igst_rate = 0
-                if taxable_val > 0:
-                    if cgst_amt > 0:
-                        cgst_rate = (cgst_amt / taxable_val) * 100
-                        sgst_rate = cgst_rate
-                    elif igst_amt > 0:
-                        igst_rate = (igst_amt / taxable_val) * 100
+                if is_header:
+                    partial = amazon_b2cs_frame(chunk)
+                else:
+                    partial = b2cs_partial(PORTAL_PARSERS['amazon'](chunk))
                 
-                data.append({
-                    'invoice_date': invoice_date,
-                    'invoice_no': str(row.get('Invoice No', '')),
-                    'hsn_code': str(row.get('HSN', '')),
-                    'product_name': str(row.get('Description', '')),
-                    'quantity': float(row.get('Quantity', 0) or 0),
-                    'taxable_value': round(taxable_val, 2),
-                    'cgst_rate': round(cgst_rate, 2),
-                    'sgst_rate': round(sgst_rate, 2),
-                    'igst_rate': round(igst_rate, 2),
-                    'cgst_amount': round(cgst_amt, 2),
-                    'sgst_amount': round(sgst_amt, 2),
-                    'igst_amount': round(igst_amt, 2),
-                    'total_amount': round(float(row.get('Total', 0) or 0), 2),
-                    'place_of_supply': place_of_supply,
-                    'portal': 'Amazon'
-                })
+                # Fold each chunk into the running totals so memory stays flat
+                parts = [partial] if totals is None else [totals, partial[totals.columns]]
+                totals = sum_b2cs_partials(parts)
+        
+        logger.debug("Streamed %s rows into %s B2CS totals", rows_read, 0 if totals is None else len(totals))
+        if totals is None:
+            return typed_frame(pd.DataFrame(columns=B2CS_RECORD_COLUMNS))
+        totals['portal'] = 'Amazon'
+        return typed_frame(totals[b2cs_total_columns(totals)])
+    except Exception as e:
+        logger.exception("Error streaming Amazon file: %s", e)
+        return None
+
+def stream_amazon_b2b(file_path, session=None, chunk_rows=STREAM_CHUNK_ROWS):
+    """Parse the Amazon B2B sheet in chunks instead of loading the whole sheet"""
+    try:
+        with workbook_session(file_path, session) as workbook:
+            b2b_sheet = find_b2b_sheet(workbook.sheet_names)
+            if not b2b_sheet:
+                logger.debug("B2B sheet not found")
+                return pd.DataFrame(columns=B2B_RECORD_COLUMNS)
             
-            return data
+            frames = []
+            for chunk in workbook.iter_sheet_chunks(b2b_sheet, skiprows=2, chunk_rows=chunk_rows):
+                if not frames and len(chunk) > 0:
+                    # Skip the sheet's own header row
+                    first_cell = str(chunk.iloc[0, 0])
+                    if first_cell.lower() in B2B_HEADER_LABELS:
+                        chunk = chunk.iloc[1:]
+                frames.append(extract_amazon_b2b(chunk))
+        
+        if not frames:
+            return pd.DataFrame(columns=B2B_RECORD_COLUMNS)
+        b2b_df = typed_frame(pd.concat(frames, ignore_index=True))
+        logger.debug("Streamed %s B2B records", len(b2b_df))
+        return b2b_df
+    except Exception as e:
+        logger.exception("Error streaming Amazon B2B: %s", e)
+        return pd.DataFrame(columns=B2B_RECORD_COLUMNS)
+
+def csv_head_rows(file_path, nrows=PROBE_ROWS):
+    """First rows of a CSV report as lists of strings, without reading the rest of the file"""
+    with open(file_path, newline='', encoding='utf-8-sig', errors='replace') as f:
+        return [row for _, row in zip(range(nrows), csv.reader(f))]
+
+def csv_layout(rows, schema):
+    """(layout, header row) of a CSV report, found from its first rows.
+
+    Layouts are 'b2b' (GSTR-1 B2B), 'aggregated_b2cs', 'invoices' (the portal
+    schema's invoice report) or 'unknown'.
+    """
+    candidates = schema_candidates(schema)
+    for idx, row in enumerate(rows):
+        labels = [normalize_header(cell) for cell in row]
+        if labels and labels[0] in B2B_HEADER_LABELS and (
+                labels[0] != 'gstin' or all(label in labels for label in B2B_CSV_LABELS)):
+            return 'b2b', idx
+        if 'type' in labels and all(label in labels for label in B2CS_CSV_COLUMNS):
+            return 'aggregated_b2cs', idx
+        if schema['required'] in resolve_columns(row, candidates):
+            return 'invoices', idx
+    return 'unknown', 0
+
+def csv_report_columns(layout, header, schema):
+    """{header position: (column label the parser expects, dtype)} for the CSV columns a layout needs"""
+    if layout == 'b2b':
+        # extract_amazon_b2b reads the GSTR-1 B2B columns by position
+        return {position: (position, dtype) for position, dtype in B2B_CSV_COLUMNS.items() if position < len(header)}
+    labels = [normalize_header(cell) for cell in header]
+    if layout == 'aggregated_b2cs':
+        # amazon_b2cs_frame reads columns by their position in Amazon's B2C Small sheet
+        return {labels.index(label): spec for label, spec in B2CS_CSV_COLUMNS.items()}
+    positions = {}
+    for position, column in enumerate(header):
+        positions.setdefault(column, position)
+    return {
+        positions[column]: (column, str if record_column in INVOICE_TEXT_COLUMNS else float)
+        for record_column, column in resolve_columns(header, schema_candidates(schema)).items()
+    }
+
+def read_csv_chunks(file_path, header_row, columns, chunk_rows=CSV_CHUNK_ROWS):
+    """Yield frames of up to chunk_rows data rows holding only the given columns, labelled for the parsers"""
+    positions = sorted(columns)
+    labels = {position: columns[position][0] for position in positions}
+    # Positional parsers need every column up to the last one they read
+    width = max(labels.values()) + 1 if all(isinstance(label, int) for label in labels.values()) else None
+    reader = pd.read_csv(
+        file_path, header=None, skiprows=header_row + 1, usecols=positions,
+        dtype={position: columns[position][1] for position in positions}, thousands=',',
+        engine='c', encoding='utf-8-sig', encoding_errors='replace', chunksize=chunk_rows
+    )
+    with reader:
+        for chunk in reader:
+            chunk = chunk.rename(columns=labels)
+            yield chunk.reindex(columns=range(width)) if width else chunk
+
+def parse_csv_report(file_path, portal='custom', streaming=False, layouts=None, chunk_rows=CSV_CHUNK_ROWS):
+    """Parse a CSV report chunk by chunk, reading only the columns its layout needs.
+
+    Returns (layout, records): B2B records for GSTR-1 B2B files, otherwise sales records,
+    summed into B2CS totals as they are read when streaming. records is None when the
+    file can't be parsed or its layout is not one of layouts. Raises ValueError,
+    naming the headers looked for, when the file has none of the known layouts.
+    """
+    schema = PORTAL_SCHEMAS.get(portal, PORTAL_SCHEMAS['custom'])
+    try:
+        rows = csv_head_rows(file_path)
+    except Exception as e:
+        logger.exception("Error reading CSV file: %s", e)
+        return 'unknown', None
+    layout, header_row = csv_layout(rows, schema)
+    logger.debug("CSV layout %s with header on row %s", layout, header_row)
+    if layouts is not None and layout not in layouts:
+        return layout, None
+    if layout == 'unknown':
+        names = schema['columns'][schema['required']]
+        names = ' or '.join(f"'{name}'" for name in ([names] if isinstance(names, str) else names))
+        raise ValueError(f"Unrecognised CSV layout: expected a {schema['label']} invoice report with a {names} column, "
+                         "a GSTR-1 B2B CSV starting with 'GSTIN/UIN of Recipient', or an aggregated B2CS CSV "
+                         "with 'Type', 'Place Of Supply', 'Rate' and 'Taxable Value' columns")
+    
+    try:
+        extract = PORTAL_PARSERS.get(portal, PORTAL_PARSERS['custom'])
+        frames = []
+        totals = None
+        with stage('csv_read') as record:
+            record['rows'] = 0
+            for chunk in read_csv_chunks(file_path, header_row, csv_report_columns(layout, rows[header_row], schema), chunk_rows):
+                record['rows'] += len(chunk)
+                if layout == 'b2b':
+                    frames.append(extract_amazon_b2b(chunk))
+                    continue
+                records = amazon_b2cs_frame(chunk) if layout == 'aggregated_b2cs' else extract(chunk)
+                if streaming:
+                    # Fold each chunk into the running totals so memory stays flat
+                    partial = b2cs_partial(records)
+                    totals = sum_b2cs_partials([partial] if totals is None else [totals, partial])
+                else:
+                    frames.append(records)
+        
+        if layout != 'b2b' and streaming:
+            records = totals if totals is not None else pd.DataFrame(columns=B2CS_RECORD_COLUMNS)
+        elif frames:
+            records = pd.concat(frames, ignore_index=True)
+        else:
+            records = pd.DataFrame(columns=B2B_RECORD_COLUMNS if layout == 'b2b' else
+                                   B2CS_RECORD_COLUMNS if layout == 'aggregated_b2cs' else INVOICE_RECORD_COLUMNS)
+        if layout != 'b2b' and (streaming or layout == 'aggregated_b2cs'):
+            records['portal'] = schema['label']
+            records = records[b2cs_total_columns(records)]
+        logger.debug("Parsed %s records from %s CSV", len(records), layout)
+        return layout, typed_frame(records)
     except Exception as e:
-        print(f"Error parsing Amazon file: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error parsing CSV file: %s", e)
+        return layout, None
+
+def csv_report_gstin(file_path):
+    """Seller GSTIN of a CSV report: the first value of a seller GSTIN column, else below a 'Merchant GSTIN' label"""
+    try:
+        rows = csv_head_rows(file_path, PROBE_ROWS + 1)
+        for idx, row in enumerate(rows[:-1]):
+            labels = [normalize_header(cell) for cell in row]
+            for label in SELLER_GSTIN_LABELS:
+                if label in labels and labels.index(label) < len(rows[idx + 1]):
+                    gstin = rows[idx + 1][labels.index(label)].strip()
+                    if len(gstin) >= 10 and gstin.isalnum():
+                        return gstin
+        return find_merchant_gstin(rows)
+    except Exception as e:
+        logger.exception("Error extracting GSTIN: %s", e)
         return None
 
-def parse_amazon_b2b(file_path):
-    """Parse Amazon B2B sheet from Ready to File report"""
+def b2cs_rates(df):
+    """GST rate of each B2CS row: the whole rate, CGST + SGST for intra-state sales, snapped to its slab"""
+    # Check if data already has 'rate' (from Amazon aggregated format)
+    if 'rate' in df.columns:
+        return pd.to_numeric(df['rate']).to_numpy()
+    # Intra-state rows split the rate between CGST and SGST; the rest pay it all as IGST
+    cgst_rate = pd.to_numeric(df['cgst_rate']).fillna(0).to_numpy(dtype=float)
+    sgst_rate = pd.to_numeric(df['sgst_rate']).fillna(0).to_numpy(dtype=float) if 'sgst_rate' in df.columns else cgst_rate
+    igst_rate = pd.to_numeric(df['igst_rate']).fillna(0).to_numpy(dtype=float)
+    return snap_rates(np.where(cgst_rate > 0, cgst_rate + sgst_rate, np.where(igst_rate > 0, igst_rate, 0)))
+
+def snap_rates(rates):
+    """Rates within RATE_SLAB_TOLERANCE of a GST slab become the slab; others are kept to two decimals"""
+    slabs = np.asarray(GST_RATE_SLABS, dtype=float)
+    rates = np.asarray(rates, dtype=float)
+    upper = np.clip(np.searchsorted(slabs, rates), 1, len(slabs) - 1)
+    lower, upper = slabs[upper - 1], slabs[upper]
+    nearest = np.where(rates - lower <= upper - rates, lower, upper)
+    snapped = np.where(np.abs(rates - nearest) <= RATE_SLAB_TOLERANCE, nearest, round_values(rates))
+    # Whole-number rates stay integers, as the CSV and the GSTR-1 'rt' field write them
+    return snapped.astype(int) if (snapped == np.trunc(snapped)).all() else snapped
+
+def generate_aggregated_b2cs(data):
+    """Generate aggregated B2CS format by state and tax rate"""
+    try:
+        df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+        return b2cs_output_frame(b2cs_totals(df))
+    except Exception as e:
+        logger.exception("Error generating aggregated B2CS: %s", e)
+        return pd.DataFrame(columns=B2CS_COLUMNS)
+
+def b2cs_totals(df):
+    """Taxable value totals of sales records per state code and rate, sorted by both"""
+    rate = b2cs_rates(df)
+    
+    # Sum taxable values per distinct place of supply and rate first; a quarter
+    # only has a few dozen places, so the state code split below stays tiny
+    # Amounts are summed as int64 paise, so totals are exact however many rows there are
+    place_codes, places = pd.factorize(df['place_of_supply'])
+    grouped = pd.DataFrame({
+        'place': place_codes,
+        'rate': rate,
+        'taxable_value': to_paise(pd.to_numeric(df['taxable_value']))
+    }).groupby(['place', 'rate'], sort=False)['taxable_value'].sum().reset_index()
+    
+    # Extract state code from place_of_supply (format: XX-StateName)
+    # Blank places factorize to -1, which picks up the trailing ''
+    grouped['state_code'] = np.append(place_state_codes(places).to_numpy(dtype=object), '')[grouped['place']]
+    
+    # Group by state_code and rate, then sum taxable values
+    totals = grouped.groupby(['state_code', 'rate'])['taxable_value'].sum().reset_index()
+    totals['taxable_value'] = from_paise(totals['taxable_value'])
+    return totals
+
+def place_state_codes(places):
+    """State code of each place of supply ('06' for '06-Haryana'), '' where it has none"""
+    places = pd.Series(places, dtype=object)
+    return places.str.split('-', n=1).str[0].where(places.str.contains('-', regex=False), '')
+
+def state_places(state_codes):
+    """Places of supply as the GST portal writes them ('06-Haryana') for state codes"""
+    return state_codes + '-' + state_codes.map(STATE_MAPPING).fillna('Unknown')
+
+def b2cs_output_frame(grouped):
+    """B2CS CSV rows from taxable value totals per state code and rate"""
+    return pd.DataFrame({
+        'Type': 'OE',
+        'Place Of Supply': state_places(grouped['state_code']),
+        'Rate': grouped['rate'],
+        'Applicable % of Tax Rate': '',
+        'Taxable Value': round_values(grouped['taxable_value']),
+        'Cess Amount': '',
+        'E-Commerce GSTIN': ''
+    }, columns=B2CS_COLUMNS)
+
+def generate_b2b_csv(data):
+    """Generate B2B CSV format for GSTR-1"""
+    try:
+        df = data if isinstance(data, pd.DataFrame) else pd.DataFrame(data)
+        
+        # Rename the record columns to GSTR-1 headers, filling in defaults for missing ones
+        return pd.DataFrame({
+            header: df[column] if column in df.columns else default
+            for column, header, default in GSTR1_B2B_COLUMNS
+        }, index=df.index)
+    except Exception as e:
+        logger.exception("Error generating B2B CSV: %s", e)
+        return pd.DataFrame(columns=[header for _, header, _ in GSTR1_B2B_COLUMNS])
+
+def generate_cdnr_csv(data):
+    """Generate CDNR (credit/debit notes to registered buyers) CSV format for GSTR-1"""
+    # Rename the record columns to GSTR-1 headers, filling in defaults for missing ones
+    return pd.DataFrame({
+        header: data[column] if column in data.columns else default
+        for column, header, default in GSTR1_CDNR_COLUMNS
+    }, index=data.index)
+
+def section_export(section, records):
+    """The GSTR-1 CSV rows a section's records export as"""
+    if section == 'b2cs':
+        return generate_aggregated_b2cs(records)
+    if section == 'b2b':
+        return generate_b2b_csv(records)
+    return generate_cdnr_csv(records)
+
+def reconcile_sections(sections, reported_totals=None):
+    """Per-section check that parsed records, exported CSV rows and the portal's printed totals agree to the paisa.
+
+    sections maps section names to their records; reported_totals maps them to
+    the taxable value totals printed in the source sheets, where there were any.
+    """
+    reported_totals = reported_totals or {}
+    checks = []
+    for section, records in sections.items():
+        if records is None:
+            continue
+        with stage('reconcile') as record:
+            output = section_export(section, records)
+            parsed = int(to_paise(records['taxable_value']).sum()) if len(records) else 0
+            exported = int(to_paise(output['Taxable Value']).sum()) if len(output) else 0
+            record['rows'] = len(records)
+        reported = reported_totals.get(section)
+        # Portals may print credit note totals as negative amounts; the CSV holds them as positive
+        reported_paise = None if reported is None else int(to_paise([abs(reported) if section == 'cdnr' else reported])[0])
+        checks.append({
+            'section': section,
+            'records': len(records),
+            'output_rows': len(output),
+            'parsed_taxable_value': parsed / 100,
+            'exported_taxable_value': exported / 100,
+            'reported_taxable_value': reported,
+            'difference': (exported - parsed) / 100,
+            'reconciled': exported == parsed and reported_paise in (None, parsed)
+        })
+    return checks
+
+def gstin_checks(gstins):
+    """(well-formed, checksum ok) boolean arrays for an array of GSTINs, checked over the whole array at once"""
+    text = pd.Series(np.asarray(gstins, dtype=object)).fillna('').astype(str)
+    well_formed = text.str.fullmatch(GSTIN_PATTERN).to_numpy(dtype=bool)
+    checksum_ok = np.zeros(len(text), dtype=bool)
+    if well_formed.any():
+        # One row of 15 character values per GSTIN; the mod-36 check weighs alternate characters by 1 and 2
+        codes = np.frombuffer(''.join(text[well_formed]).encode('ascii'), dtype=np.uint8).reshape(-1, 15)
+        lookup = np.zeros(256, dtype=np.int64)
+        lookup[np.frombuffer(GSTIN_CHARS.encode('ascii'), dtype=np.uint8)] = np.arange(36)
+        values = lookup[codes]
+        products = values[:, :14] * np.tile([1, 2], 7)
+        total = (products // 36 + products % 36).sum(axis=1)
+        checksum_ok[well_formed] = values[:, 14] == (36 - total % 36) % 36
+    return well_formed, checksum_ok
+
+def validation_issues(section, mask, column, values, code, severity, message):
+    """Report rows for the records flagged in mask"""
+    rows = np.flatnonzero(mask)
+    return pd.DataFrame({
+        'section': section,
+        'row': rows + 1,
+        'column': column,
+        # Offending values come from text and number columns alike, so they are kept as text
+        'value': pd.Series(values).iloc[rows].astype(str).to_numpy(dtype=object),
+        'code': code,
+        'severity': severity,
+        'message': message
+    }, columns=VALIDATION_COLUMNS)
+
+def validate_records(section, records):
+    """Row-level problems in one section's records: GSTINs, state codes, rate slabs and duplicate invoices"""
+    issues = []
+    if records is None or len(records) == 0:
+        return issues
+    
+    if 'state_code' in records.columns:
+        state_codes = records['state_code'].astype(object).fillna('').astype(str).to_numpy(dtype=object)
+    else:
+        state_codes = place_state_codes(np.asarray(records['place_of_supply'], dtype=object)).to_numpy(dtype=object)
+    known_state = pd.Series(state_codes).isin(STATE_MAPPING).to_numpy()
+    issues.append(validation_issues(section, ~known_state, 'place_of_supply', records['place_of_supply'],
+                                    'unknown_state', 'error', 'Place of supply has no known state code'))
+    
+    if 'buyer_gstin' in records.columns:
+        # Buyers repeat across invoices, so each distinct GSTIN is checked once
+        buyer_codes, buyers = pd.factorize(np.asarray(records['buyer_gstin'], dtype=object))
+        well_formed, checksum_ok = (np.append(checks, False)[buyer_codes] for checks in gstin_checks(buyers))
+        buyer_gstins = np.append(np.asarray(buyers, dtype=object), '')[buyer_codes]
+        issues.append(validation_issues(section, ~well_formed, 'buyer_gstin', buyer_gstins, 'gstin_format', 'error',
+                                        'Buyer GSTIN is not a well-formed 15-character GSTIN'))
+        issues.append(validation_issues(section, well_formed & ~checksum_ok, 'buyer_gstin', buyer_gstins, 'gstin_checksum', 'error',
+                                        'Buyer GSTIN check character does not match'))
+        buyer_states = np.array([gstin[:2] for gstin in buyers.tolist()] + [''], dtype=object)[buyer_codes]
+        issues.append(validation_issues(section, well_formed & known_state & (buyer_states != state_codes), 'place_of_supply',
+                                        records['place_of_supply'], 'pos_mismatch', 'warning',
+                                        "Place of supply is not the buyer GSTIN's state"))
+    
+    # Intra-state sales are checked on CGST + SGST together, not on either half
+    rates = b2cs_rates(records) if section == 'b2cs' else pd.to_numeric(records['rate']).to_numpy()
+    issues.append(validation_issues(section, ~np.isin(rates, GST_RATE_SLABS), 'rate', rates, 'rate_slab', 'error',
+                                    'Rate is not a GST rate slab'))
+    
+    keys = DUPLICATE_KEYS[section]
+    if all(key in records.columns for key in keys):
+        duplicated = records[keys].duplicated(keep=False).to_numpy()
+        issues.append(validation_issues(section, duplicated, keys[0], records[keys[0]],
+                                        'duplicate_invoice', 'error', 'The same invoice line appears more than once'))
+        if 'buyer_gstin' in records.columns:
+            # Count distinct buyers per number from the distinct (number, buyer) code pairs
+            numbers = pd.factorize(np.asarray(records[keys[0]], dtype=object))[0].astype(np.int64) + 1
+            buyers = pd.factorize(np.asarray(records['buyer_gstin'], dtype=object))[0].astype(np.int64) + 1
+            width = buyers.max() + 1
+            pairs = np.unique(numbers * width + buyers)
+            reused = np.bincount(pairs // width, minlength=numbers.max() + 1)[numbers] > 1
+            issues.append(validation_issues(section, reused, keys[0], records[keys[0]],
+                                            'invoice_reused', 'error', 'The same invoice number is billed to more than one buyer'))
+    return issues
+
+def validation_report(sections, seller_gstin=None):
+    """Row-level validation report of a dataset's sections (and its seller GSTIN), one row per problem"""
+    issues = []
+    if seller_gstin:
+        well_formed, checksum_ok = gstin_checks([seller_gstin])
+        if not checksum_ok[0]:
+            issues.append(pd.DataFrame([{
+                'section': 'dataset', 'row': 0, 'column': 'gstin', 'value': seller_gstin,
+                'code': 'gstin_checksum' if well_formed[0] else 'gstin_format', 'severity': 'error',
+                'message': 'Seller GSTIN check character does not match' if well_formed[0] else 'Seller GSTIN is not a well-formed 15-character GSTIN'
+            }], columns=VALIDATION_COLUMNS))
+    with stage('validate') as record:
+        for section, records in sections.items():
+            issues.extend(validate_records(section, records))
+        record['rows'] = sum(len(records) for records in sections.values() if records is not None)
+    issues = [frame for frame in issues if not frame.empty]
+    if not issues:
+        return pd.DataFrame(columns=VALIDATION_COLUMNS)
+    return pd.concat(issues, ignore_index=True)
+
+def validation_counts(report):
+    """Error and warning totals of a validation report, with a count per problem code"""
+    severity = report['severity'].value_counts()
+    return {
+        'errors': int(severity.get('error', 0)),
+        'warnings': int(severity.get('warning', 0)),
+        'codes': {code: int(count) for code, count in report['code'].value_counts().items()}
+    }
+
+def record_months(dates, date_format):
+    """'YYYY-MM' month of each record's formatted invoice date, '' where it has none"""
+    # Records share a few hundred distinct dates, so each one is parsed once
+    codes, days = pd.factorize(np.asarray(dates, dtype=object))
+    months = pd.to_datetime(pd.Series(days, dtype=object), format=date_format, errors='coerce').dt.strftime('%Y-%m')
+    return np.append(months.fillna('').to_numpy(dtype=object), '')[codes]
+
+def partial_columns(records, section, period=None):
+    """Month, state code, rate, taxable value, cess and invoice count of each sales or B2B record.
+
+    Records without invoice dates (aggregated B2CS rows) get period, a 'YYYY-MM'
+    month, or '' when there is none.
+    """
+    if 'month' in records.columns:
+        # Streamed B2CS totals are already split by month
+        months = records['month'].to_numpy(dtype=object)
+        invoices = pd.to_numeric(records['invoices']).to_numpy()
+    elif 'invoice_date' in records.columns:
+        months = record_months(records['invoice_date'], RECORD_DATE_FORMATS[section])
+        invoices = 1
+    else:
+        months = period or ''
+        invoices = 0
+    if 'state_code' in records.columns:
+        state_codes = records['state_code'].to_numpy(dtype=object)
+    else:
+        place_codes, places = pd.factorize(np.asarray(records['place_of_supply'], dtype=object))
+        state_codes = np.append(place_state_codes(places).to_numpy(dtype=object), '')[place_codes]
+    
+    return pd.DataFrame({
+        'month': months,
+        'state_code': state_codes,
+        'rate': b2cs_rates(records),
+        'taxable_value': pd.to_numeric(records['taxable_value']).to_numpy(dtype=float),
+        'cess_amount': pd.to_numeric(records['cess_amount']).to_numpy(dtype=float) if 'cess_amount' in records.columns else 0.0,
+        'invoices': invoices
+    })
+
+def summary_index(records, section, period=None):
+    """Taxable value, cess, invoice and record counts per (month, state code, rate) of sales or B2B records.
+
+    Records without invoice dates (aggregated B2CS rows) are counted in period, a
+    'YYYY-MM' month, or under month '' when there is none.
+    """
+    if records is None or len(records) == 0:
+        return pd.DataFrame(columns=SUMMARY_COLUMNS)
+    columns = partial_columns(records, section, period).assign(records=1)
+    index = money_sums(columns, ['month', 'state_code', 'rate'], ['taxable_value', 'cess_amount'],
+                       ['invoices', 'records'], sort=False)
+    index.insert(0, 'section', section)
+    return index
+
+def combine_summaries(indexes):
+    """One summary index from the indexes of several sections"""
+    indexes = [index for index in indexes if not index.empty]
+    return pd.concat(indexes, ignore_index=True) if indexes else pd.DataFrame(columns=SUMMARY_COLUMNS)
+
+def summary_partials(index):
+    """Monthly partial sums in a summary index: its rows with a month, without record counts"""
+    return index.loc[index['month'] != '', PARTIAL_COLUMNS[1:]].reset_index(drop=True)
+
+def period_partials(records, section, period=None):
+    """Taxable value, cess and invoice count per (month, state code, rate) of sales or B2B records.
+
+    Records without invoice dates (aggregated B2CS rows) are counted in period, a
+    'YYYY-MM' month, and left out when there is none.
+    """
+    return summary_partials(summary_index(records, section, period))
+
+def merge_period_partials(partials, section):
+    """Sum the stored partials of one section into one row per state code and rate"""
+    rows = partials[partials['section'] == section]
+    return money_sums(rows, ['state_code', 'rate'], ['taxable_value', 'cess_amount'], ['invoices'])
+
+def b2b_summary_frame(grouped):
+    """B2B totals per place of supply and rate from merged partials"""
+    return pd.DataFrame({
+        'Place Of Supply': state_places(grouped['state_code']),
+        'Rate': grouped['rate'],
+        'Taxable Value': round_values(grouped['taxable_value']),
+        'Cess Amount': round_values(grouped['cess_amount']),
+        'Invoices': grouped['invoices']
+    })
+
+def parse_uploaded_file(file_path, portal, streaming=False):
+    """Parse an uploaded report for a portal; returns its data, GSTIN and debug info, an {'error'} for unreadable workbooks, or None"""
+    schema = PORTAL_SCHEMAS.get(portal, PORTAL_SCHEMAS['custom'])
+    ready_to_file = schema.get('ready_to_file', False)
+    # Workbooks are opened once and shared by every parser below
+    try:
+        session = None if file_path.lower().endswith('.csv') else WorkbookSession(file_path)
+    except UNREADABLE_WORKBOOK_ERRORS as e:
+        logger.warning("Unreadable workbook %s: %s", file_path, e)
+        return {'error': f'Not a readable Excel workbook: {str(e)}'}
+    try:
+        # Parse file based on portal
+        with stage('parse') as record:
+            b2b = None
+            if session is None:
+                try:
+                    layout, data = parse_csv_report(file_path, portal, streaming)
+                except ValueError as e:
+                    return {'error': str(e)}
+                if layout == 'b2b' and data is not None:
+                    # GSTR-1 B2B files have no sales rows of their own
+                    b2b, data = data, typed_frame(pd.DataFrame(columns=B2CS_RECORD_COLUMNS))
+            elif ready_to_file and streaming:
+                data = stream_amazon_file(file_path, session=session)
+            elif ready_to_file:
+                data = parse_amazon_file(file_path, session=session)
+            else:
+                data = parse_portal_file(file_path, portal, session=session)
+            record['rows'] = len(data) if data is not None else 0
+        
+        if data is None:
+            return None
+        
+        cdnr = None
+        reported_totals = {}
+        if session is not None and ready_to_file:
+            # Every other GSTR-1 section comes out of the same workbook load too, so
+            # later generate and export calls never have to open the workbook again
+            with stage('parse_b2b') as record:
+                if streaming:
+                    b2b = stream_amazon_b2b(file_path, session=session)
+                else:
+                    b2b = parse_amazon_b2b(file_path, session=session)
+                record['rows'] = len(b2b)
+            with stage('parse_cdnr') as record:
+                cdnr = parse_amazon_cdnr(file_path, session=session)
+                record['rows'] = len(cdnr)
+            reported_totals = workbook_reported_totals(session)
+        
+        # Extract GSTIN from Amazon file
+        gstin = None
+        if session is None:
+            with stage('gstin_extraction'):
+                gstin = csv_report_gstin(file_path)
+            logger.info("Extracted GSTIN: %s", gstin)
+        elif ready_to_file:
+            with stage('gstin_extraction'):
+                gstin = extract_gstin_from_amazon_file(file_path, session=session)
+            logger.info("Extracted GSTIN: %s", gstin)
+            
+            # If no GSTIN found in GSTIN sheet, try to extract from B2CS E-Commerce GSTIN column
+            if not gstin and len(data) > 0:
+                try:
+                    if 'place_of_supply' in data.columns and data['portal'].iloc[0] == 'Amazon':
+                        # In aggregated format, we can get GSTIN from the Excel file's B2CS sheet
+                        b2c_sheet = find_b2c_small_sheet(session.sheet_names)
+                        if b2c_sheet:
+                            # Two preamble rows, the sheet header, the B2CS header, then the first data row
+                            rows = session.head_rows(b2c_sheet, 5)
+                            # The E-Commerce GSTIN is typically in column 6 (index 6)
+                            if len(rows) > 4:  # Skip header row
+                                ecommerce_gstin = str(rows[4][6]) if len(rows[4]) > 6 and rows[4][6] is not None else ''
+                                if ecommerce_gstin and len(ecommerce_gstin.strip()) >= 10:
+                                    gstin = ecommerce_gstin.strip()
+                                    logger.info("Extracted GSTIN from B2CS sheet E-Commerce column: %s", gstin)
+                except Exception as e:
+                    logger.warning("Error extracting GSTIN from data: %s", e)
+        
+        # Add debug info
+        debug_info = []
+        if session is None:
+            debug_info.append(f"CSV layout: {layout}")
+        elif ready_to_file:
+            try:
+                debug_info.append(f"Sheets: {session.sheet_names}")
+                if session.sheet_names and streaming:
+                    # Don't load a whole sheet just for debug output
+                    header = session.head_rows(0, 1)
+                    debug_info.append(f"Columns in first sheet: {list(header[0]) if header else []}")
+                    debug_info.append("Parsed in streaming mode")
+                elif session.sheet_names:
+                    df_temp = session.read_sheet(0)
+                    debug_info.append(f"Columns in first sheet: {df_temp.columns.tolist()}")
+                    debug_info.append(f"Rows in sheet: {len(df_temp)}")
+            except:
+                pass
+    finally:
+        if session is not None:
+            session.close()
+    
+    parsed = {'data': data, 'gstin': gstin, 'debug_info': debug_info, 'reported_totals': reported_totals}
+    if b2b is not None:
+        parsed['b2b'] = b2b
+    if cdnr is not None:
+        parsed['cdnr'] = cdnr
+    return parsed
+
+# Jobs submitted to the worker pool, by job id
+JOBS = {}
+_jobs_lock = threading.Lock()
+_job_executor = None
+# Threads that run a job's finish step, so the pool's manager thread only hands results over
+_job_finisher = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix='job-finish')
+
+def job_executor():
+    """The worker process pool, started on first use"""
+    global _job_executor
+    with _jobs_lock:
+        if _job_executor is None:
+            _job_executor = ProcessPoolExecutor(max_workers=JOB_WORKERS)
+        return _job_executor
+
+def submit_job(job_type, func, *args, finish=None):
+    """Run func(*args) in a worker process and return a job id to poll.
+
+    finish(result) runs back in this process once the worker is done and returns
+    the job's (body, status); without it the worker's return value is the result.
+    """
+    job_id = uuid.uuid4().hex
+    job = {
+        'id': job_id,
+        'type': job_type,
+        'status': 'queued',
+        'submitted_at': time.time(),
+        'finished_at': None,
+        'result': None,
+        'error': None,
+        'stages': [],
+        'future': None
+    }
+    with _jobs_lock:
+        # Forget jobs that finished long ago
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for old_id in [i for i, j in JOBS.items() if j['finished_at'] and j['finished_at'] < cutoff]:
+            del JOBS[old_id]
+        JOBS[job_id] = job
+    
+    executor = job_executor()
+    future = executor.submit(run_instrumented, func, *args)
+    job['future'] = future
+    METRICS.count(f"jobs.{job_type}.submitted")
+    future.add_done_callback(lambda done: _job_finisher.submit(complete_job, job, done, finish, executor))
+    return job_id
+
+def complete_job(job, future, finish, executor):
+    """Record the outcome of a job's worker call, running finish on a finisher thread"""
+    global _job_executor
+    with _jobs_lock:
+        if job['status'] == 'cancelled' or future.cancelled():
+            job['status'] = 'cancelled'
+            job['finished_at'] = job['finished_at'] or time.time()
+            return
+    result, error = None, None
+    try:
+        result, job['stages'] = collect_instrumented(future.result())
+        body, status = finish(result) if finish else (result, 200)
+        if status >= 400:
+            error = body.get('error', f'Job failed with status {status}')
+        else:
+            result = body
+    except Exception as e:
+        if isinstance(e, BrokenProcessPool):
+            # A worker died (e.g. out of memory); start a fresh pool for later jobs
+            with _jobs_lock:
+                if _job_executor is executor:
+                    _job_executor = None
+        logger.error("Error in %s job %s: %s", job['type'], job['id'], e)
+        error = str(e)
+    with _jobs_lock:
+        if job['status'] == 'cancelled':
+            # Cancelled while it ran; its result is dropped
+            return
+        if error is None:
+            job['status'] = 'done'
+            job['result'] = result
+        else:
+            job['status'] = 'failed'
+            job['error'] = error
+        job['finished_at'] = time.time()
+    METRICS.count(f"jobs.{job['type']}.{job['status']}")
+    METRICS.observe(f"job.{job['type']}", job['finished_at'] - job['submitted_at'])
+
+def job_status(job):
+    """JSON-friendly view of a job"""
+    status = job['status']
+    if status == 'queued' and job['future'] is not None and job['future'].running():
+        status = 'running'
+    finished_at = job['finished_at'] or time.time()
+    return {
+        'job_id': job['id'],
+        'type': job['type'],
+        'status': status,
+        'submitted_at': datetime.fromtimestamp(job['submitted_at']).isoformat(),
+        'elapsed_seconds': round(finished_at - job['submitted_at'], 3),
+        'result': job['result'],
+        'error': job['error'],
+        'stages': job['stages']
+    }
+
+def cancel_job(job):
+    """Cancel a job; queued jobs never start, running jobs finish but their result is dropped"""
+    with _jobs_lock:
+        if job['status'] != 'queued':
+            return False
+        job['status'] = 'cancelled'
+        job['finished_at'] = time.time()
+    if job['future'] is not None:
+        job['future'].cancel()
+    return True
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+    _stage_log.stages = []
+
+@app.after_request
+def record_request_metrics(response):
+    """Per-endpoint latency and status counters; requests that ran pipeline stages are logged with their breakdown"""
+    started = g.get('request_started')
+    if started is None:
+        return response
+    elapsed = time.perf_counter() - started
+    endpoint = f"{request.method} {request.url_rule.rule if request.url_rule else 'unmatched'}"
+    METRICS.observe(f"request.{endpoint}", elapsed)
+    METRICS.count(f"responses.{endpoint}.{response.status_code}")
+    stages = getattr(_stage_log, 'stages', None) or []
+    _stage_log.stages = None
+    if stages:
+        breakdown = ', '.join(f"{s['stage']}={s['seconds']:.3f}s" for s in stages)
+        logger.info("%s %s in %.3fs (%s)", endpoint, response.status_code, elapsed, breakdown)
+    else:
+        logger.debug("%s %s in %.3fs", endpoint, response.status_code, elapsed)
+    return response
+
+@app.route('/api/metrics', methods=['GET'])
+def get_metrics():
+    """Request latency histograms, pipeline stage timings and counters (worker jobs included)"""
+    return jsonify(METRICS.snapshot())
+
+@app.route('/api/health', methods=['GET'])
+def health_check():
+    return jsonify({'status': 'ok', 'message': 'SellerSuite API is running'})
+
+def finish_upload(parsed, filename, portal, report_frequency, cache_key, period=None, gstin=None):
+    """Cache a fresh upload parse and build the /api/upload response; (body, status)"""
+    if parsed is None:
+        return {'error': 'Failed to parse file'}, 500
+    if 'error' in parsed:
+        return {'error': parsed['error']}, 400
+    parsed['filename'] = filename
+    body = upload_response(parsed, portal, report_frequency, cache_key, period, gstin)
+    # Cached after the dataset is stored, so the entry records its id
+    store_parse_cache(cache_key, parsed)
+    return body, 200
+
+def cached_upload_response(parsed, portal, report_frequency, cache_key, period=None, gstin=None):
+    """upload_response for a parse cache hit; a dataset stored for it is recorded in the cache entry"""
+    known = dict(parsed.get('datasets') or {})
+    body = upload_response(parsed, portal, report_frequency, cache_key, period, gstin)
+    if parsed['datasets'] != known:
+        update_parse_cache(cache_key, datasets=parsed['datasets'])
+    return body
+
+def upload_response(parsed, portal, report_frequency, cache_key, period=None, gstin=None):
+    """Store a parsed upload as a dataset (and its monthly partials) and build the /api/upload response body.
+
+    gstin is used for reports that don't name their seller GSTIN. parsed['datasets']
+    maps upload options to the dataset stored for them, so uploading the same file
+    again with the same options answers with that dataset instead of storing another.
+    """
+    data = parsed['data']
+    gstin = parsed['gstin'] or gstin
+    debug_info = parsed['debug_info']
+    
+    datasets = parsed.setdefault('datasets', {})
+    dataset_key = f"{portal.lower()}|{report_frequency}|{period}|{gstin}"
+    dataset_id = datasets.get(dataset_key)
+    metadata = load_dataset_meta(dataset_id) if dataset_id else None
+    if metadata is not None:
+        summary = load_dataset_frame(dataset_id, 'summary')
+        reconciliation = metadata['reconciliation']
+        report = load_dataset_frame(dataset_id, 'validation')
+    else:
+        # Keep the full parsed data server-side so generation requests only send its id,
+        # with a small summary index that answers dashboard totals without reading it again
+        summary = combine_summaries([summary_index(data, 'b2cs', period), summary_index(parsed.get('b2b'), 'b2b')])
+        sections = {'b2cs': data, 'b2b': parsed.get('b2b'), 'cdnr': parsed.get('cdnr')}
+        reconciliation = reconcile_sections(sections, parsed.get('reported_totals'))
+        # Catch bad GSTINs, states, rates and duplicates now rather than at the GST portal
+        report = validation_report(sections, gstin)
+        
+        frames = {'sales': data, 'summary': summary, 'validation': report}
+        for section in ('b2b', 'cdnr'):
+            if parsed.get(section) is not None:
+                frames[section] = parsed[section]
+        dataset_id = save_dataset(frames, {
+            'filename': parsed['filename'],
+            'portal': portal.lower(),
+            'gstin': gstin,
+            'report_frequency': report_frequency,
+            'rows': len(data),
+            'cache_key': cache_key,
+            'period': period,
+            'reported_totals': parsed.get('reported_totals') or {},
+            'reconciliation': reconciliation
+        })
+        datasets[dataset_key] = dataset_id
+        if not all(check['reconciled'] for check in reconciliation):
+            logger.warning("Dataset %s does not reconcile: %s", dataset_id, reconciliation)
+    
+    # Keep monthly partial sums per GSTIN, so period summaries never need the invoices again;
+    # repeat uploads store them again, replacing any other report's sums for the same months
+    partial_months = store_period_partials(gstin, portal.lower(), [summary_partials(summary)])
+    
+    return {
+        'success': True,
+        'filename': parsed['filename'],
+        'dataset_id': dataset_id,
+        'rows_processed': len(data),
+        'data': frame_to_records(data.head(10)),  # Return first 10 rows for preview
+        'debug_info': debug_info if debug_info else [],
+        'report_frequency': report_frequency,  # 'monthly' or 'quarterly'
+        'portal': portal,
+        'gstin': gstin,  # Return GSTIN if extracted
+        'partial_months': partial_months,
+        'reconciliation': reconciliation,
+        'validation': validation_counts(report)
+    }
+
+def upload_options(form):
+    """Portal, report frequency, period and seller GSTIN of an upload request; (options, error body)"""
+    portal = form.get('portal', 'custom')
+    report_period = form.get('report_period', None)  # 'monthly' or 'quarterly'
+    period = form.get('period') or None  # 'YYYY-MM' month of reports without invoice dates
+    gstin = form.get('gstin') or None  # Seller GSTIN of reports that don't name it
+    
+    if period and not MONTH_PATTERN.fullmatch(period):
+        return None, {'error': 'period must be a YYYY-MM month'}
+    
+    # Check if portal has a report schema
+    if portal.lower() not in SUPPORTED_PORTALS:
+        return None, {
+            'error': f'Portal "{portal}" is not yet supported. Currently supporting: {", ".join(SUPPORTED_PORTALS).title()} only.',
+            'supported_portals': SUPPORTED_PORTALS
+        }
+    
+    # Get report frequency for this portal
+    report_frequency = PORTAL_FREQUENCY.get(portal.lower(), 'monthly')
+    if report_period:
+        report_frequency = report_period  # User can override
+    
+    return {
+        'portal': portal,
+        'report_frequency': report_frequency,
+        'period': period,
+        'gstin': gstin,
+        'stream': form.get('stream'),
+        'async': is_truthy(form.get('async'))
+    }, None
+
+def remove_repeat_upload(file_path, stored_filename):
+    """Delete a saved upload whose content is already stored as stored_filename, unless it was saved over that file"""
+    # Names are timestamped to the second, so a repeat right after the first upload gets the same one
+    if os.path.abspath(file_path) != os.path.abspath(os.path.join(UPLOAD_FOLDER, stored_filename)):
+        os.remove(file_path)
+
+def process_upload(file_path, unique_filename, content_hash, options):
+    """Parse a saved upload (or reuse the cached parse of the same content); (body, status)"""
+    portal = options['portal']
+    streaming = should_stream(file_path, options['stream'])
+    
+    # Reuse the parse of an identical earlier upload when it is still cached
+    cache_key = parse_cache_key(content_hash, portal.lower(), streaming)
+    parsed = load_parse_cache(cache_key)
+    if parsed is not None and os.path.exists(os.path.join(UPLOAD_FOLDER, parsed['filename'])):
+        logger.info("Parse cache hit for %s", cache_key)
+        # Keep one stored copy per distinct file
+        remove_repeat_upload(file_path, parsed['filename'])
+        return cached_upload_response(parsed, portal, options['report_frequency'], cache_key,
+                                      options['period'], options['gstin']), 200
+    
+    # Parse the file, in the job pool when asked to
+    finish = partial(finish_upload, filename=unique_filename, portal=portal, report_frequency=options['report_frequency'],
+                     cache_key=cache_key, period=options['period'], gstin=options['gstin'])
+    if options['async']:
+        job_id = submit_job('upload', parse_uploaded_file, file_path, portal.lower(), streaming, finish=finish)
+        return {'success': True, 'job_id': job_id, 'status': 'queued', 'filename': unique_filename}, 202
+    
+    return finish(parse_uploaded_file(file_path, portal.lower(), streaming))
+
+def upload_file_path(filename):
+    """Timestamped name and path in UPLOAD_FOLDER for an uploaded file"""
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    unique_filename = f"{timestamp}_{secure_filename(filename)}"
+    return unique_filename, os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
+
+@app.route('/api/upload', methods=['POST'])
+def upload_file():
+    if 'file' not in request.files:
+        return jsonify({'error': 'No file provided'}), 400
+    
+    file = request.files['file']
+    if file.filename == '':
+        return jsonify({'error': 'No file selected'}), 400
+    
+    options, error = upload_options(request.form)
+    if error:
+        return jsonify(error), 400
+    
+    if file and allowed_file(file.filename):
+        unique_filename, file_path = upload_file_path(file.filename)
+        content_hash = save_upload(file.stream, file_path)
+        body, status = process_upload(file_path, unique_filename, content_hash, options)
+        return jsonify(body), status
+    
+    return jsonify({'error': 'Invalid file type'}), 400
+
+def upload_session_status(upload_id, session):
+    """Client-facing state of a chunked upload"""
+    return {
+        'upload_id': upload_id,
+        'filename': session['filename'],
+        'offset': session['offset'],
+        'size': session['size'],
+        'chunk_bytes': UPLOAD_CHUNK_BYTES
+    }
+
+@app.route('/api/upload/init', methods=['POST'])
+def init_upload():
+    """Start a chunked upload, for files too large (or links too slow) for one /api/upload request.
+    
+    Takes the /api/upload form fields plus filename and, optionally, the total size
+    in bytes. Chunks then go to /api/upload/<upload_id>/append in order and
+    /api/upload/<upload_id>/complete parses the assembled file.
+    """
     try:
-        xls = pd.ExcelFile(file_path)
-        print(f"Available sheets: {xls.sheet_names}")
-        
-        # Find B2B sheet
-        b2b_sheet = None
-        for sheet_name in xls.sheet_names:
-            sheet_lower = sheet_name.lower()
-            print(f"Checking sheet: '{sheet_name}' -> '{sheet_lower}'")
-            if 'b2b' in sheet_lower and 'cn' not in sheet_lower and 'cdnr' not in sheet_lower:
-                b2b_sheet = sheet_name
-                print(f"Found B2B sheet: {b2b_sheet}")
-                break
-        
-        if not b2b_sheet:
-            print("B2B sheet not found")
-            return []
+        form = request.get_json(silent=True) or request.form
+        filename = form.get('filename') or ''
+        if not filename:
+            return jsonify({'error': 'No filename provided'}), 400
+        if not allowed_file(filename):
+            return jsonify({'error': 'Invalid file type'}), 400
         
-        # Read B2B sheet
-        df = pd.read_excel(file_path, sheet_name=b2b_sheet, skiprows=2)
-        print(f"B2B Columns: {df.columns.tolist()}")
-        print(f"B2B Rows: {len(df)}")
-        print(f"B2B Sample:\n{df.head()}")
+        options, error = upload_options(form)
+        if error:
+            return jsonify(error), 400
         
-        # Debug: Print first row to understand structure
-        if len(df) > 0:
-            print(f"First row values: {df.iloc[0].tolist()}")
-            print(f"First row keys: {df.columns.tolist()}")
-            # Check if first row is header
-            first_cell = str(df.iloc[0, 0]) if len(df.columns) > 0 else ''
-            if first_cell and first_cell.lower() in ['buyer gstin', 'gstin/uin of recipient', 'gstin']:
-                print("First row appears to be header, skipping it")
-                # Skip the first row
-                df = df.iloc[1:].reset_index(drop=True)
-                print(f"After skipping header, {len(df)} rows remain")
+        size = form.get('size')
+        if size not in (None, ''):
+            try:
+                size = int(size)
+            except (TypeError, ValueError):
+                return jsonify({'error': 'size must be a number of bytes'}), 400
+            if size <= 0:
+                return jsonify({'error': 'size must be a positive number of bytes'}), 400
+            if size > MAX_CHUNKED_UPLOAD_BYTES:
+                return jsonify({'error': f'Files are limited to {MAX_CHUNKED_UPLOAD_BYTES} bytes'}), 413
+        else:
+            size = None
         
-        data = []
-        for idx, row in df.iterrows():
-            # Debug first few rows
-            if idx < 3:
-                print(f"Row {idx}: {row.tolist()}")
-            
-            # Skip empty rows - check by position since column names may not be correct
-            first_col = row.iloc[0] if len(row) > 0 else None
-            if pd.isna(first_col) or first_col == '' or str(first_col).lower() == 'nan':
-                continue
-            
-            # B2B column order: 0=GSTIN, 1=ReceiverName, 2=InvoiceNumber, 3=InvoiceDate, 
-            # 4=InvoiceValue, 5=PlaceOfSupply, 6=ReverseCharge, 7=App%TaxRate, 8=InvoiceType
-            # 9=E-CommerceGSTIN, 10=Rate, 11=TaxableValue, 12=CessAmount
-            
-            # Get GSTIN - Column 0
-            gstin = str(row.iloc[0]) if len(row) > 0 else ''
-            if not gstin or gstin == 'nan':
-                continue
-            
-            print(f"Processing B2B row with GSTIN: {gstin}")
-            
-            # Parse invoice date - Column index 3
-            invoice_date = row.iloc[3] if len(row) > 3 else ''
-            if not pd.isna(invoice_date):
-                try:
-                    dt = pd.to_datetime(invoice_date)
-                    # Format as "9-May-25" (day without leading zero, abbreviated month, 2-digit year)
-                    day = dt.day
-                    month = dt.strftime('%b')  # Jan, Feb, Mar, etc.
-                    year = dt.strftime('%y')   # 25, 26, etc.
-                    invoice_date = f"{day}-{month}-{year}"
-                except:
-                    invoice_date = str(invoice_date)
-            else:
-                invoice_date = ''
-            
-            # Get invoice details
-            invoice_no = str(row.iloc[2]) if len(row) > 2 else ''  # Invoice Number is column 2
-            invoice_value = float(row.iloc[4] if len(row) > 4 else 0 or 0)  # Invoice Value is column 4
-            
-            # Get Place of Supply - Column 5
-            place_of_supply = str(row.iloc[5]) if len(row) > 5 else ''
-            
-            # Extract state code from place of supply (format: "06-Haryana")
-            state_code = place_of_supply.split('-')[0] if place_of_supply and '-' in place_of_supply else ''
-            
-            # Get Rate and Taxable Value
-            rate_raw = row.iloc[10] if len(row) > 10 else 0
-            rate = float(rate_raw or 0)
-            
-            # If rate is a decimal (e.g., 0.18), convert to percentage (18)
-            if rate > 0 and rate < 1:
-                rate = rate * 100
-            rate = int(rate)
-            
-            taxable_val = float(row.iloc[11] if len(row) > 11 else 0 or 0)  # Taxable Value is column 11
-            
-            # For IGST calculation - we'll use the rate from column 10 directly
-            igst_amt = 0  # We'll calculate this from rate if needed
-            
-            # Rate is already provided in the data (column 10)
-            # No need to calculate
-            
-            if invoice_value == 0:
-                continue
-            
-            data.append({
-                'buyer_gstin': gstin,
-                'buyer_name': '',
-                'invoice_no': invoice_no,
-                'invoice_date': invoice_date,
-                'invoice_value': round(invoice_value, 2),
-                'place_of_supply': place_of_supply,
-                'state_code': state_code,
-                'reverse_charge': 'N',
-                'applicable_tax_rate': '',
-                'invoice_type': 'Regular B2B',
-                'ecommerce_gstin': '',
-                'rate': rate,
-                'taxable_value': round(taxable_val, 2),
-                'cess_amount': 0
-            })
+        cleanup_upload_sessions()
+        upload_id = uuid.uuid4().hex
+        session = {'filename': filename, 'size': size, 'options': options, 'created_at': datetime.now().isoformat()}
+        os.makedirs(upload_session_path(upload_id))
+        open(upload_session_path(upload_id, 'data'), 'wb').close()
+        with open(upload_session_path(upload_id, 'meta.json'), 'w') as f:
+            json.dump(session, f)
+        UPLOAD_DIGESTS[upload_id] = (0, hashlib.sha256())
         
-        print(f"Parsed {len(data)} B2B records")
-        return data
-    except Exception as e:
-        print(f"Error parsing Amazon B2B: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return []
-
-def parse_flipkart_file(file_path):
-    """Parse Flipkart seller reports"""
-    try:
-        df = pd.read_excel(file_path)
-        # Map Flipkart columns to GST format
-        data = []
-        for _, row in df.iterrows():
-            data.append({
-                'gstin': '',
-                'invoice_date': row.get('date', ''),
-                'invoice_no': row.get('invoice_id', ''),
-                'hsn_code': row.get('hsn', ''),
-                'product_name': row.get('product_title', ''),
-                'quantity': row.get('quantity', 0),
-                'taxable_value': row.get('selling_price', 0),
-                'igst_rate': row.get('igst', 0),
-                'cgst_rate': row.get('cgst', 0),
-                'sgst_rate': row.get('sgst', 0),
-                'igst_amount': row.get('igst_value', 0),
-                'cgst_amount': row.get('cgst_value', 0),
-                'sgst_amount': row.get('sgst_value', 0),
-                'total_amount': row.get('total_price', 0),
-                'portal': 'Flipkart'
-            })
-        return data
+        return jsonify({'success': True, **upload_session_status(upload_id, {**session, 'offset': 0})})
+    
     except Exception as e:
-        print(f"Error parsing Flipkart file: {str(e)}")
-        return None
+        logger.exception("Error in init_upload: %s", e)
+        return jsonify({'error': str(e)}), 500
 
-def parse_custom_file(file_path):
-    """Parse generic portal files - tries to auto-detect columns"""
-    try:
-        df = pd.read_excel(file_path)
-        # Try to map common column names
-        data = []
-        for _, row in df.iterrows():
-            data.append({
-                'gstin': '',
-                'invoice_date': '',
-                'invoice_no': '',
-                'hsn_code': '',
-                'product_name': '',
-                'quantity': 0,
-                'taxable_value': 0,
-                'igst_rate': 0,
-                'cgst_rate': 0,
-                'sgst_rate': 0,
-                'igst_amount': 0,
-                'cgst_amount': 0,
-                'sgst_amount': 0,
-                'total_amount': 0,
-                'portal': 'Custom'
-            })
-        return data
-    except Exception as e:
-        print(f"Error parsing custom file: {str(e)}")
-        return None
+@app.route('/api/upload/<upload_id>', methods=['GET'])
+def get_upload(upload_id):
+    """Bytes received so far by a chunked upload; an interrupted client resumes from this offset"""
+    session = load_upload_session(upload_id)
+    if session is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    return jsonify(upload_session_status(upload_id, session))
 
-def generate_aggregated_b2cs(data):
-    """Generate aggregated B2CS format by state and tax rate"""
+@app.route('/api/upload/<upload_id>/append', methods=['POST', 'PUT'])
+def append_upload(upload_id):
+    """Append the raw request body to a chunked upload.
+    
+    The offset the chunk starts at goes in the Upload-Offset header (or an offset
+    query argument) and has to match the bytes received so far; a mismatch is
+    answered with 409 and the current offset, to resume from.
+    """
     try:
-        df = pd.DataFrame(data)
-        
-        # Check if data already has 'rate' (from Amazon aggregated format)
-        if 'rate' not in df.columns:
-            # Determine tax rate for each row (use CGST+SGST rate or IGST rate)
-            df['rate'] = df.apply(lambda row: 
-                int(row['cgst_rate']) if row.get('cgst_rate', 0) > 0 else 
-                int(row['igst_rate']) if row.get('igst_rate', 0) > 0 else 0, axis=1)
+        session = load_upload_session(upload_id)
+        if session is None:
+            return jsonify({'error': 'Upload not found'}), 404
         
-        # Extract state code from place_of_supply (format: XX-StateName)
-        df['state_code'] = df['place_of_supply'].apply(lambda x: x.split('-')[0] if x and '-' in x else '')
+        try:
+            offset = int(request.headers.get('Upload-Offset', request.args.get('offset')))
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Upload-Offset header (or offset argument) is required'}), 400
+        length = request.content_length
+        if length is None:
+            return jsonify({'error': 'Chunks need a Content-Length'}), 411
+        limit = session['size'] if session['size'] is not None else MAX_CHUNKED_UPLOAD_BYTES
+        if offset + length > limit:
+            return jsonify({'error': f'Chunk ends past the {limit} byte upload', **upload_session_status(upload_id, session)}), 413
         
-        # Group by state_code and rate, then sum taxable values
-        aggregated = []
+        lock = upload_session_lock(upload_id)
+        if not lock.acquire(blocking=False):
+            return jsonify({'error': 'Another chunk is being written', **upload_session_status(upload_id, session)}), 409
+        try:
+            # Re-read under the lock; a chunk may have landed since
+            session = load_upload_session(upload_id)
+            if session is None:
+                return jsonify({'error': 'Upload not found'}), 404
+            if offset != session['offset']:
+                return jsonify({'error': f"Upload is at byte {session['offset']}", **upload_session_status(upload_id, session)}), 409
+            session['offset'] = append_upload_chunk(upload_id, request.stream, offset)
+        finally:
+            lock.release()
         
-        if 'state_code' in df.columns and 'rate' in df.columns:
-            # Group by state_code and rate
-            grouped = df.groupby(['state_code', 'rate'])['taxable_value'].sum().reset_index()
-            
-            for _, row in grouped.iterrows():
-                state_code = row['state_code']
-                rate = row['rate']
-                taxable_value = row['taxable_value']
-                
-                # Get state name from mapping
-                state_name = STATE_MAPPING.get(state_code, 'Unknown')
-                
-                aggregated.append({
-                    'Type': 'OE',
-                    'Place Of Supply': f"{state_code}-{state_name}",
-                    'Rate': rate,
-                    'Applicable % of Tax Rate': '',
-                    'Taxable Value': round(taxable_value, 2),
-                    'Cess Amount': '',
-                    'E-Commerce GSTIN': ''
-                })
-        
-        return aggregated
+        return jsonify({'success': True, 'received': session['offset'] - offset, **upload_session_status(upload_id, session)})
+    
     except Exception as e:
-        print(f"Error generating aggregated B2CS: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return []
+        logger.exception("Error in append_upload: %s", e)
+        return jsonify({'error': str(e)}), 500
 
-def generate_b2b_csv(data):
-    """Generate B2B CSV format for GSTR-1"""
+@app.route('/api/upload/<upload_id>/complete', methods=['POST'])
+def complete_upload(upload_id):
+    """Check a chunked upload is whole and hand it to the /api/upload parse pipeline.
+    
+    Optional sha256 (hex) is compared with the hash of the received bytes;
+    async overrides the choice made at init. Answers like /api/upload.
+    """
     try:
-        df = pd.DataFrame(data)
-        
-        b2b_records = []
-        for _, row in df.iterrows():
-            b2b_records.append({
-                'GSTIN/UIN of Recipient': row.get('buyer_gstin', ''),
-                'Receiver Name': row.get('buyer_name', ''),
-                'Invoice Number': row.get('invoice_no', ''),
-                'Invoice date': row.get('invoice_date', ''),
-                'Invoice Value': row.get('invoice_value', 0),
-                'Place Of Supply': row.get('place_of_supply', ''),
-                'Reverse Charge': row.get('reverse_charge', 'N'),
-                'Applicable % of Tax Rate': row.get('applicable_tax_rate', ''),
-                'Invoice Type': row.get('invoice_type', 'Regular B2B'),
-                'E-Commerce GSTIN': row.get('ecommerce_gstin', ''),
-                'Rate': row.get('rate', 0),
-                'Taxable Value': row.get('taxable_value', 0),
-                'Cess Amount': row.get('cess_amount', 0)
-            })
+        form = request.get_json(silent=True) or request.form
+        lock = upload_session_lock(upload_id)
+        if not lock.acquire(blocking=False):
+            return jsonify({'error': 'A chunk is still being written'}), 409
+        try:
+            session = load_upload_session(upload_id)
+            if session is None:
+                return jsonify({'error': 'Upload not found'}), 404
+            if session['offset'] == 0 or (session['size'] is not None and session['offset'] != session['size']):
+                return jsonify({'error': f"Upload is incomplete at byte {session['offset']}",
+                                **upload_session_status(upload_id, session)}), 409
+            
+            content_hash = upload_session_digest(upload_id, session['offset']).hexdigest()
+            expected = (form.get('sha256') or '').lower()
+            if expected and expected != content_hash:
+                # Something in the received bytes is corrupt; there is no offset to resume from
+                discard_upload_session(upload_id)
+                return jsonify({'error': 'Uploaded content does not match sha256; start the upload again',
+                                'sha256': content_hash}), 400
+            
+            unique_filename, file_path = upload_file_path(session['filename'])
+            os.replace(upload_session_path(upload_id, 'data'), file_path)
+            discard_upload_session(upload_id)
+        finally:
+            lock.release()
         
-        return b2b_records
+        options = session['options']
+        if form.get('async') is not None:
+            options['async'] = is_truthy(form.get('async'))
+        body, status = process_upload(file_path, unique_filename, content_hash, options)
+        return jsonify(body), status
+    
     except Exception as e:
-        print(f"Error generating B2B CSV: {str(e)}")
-        import traceback
-        traceback.print_exc()
-        return []
+        logger.exception("Error in complete_upload: %s", e)
+        return jsonify({'error': str(e)}), 500
 
-@app.route('/api/health', methods=['GET'])
-def health_check():
-    return jsonify({'status': 'ok', 'message': 'SellerSuite API is running'})
+def parse_batch_file(file_path, portal, streaming=False):
+    """Parse one report of a batch upload: its sales data, GSTIN and (for Amazon) B2B records"""
+    parsed = parse_uploaded_file(file_path, portal, streaming)
+    if parsed is not None and 'error' not in parsed and 'b2b' not in parsed and PORTAL_SCHEMAS.get(portal, {}).get('ready_to_file'):
+        parsed['b2b'] = parse_b2b_file(file_path, streaming)
+    return parsed
 
-@app.route('/api/upload', methods=['POST'])
-def upload_file():
-    if 'file' not in request.files:
-        return jsonify({'error': 'No file provided'}), 400
-    
-    file = request.files['file']
-    portal = request.form.get('portal', 'custom')
-    report_period = request.form.get('report_period', None)  # 'monthly' or 'quarterly'
-    
-    if file.filename == '':
-        return jsonify({'error': 'No file selected'}), 400
+def batch_zip_members(archive):
+    """Report members of a zip archive in a batch: its files, without macOS metadata"""
+    return [member for member in archive.infolist() if not member.is_dir() and not member.filename.startswith('__MACOSX/')]
+
+def count_batch_reports(files):
+    """Number of reports in a batch, counting the members of zip archives"""
+    count = 0
+    for file in files:
+        if file.filename.lower().endswith('.zip'):
+            with zipfile.ZipFile(file.stream) as archive:
+                count += len(batch_zip_members(archive))
+        else:
+            count += 1
+    return count
+
+def iter_batch_reports(files):
+    """Yield (source name, binary stream) for each report in a batch, unpacking zip archives"""
+    for file in files:
+        if file.filename.lower().endswith('.zip'):
+            with zipfile.ZipFile(file.stream) as archive:
+                for member in batch_zip_members(archive):
+                    source = f"{file.filename}/{member.filename}"
+                    if member.file_size > app.config['MAX_CONTENT_LENGTH']:
+                        yield source, None
+                        continue
+                    with archive.open(member) as stream:
+                        yield source, stream
+        else:
+            yield file.filename, file.stream
+
+def batch_manifest_entry(source, body, status, parsed=None):
+    """Summary of one report's upload result for the batch manifest"""
+    if status >= 400:
+        return {'source': source, 'status': 'error', 'error': body.get('error')}
+    entry = {
+        'source': source,
+        'status': 'ok',
+        'filename': body['filename'],
+        'dataset_id': body['dataset_id'],
+        'gstin': body['gstin'],
+        'rows_processed': body['rows_processed'],
+        'report_frequency': body['report_frequency']
+    }
+    for section in ('b2b', 'cdnr'):
+        if parsed is not None and parsed.get(section) is not None:
+            entry[f'{section}_rows'] = len(parsed[section])
+    return entry
+
+@app.route('/api/upload-batch', methods=['POST'])
+def upload_batch():
+    """Upload several reports (or zips of them) at once and parse them in parallel, on JOB_WORKERS processes (one per core)"""
+    files = [file for file in request.files.getlist('files') if file.filename]
+    portal = request.form.get('portal', 'amazon')
+    report_period = request.form.get('report_period', None)
+    period = request.form.get('period') or None
+    gstin = request.form.get('gstin') or None
     
-    # Check if portal is supported (P0: Only Amazon)
-    SUPPORTED_PORTALS = ['amazon']
+    if not files:
+        return jsonify({'error': 'No files provided'}), 400
+    if period and not MONTH_PATTERN.fullmatch(period):
+        return jsonify({'error': 'period must be a YYYY-MM month'}), 400
     if portal.lower() not in SUPPORTED_PORTALS:
         return jsonify({
             'error': f'Portal "{portal}" is not yet supported. Currently supporting: {", ".join(SUPPORTED_PORTALS).title()} only.',
             'supported_portals': SUPPORTED_PORTALS
         }), 400
+    report_frequency = report_period or PORTAL_FREQUENCY.get(portal.lower(), 'monthly')
+    run_async = is_truthy(request.form.get('async'))
     
-    # Get report frequency for this portal
-    report_frequency = PORTAL_FREQUENCY.get(portal.lower(), 'monthly')
-    if report_period:
-        report_frequency = report_period  # User can override
+    # Check the batch size before any report is saved or parsed
+    try:
+        if count_batch_reports(files) > MAX_BATCH_FILES:
+            return jsonify({'error': f'A batch can hold at most {MAX_BATCH_FILES} files'}), 400
+    except zipfile.BadZipFile:
+        return jsonify({'error': 'Invalid zip file'}), 400
     
-    if file and allowed_file(file.filename):
-        filename = secure_filename(file.filename)
-        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-        unique_filename = f"{timestamp}_{filename}"
-        file_path = os.path.join(app.config['UPLOAD_FOLDER'], unique_filename)
-        file.save(file_path)
+    # Save every report first, answering repeats from the parse cache
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    manifest = []
+    pending = {}
+    try:
+        for source, stream in iter_batch_reports(files):
+            index = len(manifest)
+            filename = secure_filename(os.path.basename(source))
+            if stream is None or not allowed_file(filename):
+                manifest.append({'source': source, 'status': 'error', 'error': 'Invalid file type or size'})
+                continue
+            
+            unique_filename = f"{timestamp}_{index}_{filename}"
+            file_path = os.path.join(UPLOAD_FOLDER, unique_filename)
+            content_hash = save_upload(stream, file_path)
+            streaming = should_stream(file_path, request.form.get('stream'))
+            cache_key = parse_cache_key(content_hash, portal.lower(), streaming)
+            parsed = load_parse_cache(cache_key)
+            if parsed is not None and os.path.exists(os.path.join(UPLOAD_FOLDER, parsed['filename'])):
+                remove_repeat_upload(file_path, parsed['filename'])
+                body = cached_upload_response(parsed, portal, report_frequency, cache_key, period, gstin)
+                manifest.append(batch_manifest_entry(source, body, 200, parsed))
+                continue
+            
+            manifest.append(None)
+            finish = partial(finish_upload, filename=unique_filename, portal=portal,
+                             report_frequency=report_frequency, cache_key=cache_key, period=period, gstin=gstin)
+            if run_async:
+                job_id = submit_job('upload', parse_batch_file, file_path, portal.lower(), streaming, finish=finish)
+                manifest[index] = {'source': source, 'status': 'queued', 'job_id': job_id, 'filename': unique_filename}
+            else:
+                future = job_executor().submit(run_instrumented, parse_batch_file, file_path, portal.lower(), streaming)
+                pending[index] = (source, future, finish)
+    except zipfile.BadZipFile:
+        return jsonify({'error': 'Invalid zip file'}), 400
+    
+    # Wait for the parallel parses, then store each one like a single upload
+    wait([future for _, future, _ in pending.values()])
+    for index, (source, future, finish) in pending.items():
+        try:
+            parsed, stages = collect_instrumented(future.result())
+            _stage_log.stages.extend(stages)
+            body, status = finish(parsed)
+        except Exception as e:
+            logger.error("Error parsing %s: %s", source, e)
+            parsed, body, status = None, {'error': str(e)}, 500
+        manifest[index] = batch_manifest_entry(source, body, status, parsed)
+    
+    return jsonify({
+        'success': True,
+        'portal': portal,
+        'files': len(manifest),
+        'parsed': sum(1 for entry in manifest if entry['status'] == 'ok'),
+        'manifest': manifest
+    }), 202 if run_async else 200
+
+def detailed_b2c_frame(df):
+    """Invoice records in the GST portal's detailed B2C column layout"""
+    return pd.DataFrame({
+        'Invoice Date': df['invoice_date'],
+        'Invoice No': df['invoice_no'],
+        'HSN': df['hsn_code'],
+        'Description': df['product_name'],
+        'Quantity': df['quantity'],
+        'Taxable Value': df['taxable_value'],
+        'CGST Rate': df['cgst_rate'],
+        'CGST': df['cgst_amount'],
+        'SGST Rate': df['sgst_rate'],
+        'SGST': df['sgst_amount'],
+        'IGST Rate': df['igst_rate'],
+        'IGST': df['igst_amount'],
+        'Total': df['total_amount']
+    })
+
+def cleanup_output_folder(max_age=OUTPUT_RETENTION_SECONDS):
+    """Remove generated files older than max_age seconds from OUTPUT_FOLDER"""
+    cutoff = time.time() - max_age
+    for entry in os.scandir(OUTPUT_FOLDER):
+        try:
+            if entry.is_file() and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+        except OSError:
+            pass  # Removed concurrently or still being written
+
+def iter_csv_chunks(df, chunk_rows=EXPORT_CHUNK_ROWS):
+    """Encode a frame as CSV bytes a chunk of rows at a time, header first"""
+    with stage('csv_write') as record:
+        record['rows'] = len(df)
+        yield df.iloc[:0].to_csv(index=False).encode('utf-8')
+        for start in range(0, len(df), chunk_rows):
+            yield df.iloc[start:start + chunk_rows].to_csv(index=False, header=False).encode('utf-8')
+
+class ExportBuffer:
+    """Write-only sink for zipfile that hands back whatever was written since the last drain"""
+    
+    def __init__(self):
+        self.parts = []
+    
+    def write(self, data):
+        self.parts.append(bytes(data))
+        return len(data)
+    
+    def flush(self):
+        pass
+    
+    def drain(self):
+        data = b''.join(self.parts)
+        self.parts = []
+        return data
+
+def iter_export(frames, compression='none'):
+    """Stream named CSV frames as one CSV, a gzipped CSV or a zip of CSVs"""
+    if compression == 'zip':
+        buffer = ExportBuffer()
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+            for name, df in frames:
+                with archive.open(name, 'w', force_zip64=True) as member:
+                    for chunk in iter_csv_chunks(df):
+                        member.write(chunk)
+                        yield buffer.drain()
+        yield buffer.drain()
+        return
+    
+    # Plain and gzip exports carry a single CSV
+    name, df = frames[0]
+    if compression == 'gzip':
+        yield from iter_gzip(iter_csv_chunks(df))
+    else:
+        yield from iter_csv_chunks(df)
+
+def iter_gzip(chunks):
+    """Gzip a stream of byte chunks as it is produced"""
+    compressor = zlib.compressobj(6, zlib.DEFLATED, 31)
+    for chunk in chunks:
+        yield compressor.compress(chunk)
+    yield compressor.flush()
+
+def iter_gstr1_json(gstin, fp, sections):
+    """Stream a GSTR-1 offline tool JSON document section by section.
+
+    sections holds (name, entries) pairs, where entries is any iterable of dicts.
+    Entries are encoded one at a time and flushed every EXPORT_BUFFER_BYTES, so
+    memory stays bounded however many invoices a section holds.
+    """
+    encoder = json.JSONEncoder(separators=(',', ':'))
+    header = encoder.encode({'gstin': gstin, 'fp': fp, 'version': GSTR1_JSON_VERSION, 'hash': 'hash'})
+    with stage('json_write') as record:
+        record['rows'] = 0
+        # Leave the document open so the sections can follow the header fields
+        parts, size = [header[:-1]], len(header)
+        for name, entries in sections:
+            parts.append(f",{encoder.encode(name)}:[")
+            separator = ''
+            for entry in entries:
+                encoded = separator + encoder.encode(entry)
+                parts.append(encoded)
+                size += len(encoded)
+                separator = ','
+                record['rows'] += 1
+                if size >= EXPORT_BUFFER_BYTES:
+                    yield ''.join(parts).encode('utf-8')
+                    parts, size = [], 0
+            parts.append(']')
+        parts.append('}')
+        yield ''.join(parts).encode('utf-8')
+
+def gstr1_tax_amounts(taxable_value, rate, inter_state):
+    """(IGST, CGST, SGST) amounts of taxable values at GST rates, rounded to paise"""
+    # Tax in paise is taxable paise * rate / 100, exact before its one half-up rounding
+    tax_paise = to_paise(taxable_value) * np.asarray(rate, dtype=float)
+    igst = from_paise(round_half_up(np.where(inter_state, tax_paise, 0.0), 0.01))
+    cgst = from_paise(round_half_up(np.where(inter_state, 0.0, tax_paise / 2), 0.01))
+    return igst, cgst, cgst
+
+def iter_gstr1_b2cs(totals, seller_state):
+    """GSTR-1 'b2cs' entries, one per place of supply and rate, from B2CS totals"""
+    state_codes = totals['state_code'].astype(str).to_numpy(dtype=object)
+    taxable_value = round_values(totals['taxable_value'])
+    inter_state = state_codes != seller_state
+    igst, cgst, sgst = gstr1_tax_amounts(taxable_value, totals['rate'], inter_state)
+    rows = zip(state_codes.tolist(), totals['rate'].tolist(), taxable_value.tolist(), inter_state.tolist(),
+               igst.tolist(), cgst.tolist(), sgst.tolist())
+    for pos, rate, txval, inter, iamt, camt, samt in rows:
+        entry = {'sply_ty': 'INTER' if inter else 'INTRA', 'rt': rate, 'typ': 'OE', 'pos': pos, 'txval': txval}
+        if inter:
+            entry['iamt'] = iamt
+        else:
+            entry['camt'] = camt
+            entry['samt'] = samt
+        entry['csamt'] = 0
+        yield entry
+
+def iter_gstr1_b2b(b2b_data, seller_state, chunk_rows=EXPORT_CHUNK_ROWS):
+    """GSTR-1 'b2b' entries, one per recipient GSTIN with its invoices and their rate lines nested.
+
+    Records are converted to Python values chunk_rows at a time, and each recipient
+    is handed over as soon as its last invoice has been read.
+    """
+    # Group each recipient's lines together, and each invoice's lines within them
+    df = b2b_data.sort_values(['buyer_gstin', 'invoice_no'], kind='stable')
+    entry = invoice = None
+    for start in range(0, len(df), chunk_rows):
+        part = df.iloc[start:start + chunk_rows]
+        state_codes = part['state_code'].astype(str).to_numpy(dtype=object)
+        rate = pd.to_numeric(part['rate']).to_numpy()
+        taxable_value = round_values(part['taxable_value'])
+        inter_state = state_codes != seller_state
+        igst, cgst, sgst = gstr1_tax_amounts(taxable_value, rate, inter_state)
         
-        # Parse file based on portal
-        if portal.lower() == 'amazon':
-            data = parse_amazon_file(file_path)
-        elif portal.lower() == 'flipkart':
-            data = parse_flipkart_file(file_path)
-        elif portal.lower() == 'pepperfry':
-            data = parse_custom_file(file_path)  # Similar to custom
+        # Invoice dates go from '9-May-25' to '09-05-2025', one distinct date at a time
+        date_codes, dates = pd.factorize(part['invoice_date'].astype(str))
+        parsed = pd.to_datetime(pd.Series(dates, dtype=object), format='%d-%b-%y', errors='coerce')
+        labels = np.where(parsed.isna(), dates, parsed.dt.strftime('%d-%m-%Y'))
+        invoice_dates = np.append(labels.astype(object), '')[date_codes]
+        
+        rows = zip(
+            part['buyer_gstin'].astype(str).tolist(), part['invoice_no'].astype(str).tolist(), invoice_dates.tolist(),
+            round_values(part['invoice_value']).tolist(), state_codes.tolist(), part['reverse_charge'].astype(str).tolist(),
+            part['invoice_type'].astype(str).tolist(), rate.tolist(), taxable_value.tolist(), inter_state.tolist(),
+            igst.tolist(), cgst.tolist(), sgst.tolist(), round_values(part['cess_amount']).tolist()
+        )
+        for ctin, inum, idt, val, pos, rchrg, inv_typ, rt, txval, inter, iamt, camt, samt, csamt in rows:
+            if entry is None or ctin != entry['ctin']:
+                if entry is not None:
+                    yield entry
+                entry = {'ctin': ctin, 'inv': []}
+                invoice = None
+            if invoice is None or inum != invoice['inum']:
+                invoice = {
+                    'inum': inum, 'idt': idt, 'val': val, 'pos': pos, 'rchrg': rchrg,
+                    'inv_typ': GSTR1_INVOICE_TYPES.get(inv_typ, 'R'), 'itms': []
+                }
+                entry['inv'].append(invoice)
+            details = {'txval': txval, 'rt': rt}
+            if inter:
+                details['iamt'] = iamt
+            else:
+                details['camt'] = camt
+                details['samt'] = samt
+            details['csamt'] = csamt
+            invoice['itms'].append({'num': int(rt) * 100 + 1, 'itm_det': details})
+    if entry is not None:
+        yield entry
+
+def gstr1_return_period(months, frequency):
+    """GSTR-1 return period (MMYYYY) of the latest 'YYYY-MM' month: that month, or its quarter's last month"""
+    months = [month for month in months if month]
+    if not months:
+        return None
+    latest = max(months)
+    year, month = latest[:4], int(latest[5:])
+    if frequency == 'quarterly':
+        month = (month - 1) // 3 * 3 + 3
+    return f"{month:02d}{year}"
+
+def dataset_gstr1_sections(dataset_id, metadata, sections):
+    """(section name, entries) pairs of a dataset's GSTR-1 JSON and the 'YYYY-MM' months its records cover"""
+    seller_state = metadata['gstin'][:2]
+    parts = []
+    months = set()
+    # The offline tool lists B2B before B2CS
+    for section in [section for section in ('b2b', 'b2cs') if section in sections]:
+        records = load_dataset_frame(dataset_id, 'sales' if section == 'b2cs' else 'b2b')
+        if records is None or records.empty:
+            continue
+        months.update(pd.unique(partial_columns(records, section, metadata.get('period'))['month']).tolist())
+        if section == 'b2cs':
+            totals = b2cs_totals(records)
+            blank = int((totals['state_code'] == '').sum())
+            if blank:
+                raise ValueError(f"{blank} B2CS rows have no place of supply state code")
+            parts.append(('b2cs', iter_gstr1_b2cs(totals, seller_state)))
+        else:
+            parts.append(('b2b', iter_gstr1_b2b(records, seller_state)))
+    return parts, months
+
+def dataset_export_frames(dataset_id, metadata, sections, format_type):
+    """Build the (csv name, frame) pairs to export for a stored dataset"""
+    gstin_suffix = f"_{metadata['gstin']}" if metadata.get('gstin') else ""
+    period_suffix = 'quarterly' if metadata.get('report_frequency') == 'quarterly' else 'monthly'
+    frames = []
+    for section in sections:
+        if section == 'b2cs':
+            data = load_dataset_frame(dataset_id, 'sales')
+            if data is None or data.empty:
+                continue
+            if format_type == 'detailed' and 'invoice_date' in data.columns:
+                frames.append((f"gstr1_b2c{gstin_suffix}.csv", detailed_b2c_frame(data)))
+            else:
+                with stage('aggregate') as record:
+                    frames.append((f"b2cs_{period_suffix}{gstin_suffix}.csv", generate_aggregated_b2cs(data)))
+                    record['rows'] = len(data)
+        elif section == 'b2b':
+            b2b_data = load_dataset_frame(dataset_id, 'b2b')
+            if b2b_data is not None and not b2b_data.empty:
+                frames.append((f"b2b_{period_suffix}{gstin_suffix}.csv", generate_b2b_csv(b2b_data)))
+        elif section == 'cdnr':
+            cdnr_data = load_dataset_frame(dataset_id, 'cdnr')
+            if cdnr_data is not None and not cdnr_data.empty:
+                frames.append((f"cdnr_{period_suffix}{gstin_suffix}.csv", generate_cdnr_csv(cdnr_data)))
+    return frames
+
+def summary_totals(rows):
+    """Rounded taxable value and cess with invoice and record counts of summary index rows"""
+    return {
+        'taxable_value': money_total(rows['taxable_value']),
+        'cess_amount': money_total(rows['cess_amount']),
+        'invoices': int(rows['invoices'].sum()),
+        'records': int(rows['records'].sum())
+    }
+
+def filter_summary(summary, filters):
+    """Summary index rows matching dashboard filters (section, state codes, rates and a month range)"""
+    keep = np.ones(len(summary), dtype=bool)
+    if filters.get('section'):
+        keep &= summary['section'].isin(filters['section']).to_numpy()
+    if filters.get('state'):
+        keep &= summary['state_code'].isin(filters['state']).to_numpy()
+    if filters.get('rate'):
+        keep &= pd.to_numeric(summary['rate']).isin(filters['rate']).to_numpy()
+    # Undated rows (aggregated B2CS without a period) only count when no month range is asked for
+    if filters.get('from_month'):
+        keep &= (summary['month'] >= filters['from_month']).to_numpy()
+    if filters.get('to_month'):
+        keep &= ((summary['month'] != '') & (summary['month'] <= filters['to_month'])).to_numpy()
+    return summary[keep]
+
+def summary_groups(rows, group_by):
+    """Summary index rows summed over everything but the group_by keys, sorted by them"""
+    if rows.empty:
+        return []
+    groups = money_sums(rows, group_by, ['taxable_value', 'cess_amount'], ['invoices', 'records'])
+    if 'state_code' in group_by:
+        groups.insert(group_by.index('state_code') + 1, 'place_of_supply', state_places(groups['state_code']))
+    return frame_to_records(groups)
+
+def period_labels(months, frequency):
+    """Filing period of each 'YYYY-MM' month: the month itself, or its quarter as 'YYYY-MM_YYYY-MM'"""
+    codes, uniques = pd.factorize(months)
+    labels = []
+    for month in uniques:
+        if not month:
+            labels.append('undated')
+        elif frequency == 'quarterly':
+            # GST quarters run Apr-Jun, Jul-Sep, Oct-Dec and Jan-Mar
+            year, first = month[:4], (int(month[5:]) - 1) // 3 * 3 + 1
+            labels.append(f"{year}-{first:02d}_{year}-{first + 2:02d}")
         else:
-            data = parse_custom_file(file_path)
+            labels.append(month)
+    return np.array(labels + ['undated'], dtype=object)[codes]
+
+def consolidate_datasets(datasets, sections, frequency='quarterly'):
+    """GSTR-1 CSV frames per GSTIN and filing period, plus a cross-GSTIN summary, for several datasets.
+
+    datasets holds (dataset id, metadata) pairs. Every dataset's records are stacked
+    with their GSTIN and period and totalled in one groupby per section. Returns
+    (csv name, frame) pairs named '<GSTIN>/b2cs_<period>.csv', '<GSTIN>/b2b_<period>.csv'
+    and 'summary.csv'.
+    """
+    frames = []
+    summaries = []
+    for section in sections:
+        stacked = []
+        b2b_rows = []
+        for dataset_id, metadata in datasets:
+            records = load_dataset_frame(dataset_id, 'sales' if section == 'b2cs' else 'b2b')
+            if records is None or records.empty:
+                continue
+            columns = partial_columns(records, section, metadata.get('period'))
+            columns['gstin'] = metadata['gstin']
+            columns['period'] = period_labels(columns['month'].to_numpy(dtype=object), frequency)
+            stacked.append(columns)
+            if section == 'b2b':
+                b2b_rows.append(generate_b2b_csv(records).reset_index(drop=True))
+        if not stacked:
+            continue
         
-        if data is None:
-            return jsonify({'error': 'Failed to parse file'}), 500
+        with stage('consolidate') as record:
+            stacked = pd.concat(stacked, ignore_index=True)
+            totals = money_sums(stacked, ['gstin', 'period', 'state_code', 'rate'], ['taxable_value', 'cess_amount'], ['invoices'])
+            record['rows'] = len(stacked)
         
-        # Extract GSTIN from Amazon file
-        gstin = None
-        if portal.lower() == 'amazon':
-            gstin = extract_gstin_from_amazon_file(file_path)
-            print(f"Extracted GSTIN: {gstin}")
-            
-            # If no GSTIN found in GSTIN sheet, try to extract from B2CS E-Commerce GSTIN column
-            if not gstin and data:
-                try:
-                    df_temp = pd.DataFrame(data)
-                    if 'place_of_supply' in df_temp.columns and data[0].get('portal') == 'Amazon':
-                        # In aggregated format, we can get GSTIN from the Excel file's B2CS sheet
-                        xls_temp = pd.ExcelFile(file_path)
-                        for sheet_name in xls_temp.sheet_names:
-                            if 'b2c' in sheet_name.lower() and 'small' in sheet_name.lower():
-                                df_b2cs = pd.read_excel(file_path, sheet_name=sheet_name, skiprows=2)
-                                # The E-Commerce GSTIN is typically in column 6 (index 6)
-                                if len(df_b2cs) > 1:  # Skip header row
-                                    ecommerce_gstin = str(df_b2cs.iloc[1, 6]) if len(df_b2cs.columns) > 6 else ''
-                                    if ecommerce_gstin and len(ecommerce_gstin.strip()) >= 10:
-                                        gstin = ecommerce_gstin.strip()
-                                        print(f"Extracted GSTIN from B2CS sheet E-Commerce column: {gstin}")
-                                        break
-                except Exception as e:
-                    print(f"Error extracting GSTIN from data: {str(e)}")
+        if section == 'b2cs':
+            for (gstin, period), group in totals.groupby(['gstin', 'period']):
+                frames.append((f"{gstin}/b2cs_{period}.csv", b2cs_output_frame(group)))
+        else:
+            # B2B files list invoices, so split the stacked invoice rows by the same keys
+            b2b_rows = pd.concat(b2b_rows, ignore_index=True)
+            for (gstin, period), group in b2b_rows.groupby([stacked['gstin'], stacked['period']]):
+                frames.append((f"{gstin}/b2b_{period}.csv", group))
+        summaries.append(totals.assign(section=section.upper()))
+    
+    if summaries:
+        summary = pd.concat(summaries, ignore_index=True)
+        frames.append(('summary.csv', pd.DataFrame({
+            'GSTIN': summary['gstin'],
+            'Period': summary['period'],
+            'Section': summary['section'],
+            'Place Of Supply': state_places(summary['state_code']),
+            'Rate': summary['rate'],
+            'Taxable Value': round_values(summary['taxable_value']),
+            'Cess Amount': round_values(summary['cess_amount']),
+            'Invoices': summary['invoices']
+        })))
+    return frames
+
+def export_download_name(frames, metadata, compression):
+    """(download name, mimetype) of a CSV export"""
+    if compression == 'zip':
+        return (f"gstr1_{metadata['gstin']}.zip" if metadata.get('gstin') else "gstr1.zip"), 'application/zip'
+    if compression == 'gzip':
+        return f"{frames[0][0]}.gz", 'application/gzip'
+    return frames[0][0], 'text/csv'
+
+@app.route('/api/export', methods=['POST'])
+def export_dataset():
+    """Stream a dataset's B2CS, B2B and/or CDNR CSVs, or its GSTR-1 JSON, straight into the response"""
+    try:
+        dataset_id = request.json.get('dataset_id')
+        sections = request.json.get('sections', ['b2cs', 'b2b'])
+        format_type = request.json.get('format', 'aggregated')
+        compression = request.json.get('compression', 'zip' if len(sections) > 1 else 'none')
         
-        # Add debug info
-        debug_info = []
-        if portal.lower() == 'amazon':
+        if not dataset_id:
+            return jsonify({'error': 'No dataset_id provided'}), 400
+        if not sections or any(section not in EXPORT_SECTIONS for section in sections):
+            return jsonify({'error': 'sections must be a list of "b2cs", "b2b" and/or "cdnr"'}), 400
+        if compression not in ('none', 'gzip', 'zip'):
+            return jsonify({'error': 'compression must be "none", "gzip" or "zip"'}), 400
+        metadata = load_dataset_meta(dataset_id)
+        if metadata is None:
+            return jsonify({'error': 'Dataset not found'}), 404
+        
+        if format_type == 'gstr1':
+            # One GSTR-1 offline tool JSON document holding every requested section
+            fp = request.json.get('fp')
+            if compression == 'zip':
+                compression = 'none'
+            if not metadata.get('gstin'):
+                return jsonify({'error': 'GSTR-1 JSON needs the dataset GSTIN; upload it with one'}), 400
+            if 'cdnr' in sections:
+                return jsonify({'error': 'GSTR-1 JSON exports cover the "b2cs" and "b2b" sections'}), 400
+            if fp and not re.fullmatch(r'(0[1-9]|1[0-2])\d{4}', str(fp)):
+                return jsonify({'error': 'fp must be a MMYYYY return period'}), 400
             try:
-                xls = pd.ExcelFile(file_path)
-                debug_info.append(f"Sheets: {xls.sheet_names}")
-                if xls.sheet_names:
-                    df_temp = pd.read_excel(file_path, sheet_name=0)
-                    debug_info.append(f"Columns in first sheet: {df_temp.columns.tolist()}")
-                    debug_info.append(f"Rows in sheet: {len(df_temp)}")
-            except:
-                pass
+                parts, months = dataset_gstr1_sections(dataset_id, metadata, sections)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+            if not parts:
+                return jsonify({'error': 'No data to export'}), 400
+            fp = fp or gstr1_return_period(months, metadata.get('report_frequency'))
+            if not fp:
+                return jsonify({'error': 'No invoice dates to take the return period from; pass fp'}), 400
+            
+            chunks = iter_gstr1_json(metadata['gstin'], fp, parts)
+            download_name = f"gstr1_{metadata['gstin']}_{fp}.json"
+            if compression == 'gzip':
+                chunks = iter_gzip(chunks)
+                download_name = f"{download_name}.gz"
+            mimetype = 'application/gzip' if compression == 'gzip' else 'application/json'
+        else:
+            frames = dataset_export_frames(dataset_id, metadata, sections, format_type)
+            if not frames:
+                return jsonify({'error': 'No data to export'}), 400
+            if len(frames) > 1 and compression != 'zip':
+                return jsonify({'error': 'Exporting several sections needs zip compression'}), 400
+            chunks = iter_export(frames, compression)
+            download_name, mimetype = export_download_name(frames, metadata, compression)
         
-        return jsonify({
-            'success': True,
-            'filename': unique_filename,
-            'rows_processed': len(data),
-            'data': data[:10],  # Return first 10 rows for preview
-            'debug_info': debug_info if debug_info else [],
-            'report_frequency': report_frequency,  # 'monthly' or 'quarterly'
-            'portal': portal,
-            'gstin': gstin  # Return GSTIN if extracted
+        # Optionally keep the export on disk so re-downloads get ETag and range support
+        if is_truthy(request.json.get('artifact')):
+            cleanup_output_folder()
+            output_filename = f"{dataset_id}_{format_type}_{download_name}"
+            output_path = os.path.join(OUTPUT_FOLDER, output_filename)
+            tmp_path = f"{output_path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, 'wb') as out:
+                for chunk in chunks:
+                    out.write(chunk)
+            os.replace(tmp_path, output_path)
+            # send_file resolves relative paths against the app folder, not the working directory
+            response = send_file(os.path.abspath(output_path), mimetype=mimetype, as_attachment=True,
+                                 download_name=download_name, conditional=True)
+            response.headers['X-Export-Filename'] = output_filename
+            return response
+        
+        return Response(chunks, mimetype=mimetype, headers={
+            'Content-Disposition': f'attachment; filename="{download_name}"'
         })
     
-    return jsonify({'error': 'Invalid file type'}), 400
+    except Exception as e:
+        logger.exception("Error in export_dataset: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/consolidate', methods=['POST'])
+def consolidate():
+    """Stream per-GSTIN GSTR-1 CSVs and a cross-GSTIN summary for several datasets as one zip"""
+    try:
+        dataset_ids = request.json.get('dataset_ids', [])
+        sections = request.json.get('sections', ['b2cs', 'b2b'])
+        frequency = request.json.get('report_frequency', 'quarterly')
+        
+        if not isinstance(dataset_ids, list) or not dataset_ids:
+            return jsonify({'error': 'dataset_ids must be a non-empty list'}), 400
+        if len(dataset_ids) > MAX_BATCH_FILES:
+            return jsonify({'error': f'At most {MAX_BATCH_FILES} datasets can be consolidated at once'}), 400
+        if not sections or any(section not in ('b2cs', 'b2b') for section in sections):
+            return jsonify({'error': 'sections must be a list of "b2cs" and/or "b2b"'}), 400
+        if frequency not in ('monthly', 'quarterly'):
+            return jsonify({'error': 'report_frequency must be "monthly" or "quarterly"'}), 400
+        
+        datasets = []
+        for dataset_id in dict.fromkeys(dataset_ids):
+            metadata = load_dataset_meta(dataset_id)
+            if metadata is None:
+                return jsonify({'error': f'Dataset {dataset_id} not found'}), 404
+            if not metadata.get('gstin'):
+                return jsonify({'error': f'Dataset {dataset_id} has no GSTIN; upload it with one', 'dataset_id': dataset_id}), 400
+            datasets.append((dataset_id, metadata))
+        
+        frames = consolidate_datasets(datasets, sections, frequency)
+        if not frames:
+            return jsonify({'error': 'No data to consolidate'}), 400
+        
+        return Response(iter_export(frames, 'zip'), mimetype='application/zip', headers={
+            'Content-Disposition': 'attachment; filename="gstr1_consolidated.zip"'
+        })
+    
+    except Exception as e:
+        logger.exception("Error in consolidate: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/probe', methods=['POST'])
+def probe_file():
+    """Sheet names, GSTIN and detected layout of an Excel report, without parsing its sheets"""
+    file = request.files.get('file')
+    if file and file.filename:
+        if not file.filename.lower().endswith('.xlsx'):
+            return jsonify({'error': 'Only .xlsx workbooks can be probed'}), 400
+        source = file.stream
+    else:
+        # Or probe a report that was already uploaded
+        filename = (request.get_json(silent=True) or request.form).get('filename', '')
+        if not filename:
+            return jsonify({'error': 'No file provided'}), 400
+        source = os.path.join(UPLOAD_FOLDER, secure_filename(filename))
+        if not os.path.exists(source):
+            return jsonify({'error': 'File not found'}), 404
+    
+    nrows = request.args.get('rows', PROBE_ROWS, type=int)
+    if ('rows' in request.args and request.args.get('rows', type=int) is None) or nrows < 1:
+        return jsonify({'error': 'rows must be a positive whole number'}), 400
+    nrows = min(nrows, PROBE_MAX_ROWS)
+    try:
+        return jsonify({'success': True, **probe_workbook(source, nrows=nrows)})
+    except UNREADABLE_WORKBOOK_ERRORS as e:
+        return jsonify({'error': f'Not a readable Excel workbook: {str(e)}'}), 400
+
+def read_generate_body():
+    """Options and sales records of a /api/generate-csv request, decoded by Content-Type.
+    
+    JSON bodies carry both, with data as a list of row objects or an object of
+    column lists. NDJSON and Arrow bodies carry only the records, one object per
+    line or an Arrow IPC file/stream, and take their options from the query string.
+    Records come back as a DataFrame (or the JSON row list) and None means an
+    unsupported Content-Type.
+    """
+    media_type = request.mimetype
+    if media_type in NDJSON_TYPES:
+        # Parsed block by block into Arrow columns, never as one dict per line
+        table = pa_json.read_json(request.stream, read_options=pa_json.ReadOptions(block_size=NDJSON_BLOCK_BYTES))
+        return request.args, table.to_pandas()
+    if media_type in ARROW_FILE_TYPES:
+        return request.args, pa_ipc.open_file(io.BytesIO(request.get_data())).read_pandas()
+    if media_type in ARROW_STREAM_TYPES:
+        return request.args, pa_ipc.open_stream(request.stream).read_pandas()
+    if request.is_json:
+        options = request.get_json(silent=True)
+        if not isinstance(options, dict):
+            raise ValueError('expected a JSON object')
+        data = options.get('data', [])
+        if isinstance(data, dict):
+            # Column-oriented: {"invoice_date": [...], "taxable_value": [...], ...}
+            data = pd.DataFrame(data)
+        return options, data
+    return None, None
 
 @app.route('/api/generate-csv', methods=['POST'])
 def generate_csv():
     try:
-        data = request.json.get('data', [])
-        format_type = request.json.get('format', 'detailed')  # 'detailed' or 'aggregated'
-        report_frequency = request.json.get('report_frequency', 'monthly')  # 'monthly' or 'quarterly'
-        gstin = request.json.get('gstin', None)  # GSTIN from uploaded file
+        try:
+            options, body_data = read_generate_body()
+        except ValueError as e:
+            # Malformed JSON, NDJSON or Arrow bodies (pyarrow's errors are ValueErrors)
+            return jsonify({'error': f"Could not read request body: {e}"}), 400
+        if options is None:
+            return jsonify({'error': f"Unsupported Content-Type: {request.mimetype or 'none'}"}), 415
+        dataset_id = options.get('dataset_id')
+        format_type = options.get('format', 'detailed')  # 'detailed' or 'aggregated'
+        report_frequency = options.get('report_frequency', 'monthly')  # 'monthly' or 'quarterly'
+        gstin = options.get('gstin', None)  # GSTIN from uploaded file
+        
+        if dataset_id:
+            # Load the parsed upload stored server-side
+            metadata = load_dataset_meta(dataset_id)
+            data = load_dataset_frame(dataset_id, 'sales')
+            if metadata is None or data is None:
+                return jsonify({'error': 'Dataset not found'}), 404
+            gstin = gstin or metadata.get('gstin')
+            report_frequency = options.get('report_frequency', metadata.get('report_frequency', 'monthly'))
+        else:
+            data = body_data
         
-        if not data:
+        if len(data) == 0:
             return jsonify({'error': 'No data provided'}), 400
         
+        cleanup_output_folder()
+        
         # Create filename with GSTIN if available
         gstin_suffix = f"_{gstin}" if gstin else ""
         
         if format_type == 'aggregated':
             # Generate aggregated B2CS format
-            aggregated_data = generate_aggregated_b2cs(data)
+            with stage('aggregate') as record:
+                gst_df = generate_aggregated_b2cs(data)
+                record['rows'] = len(data)
             period_suffix = 'quarterly' if report_frequency == 'quarterly' else 'monthly'
             output_filename = f"b2cs_{period_suffix}{gstin_suffix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
             output_path = os.path.join(OUTPUT_FOLDER, output_filename)
             
-            gst_df = pd.DataFrame(aggregated_data)
-            gst_df.to_csv(output_path, index=False)
+            with stage('csv_write') as record:
+                gst_df.to_csv(output_path, index=False)
+                record['rows'] = len(gst_df)
             
             # Calculate total taxable value
-            total_taxable_value = gst_df['Taxable Value'].sum() if 'Taxable Value' in gst_df.columns else 0
+            total_taxable_value = money_total(gst_df['Taxable Value']) if 'Taxable Value' in gst_df.columns else 0
             
             return jsonify({
                 'success': True,
@@ -630,39 +3385,27 @@ def generate_csv():
             # If so, automatically switch to aggregated format
             if 'place_of_supply' in df.columns and 'rate' in df.columns and 'invoice_date' not in df.columns:
                 # This is aggregated data, regenerate as aggregated
-                aggregated_data = generate_aggregated_b2cs(data)
+                with stage('aggregate') as record:
+                    gst_df = generate_aggregated_b2cs(data)
+                    record['rows'] = len(data)
                 output_filename = f"b2cs_aggregated{gstin_suffix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
                 output_path = os.path.join(OUTPUT_FOLDER, output_filename)
-                gst_df = pd.DataFrame(aggregated_data)
                 
                 # Calculate total taxable value for aggregated format
-                total_taxable_value = gst_df['Taxable Value'].sum() if 'Taxable Value' in gst_df.columns else 0
+                total_taxable_value = money_total(gst_df['Taxable Value']) if 'Taxable Value' in gst_df.columns else 0
             else:
-                # Create GST portal format columns
-                gst_df = pd.DataFrame({
-                    'Invoice Date': df['invoice_date'],
-                    'Invoice No': df['invoice_no'],
-                    'HSN': df['hsn_code'],
-                    'Description': df['product_name'],
-                    'Quantity': df['quantity'],
-                    'Taxable Value': df['taxable_value'],
-                    'CGST Rate': df['cgst_rate'],
-                    'CGST': df['cgst_amount'],
-                    'SGST Rate': df['sgst_rate'],
-                    'SGST': df['sgst_amount'],
-                    'IGST Rate': df['igst_rate'],
-                    'IGST': df['igst_amount'],
-                    'Total': df['total_amount']
-                })
+                gst_df = detailed_b2c_frame(df)
             
             # Save to CSV
-            gst_df.to_csv(output_path, index=False)
+            with stage('csv_write') as record:
+                gst_df.to_csv(output_path, index=False)
+                record['rows'] = len(gst_df)
             
             # Calculate total taxable value
             if 'Taxable Value' in gst_df.columns:
-                total_taxable_value = gst_df['Taxable Value'].sum()
+                total_taxable_value = money_total(gst_df['Taxable Value'])
             elif 'taxable_value' in df.columns:
-                total_taxable_value = df['taxable_value'].sum()
+                total_taxable_value = money_total(df['taxable_value'])
             else:
                 total_taxable_value = 0
             
@@ -677,67 +3420,289 @@ def generate_csv():
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def parse_b2b_file(file_path, streaming=False):
+    """Parse the B2B records of an uploaded Amazon file (or GSTR-1 B2B CSV)"""
+    with stage('parse_b2b') as record:
+        if file_path.lower().endswith('.csv'):
+            _, b2b_data = parse_csv_report(file_path, layouts=('b2b',))
+            if b2b_data is None:
+                b2b_data = pd.DataFrame(columns=B2B_RECORD_COLUMNS)
+        else:
+            b2b_data = stream_amazon_b2b(file_path) if streaming else parse_amazon_b2b(file_path)
+        record['rows'] = len(b2b_data)
+    return b2b_data
+
+def write_b2b_csv(b2b_data, report_frequency, gstin):
+    """Write B2B records as a GSTR-1 B2B CSV in OUTPUT_FOLDER; (body, status)"""
+    # Create filename with GSTIN if available
+    gstin_suffix = f"_{gstin}" if gstin else ""
+    
+    if b2b_data.empty:
+        return {'error': 'No B2B data found in file'}, 400
+    
+    # Generate B2B CSV
+    b2b_df = generate_b2b_csv(b2b_data)
+    
+    if b2b_df.empty:
+        return {'error': 'Failed to generate B2B CSV'}, 500
+    
+    # Save to CSV file
+    cleanup_output_folder()
+    period_suffix = 'quarterly' if report_frequency == 'quarterly' else 'monthly'
+    output_filename = f"b2b_{period_suffix}{gstin_suffix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+    output_path = os.path.join(OUTPUT_FOLDER, output_filename)
+    
+    with stage('csv_write') as record:
+        b2b_df.to_csv(output_path, index=False)
+        record['rows'] = len(b2b_df)
+    
+    # Calculate total taxable value for B2B
+    total_taxable_value = money_total(b2b_df['Taxable Value']) if 'Taxable Value' in b2b_df.columns else 0
+    
+    return {
+        'success': True,
+        'filename': output_filename,
+        'message': 'B2B CSV generated successfully',
+        'rows': len(b2b_df),
+        'total_taxable_value': round(total_taxable_value, 2)
+    }, 200
+
 @app.route('/api/generate-b2b', methods=['POST'])
 def generate_b2b():
     """Generate B2B CSV from uploaded Amazon file"""
     try:
+        dataset_id = request.json.get('dataset_id')
         filename = request.json.get('filename', '')
         report_frequency = request.json.get('report_frequency', 'quarterly')
         gstin = request.json.get('gstin', None)  # GSTIN from uploaded file
         
+        if dataset_id:
+            metadata = load_dataset_meta(dataset_id)
+            if metadata is None:
+                return jsonify({'error': 'Dataset not found'}), 404
+            # B2B records are stored with the dataset when it is uploaded
+            b2b_data = load_dataset_frame(dataset_id, 'b2b')
+            if b2b_data is None:
+                b2b_data = pd.DataFrame(columns=B2B_RECORD_COLUMNS)
+            body, status = write_b2b_csv(b2b_data, report_frequency, gstin or metadata.get('gstin'))
+            return jsonify(body), status
+        
         if not filename:
             return jsonify({'error': 'No filename provided'}), 400
         
-        # Create filename with GSTIN if available
-        gstin_suffix = f"_{gstin}" if gstin else ""
-        
         # Find the uploaded file
-        file_path = os.path.join(UPLOAD_FOLDER, filename)
+        file_path = os.path.join(UPLOAD_FOLDER, secure_filename(filename))
         if not os.path.exists(file_path):
             return jsonify({'error': 'File not found'}), 404
         
-        # Parse B2B data from Amazon file
-        b2b_data = parse_amazon_b2b(file_path)
+        # Parse B2B data from Amazon file, in the job pool when asked to
+        streaming = should_stream(file_path, request.json.get('stream'))
+        finish = partial(write_b2b_csv, report_frequency=report_frequency, gstin=gstin)
+        if is_truthy(request.json.get('async')):
+            job_id = submit_job('generate-b2b', parse_b2b_file, file_path, streaming, finish=finish)
+            return jsonify({'success': True, 'job_id': job_id, 'status': 'queued'}), 202
         
-        if not b2b_data:
-            return jsonify({'error': 'No B2B data found in file'}), 400
+        body, status = finish(parse_b2b_file(file_path, streaming))
+        return jsonify(body), status
+    
+    except Exception as e:
+        logger.exception("Error in generate_b2b: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/period-summary', methods=['POST'])
+def period_summary():
+    """B2CS and B2B totals of a GSTIN over a range of months, merged from stored monthly partials"""
+    try:
+        gstin = request.json.get('gstin')
+        from_month = request.json.get('from_month')
+        to_month = request.json.get('to_month') or from_month
         
-        # Generate B2B CSV
-        b2b_records = generate_b2b_csv(b2b_data)
+        if partials_path(gstin) is None:
+            return jsonify({'error': 'A valid GSTIN is required'}), 400
+        if not all(isinstance(month, str) and MONTH_PATTERN.fullmatch(month) for month in (from_month, to_month)):
+            return jsonify({'error': 'from_month and to_month must be YYYY-MM months'}), 400
+        if from_month > to_month:
+            return jsonify({'error': 'from_month is after to_month'}), 400
         
-        if not b2b_records:
-            return jsonify({'error': 'Failed to generate B2B CSV'}), 500
+        # Merging touches one row per stored group, however many invoices the months held
+        with stage('merge_partials') as record:
+            partials = load_period_partials(gstin, from_month, to_month)
+            b2cs = merge_period_partials(partials, 'b2cs')
+            b2b = merge_period_partials(partials, 'b2b')
+            record['rows'] = len(partials)
+        b2cs_df = b2cs_output_frame(b2cs)
         
-        # Save to CSV file
-        period_suffix = 'quarterly' if report_frequency == 'quarterly' else 'monthly'
-        output_filename = f"b2b_{period_suffix}{gstin_suffix}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
-        output_path = os.path.join(OUTPUT_FOLDER, output_filename)
+        body = {
+            'success': True,
+            'gstin': gstin,
+            'from_month': from_month,
+            'to_month': to_month,
+            'months': sorted(partials['month'].unique().tolist()),
+            'b2cs': frame_to_records(b2cs_df),
+            'b2b': frame_to_records(b2b_summary_frame(b2b)),
+            'total_taxable_value': money_total(b2cs['taxable_value']),
+            'b2b_taxable_value': money_total(b2b['taxable_value']),
+            'invoices': int(b2cs['invoices'].sum() + b2b['invoices'].sum())
+        }
         
-        b2b_df = pd.DataFrame(b2b_records)
-        b2b_df.to_csv(output_path, index=False)
+        if request.json.get('format') == 'csv':
+            if b2cs_df.empty:
+                return jsonify({'error': 'No B2CS data stored for this period'}), 404
+            cleanup_output_folder()
+            output_filename = f"b2cs_{from_month}_{to_month}_{gstin}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.csv"
+            with stage('csv_write') as record:
+                b2cs_df.to_csv(os.path.join(OUTPUT_FOLDER, output_filename), index=False)
+                record['rows'] = len(b2cs_df)
+            body['filename'] = output_filename
         
-        # Calculate total taxable value for B2B
-        total_taxable_value = b2b_df['Taxable Value'].sum() if 'Taxable Value' in b2b_df.columns else 0
+        return jsonify(body)
+    
+    except Exception as e:
+        logger.exception("Error in period_summary: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/summary', methods=['GET'])
+def get_summary():
+    """Dashboard totals of a dataset from its summary index, optionally filtered and grouped.
+
+    Query: dataset_id, and optionally section, state (state codes) and rate as
+    comma-separated lists, from_month/to_month ('YYYY-MM'), and group_by, a
+    comma-separated list of section, month, state_code and rate.
+    """
+    try:
+        dataset_id = request.args.get('dataset_id')
+        metadata = load_dataset_meta(dataset_id)
+        if metadata is None:
+            return jsonify({'error': 'Dataset not found'}), 404
+        
+        def listed(name):
+            return [value.strip() for value in request.args.get(name, '').split(',') if value.strip()]
+        
+        group_by = listed('group_by')
+        if any(key not in SUMMARY_KEYS for key in group_by):
+            return jsonify({'error': f"group_by must be among: {', '.join(SUMMARY_KEYS)}"}), 400
+        try:
+            rates = [float(rate) for rate in listed('rate')]
+        except ValueError:
+            return jsonify({'error': 'rate must be a comma-separated list of numbers'}), 400
+        filters = {
+            'section': listed('section'),
+            'state': [code.zfill(2) for code in listed('state')],
+            'rate': rates,
+            'from_month': request.args.get('from_month'),
+            'to_month': request.args.get('to_month')
+        }
+        if not all(MONTH_PATTERN.fullmatch(month) for month in (filters['from_month'], filters['to_month']) if month):
+            return jsonify({'error': 'from_month and to_month must be YYYY-MM months'}), 400
+        
+        # The index holds one row per section, month, state and rate, however many invoices the upload had
+        with stage('summary') as record:
+            summary = load_dataset_frame(dataset_id, 'summary')
+            rows = filter_summary(summary, filters)
+            record['rows'] = len(summary)
+        
+        body = {
+            'success': True,
+            'dataset_id': dataset_id,
+            'filename': metadata.get('filename'),
+            'portal': metadata.get('portal'),
+            'gstin': metadata.get('gstin'),
+            'report_frequency': metadata.get('report_frequency'),
+            'rows': metadata.get('rows'),
+            'months': sorted(month for month in summary['month'].unique() if month),
+            'totals': summary_totals(rows),
+            'sections': {section: summary_totals(rows[rows['section'] == section]) for section in ('b2cs', 'b2b')}
+        }
+        if group_by:
+            body['groups'] = summary_groups(rows, group_by)
+        return jsonify(body)
+    
+    except Exception as e:
+        logger.exception("Error in get_summary: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/reconcile', methods=['GET'])
+def reconcile():
+    """Reconcile a stored dataset's sections: parsed records against exported rows and the sheets' printed totals"""
+    try:
+        dataset_id = request.args.get('dataset_id')
+        metadata = load_dataset_meta(dataset_id)
+        if metadata is None:
+            return jsonify({'error': 'Dataset not found'}), 404
         
+        sections = {section: load_dataset_frame(dataset_id, name)
+                    for section, name in (('b2cs', 'sales'), ('b2b', 'b2b'), ('cdnr', 'cdnr'))}
+        checks = reconcile_sections(sections, metadata.get('reported_totals'))
         return jsonify({
             'success': True,
-            'filename': output_filename,
-            'message': 'B2B CSV generated successfully',
-            'rows': len(b2b_df),
-            'total_taxable_value': round(total_taxable_value, 2)
+            'dataset_id': dataset_id,
+            'reconciled': all(check['reconciled'] for check in checks),
+            'sections': checks
         })
     
     except Exception as e:
-        print(f"Error in generate_b2b: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        logger.exception("Error in reconcile: %s", e)
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/validation', methods=['GET'])
+def get_validation():
+    """Row-level validation report of a stored dataset, as JSON (the first problems) or a full CSV.
+
+    Query: dataset_id, and optionally section and severity to filter on, and
+    format=csv for the whole report as a download.
+    """
+    try:
+        dataset_id = request.args.get('dataset_id')
+        metadata = load_dataset_meta(dataset_id)
+        if metadata is None:
+            return jsonify({'error': 'Dataset not found'}), 404
+        
+        report = load_dataset_frame(dataset_id, 'validation')
+        
+        for column in ('section', 'severity'):
+            if request.args.get(column):
+                report = report[report[column] == request.args.get(column)]
+        
+        if request.args.get('format') == 'csv':
+            download_name = f"validation_{metadata.get('gstin') or dataset_id}.csv"
+            return Response(iter_export([(download_name, report)]), mimetype='text/csv', headers={
+                'Content-Disposition': f'attachment; filename="{download_name}"'
+            })
+        
+        return jsonify({
+            'success': True,
+            'dataset_id': dataset_id,
+            'valid': not (report['severity'] == 'error').any(),
+            **validation_counts(report),
+            'issues': frame_to_records(report.head(VALIDATION_REPORT_ROWS)),
+            'truncated': len(report) > VALIDATION_REPORT_ROWS
+        })
+    
+    except Exception as e:
+        logger.exception("Error in get_validation: %s", e)
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/jobs/<job_id>', methods=['GET'])
+def get_job(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    return jsonify(job_status(job))
+
+@app.route('/api/jobs/<job_id>', methods=['DELETE'])
+def delete_job(job_id):
+    job = JOBS.get(job_id)
+    if job is None:
+        return jsonify({'error': 'Job not found'}), 404
+    if not cancel_job(job):
+        return jsonify({'error': f"Job is already {job['status']}", **job_status(job)}), 409
+    return jsonify(job_status(job))
+
 @app.route('/api/download/<filename>', methods=['GET'])
 def download_file(filename):
-    file_path = os.path.join(OUTPUT_FOLDER, filename)
+    file_path = os.path.join(OUTPUT_FOLDER, secure_filename(filename))
     if os.path.exists(file_path):
-        return send_file(file_path, as_attachment=True)
+        return send_file(os.path.abspath(file_path), as_attachment=True, conditional=True)
     return jsonify({'error': 'File not found'}), 404
 
 if __name__ == '__main__':
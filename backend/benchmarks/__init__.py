@@ -0,0 +1,13 @@
+"""Synthetic Amazon Ready to File workbooks and a timing/memory benchmark for the parsers.
+
+Run from the backend folder:
+
+    python -m benchmarks.generate --rows 100000 --out /tmp/rtf_100k.xlsx
+    python -m benchmarks.generate --rows 1000000 --variant csv --out /tmp/invoices_1m.csv
+    python -m benchmarks.run --sizes 1000 100000
+    python -m benchmarks.run --sizes 1000000 --no-memory --baseline benchmarks/results/<earlier>.json
+
+Generated workbooks are kept in benchmarks/data and results are written to
+benchmarks/results as JSON. The tracemalloc pass is slow on million-row sheets,
+so skip it there with --no-memory.
+"""
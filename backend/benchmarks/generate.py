@@ -0,0 +1,167 @@
+"""Write synthetic Amazon Ready to File workbooks (and invoice CSVs) of any size"""
+import argparse
+import csv
+import random
+from datetime import datetime, timedelta
+
+from openpyxl import Workbook
+
+GSTIN_CHARS = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+
+# State codes that appear as places of supply, weighted towards the big states
+STATES = [
+    ('29', 'Karnataka', 12), ('27', 'Maharashtra', 14), ('07', 'Delhi', 10), ('33', 'Tamil Nadu', 8),
+    ('09', 'Uttar Pradesh', 8), ('06', 'Haryana', 6), ('24', 'Gujarat', 6), ('36', 'Telangana', 5),
+    ('19', 'West Bengal', 5), ('08', 'Rajasthan', 4), ('32', 'Kerala', 4), ('23', 'Madhya Pradesh', 3),
+    ('21', 'Odisha', 2), ('03', 'Punjab', 2), ('10', 'Bihar', 2), ('18', 'Assam', 1), ('30', 'Goa', 1)
+]
+
+# GST slabs; Amazon writes B2C Small rates as fractions and B2B rates as percentages
+GST_RATES = [0, 5, 12, 18, 28]
+GST_RATE_WEIGHTS = [2, 20, 25, 45, 8]
+
+SELLER_GSTIN = '29AICPN1083C1ZI'
+ECOMMERCE_GSTIN = '29AAICA3918J1C0'
+
+INVOICE_HEADER = [
+    'Invoice Date', 'Invoice No', 'HSN', 'Description', 'Quantity', 'Taxable Value',
+    'CGST', 'SGST', 'IGST', 'Total', 'Place Of Supply'
+]
+
+def gstin_check_digit(base):
+    """Mod-36 check character for the first 14 characters of a GSTIN"""
+    total = 0
+    for position, char in enumerate(base):
+        product = GSTIN_CHARS.index(char) * (2 if position % 2 else 1)
+        total += product // 36 + product % 36
+    return GSTIN_CHARS[(36 - total % 36) % 36]
+
+def random_gstin(rng, state_code):
+    """A structurally valid GSTIN (PAN-shaped body and a correct check digit) for a state"""
+    letters = 'ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+    pan = ''.join(rng.choice(letters) for _ in range(5)) + f"{rng.randrange(10000):04d}" + rng.choice(letters)
+    base = f"{state_code}{pan}{rng.choice('123456789')}Z"
+    return base + gstin_check_digit(base)
+
+def add_gstin_sheet(workbook, period):
+    """First sheet with the 'Merchant GSTIN' label the GSTIN extractor looks for"""
+    sheet = workbook.create_sheet('GSTIN')
+    sheet.append(['Amazon Ready to File Report'])
+    sheet.append([])
+    sheet.append(['Merchant GSTIN', 'Period'])
+    sheet.append([SELLER_GSTIN, period])
+
+def add_b2c_small_sheet(workbook, rng, rows):
+    """B2C Small sheet: two preamble rows, the summary header, the B2CS header, then rows"""
+    places = [f"{code}-{name}" for code, name, _ in STATES]
+    weights = [weight for _, _, weight in STATES]
+    place_values = rng.choices(places, weights, k=rows)
+    rate_values = rng.choices(GST_RATES, GST_RATE_WEIGHTS, k=rows)
+    
+    sheet = workbook.create_sheet('B2C Small')
+    sheet.append(['Summary For B2CS(7)'])
+    sheet.append(['', 'Total Taxable Value', 'Total Cess'])
+    sheet.append(['Summary header', None, None, None, None, None, None])
+    sheet.append(['Type', 'Place Of Supply', 'Applicable % of Tax Rate', 'Rate', 'Taxable Value', 'Cess Amount', 'E-Commerce GSTIN'])
+    for place, rate in zip(place_values, rate_values):
+        sheet.append(['OE', place, None, rate / 100, round(rng.uniform(-200, 25000), 2), 0, ECOMMERCE_GSTIN])
+
+def add_b2b_sheet(workbook, rng, rows, start_date, days):
+    """B2B sheet: two preamble rows, the summary header, the GSTR-1 B2B header, then invoices"""
+    # A realistic seller has far fewer business buyers than invoices
+    buyers = [random_gstin(rng, rng.choice(STATES)[0]) for _ in range(max(1, min(rows // 20, 5000)))]
+    states = {code: f"{code}-{name}" for code, name, _ in STATES}
+    
+    sheet = workbook.create_sheet('B2B')
+    sheet.append(['Summary For B2B(4)'])
+    sheet.append([])
+    sheet.append(['No. of Recipients', None, 'No. of Invoices', None, 'Total Invoice Value'])
+    sheet.append([
+        'GSTIN/UIN of Recipient', 'Receiver Name', 'Invoice Number', 'Invoice date', 'Invoice Value',
+        'Place Of Supply', 'Reverse Charge', 'Applicable % of Tax Rate', 'Invoice Type', 'E-Commerce GSTIN',
+        'Rate', 'Taxable Value', 'Cess Amount'
+    ])
+    for i in range(rows):
+        buyer = rng.choice(buyers)
+        rate = rng.choices(GST_RATES, GST_RATE_WEIGHTS)[0]
+        taxable_value = round(rng.uniform(100, 50000), 2)
+        sheet.append([
+            buyer, f"Buyer {buyer[2:7]}", f"IN-{i:08d}", start_date + timedelta(days=rng.randrange(days)),
+            round(taxable_value * (1 + rate / 100), 2), states.get(buyer[:2], '29-Karnataka'), 'N', None,
+            'Regular B2B', None, rate, taxable_value, 0
+        ])
+
+def invoice_rows(rng, rows, start_date, days):
+    """Detailed invoice rows, one per invoice with CGST/SGST or IGST amounts"""
+    places = [(code, f"{code}-{name}") for code, name, _ in STATES]
+    weights = [weight for _, _, weight in STATES]
+    
+    for i in range(rows):
+        code, place = rng.choices(places, weights)[0]
+        rate = rng.choices(GST_RATES, GST_RATE_WEIGHTS)[0]
+        taxable_value = round(rng.uniform(50, 5000), 2)
+        # Sales inside the seller's state pay CGST + SGST, the rest pay IGST
+        if code == SELLER_GSTIN[:2]:
+            cgst = sgst = round(taxable_value * rate / 200, 2)
+            igst = 0
+        else:
+            cgst = sgst = 0
+            igst = round(taxable_value * rate / 100, 2)
+        yield [
+            start_date + timedelta(days=rng.randrange(days)), f"AMZ-{i:08d}", 6109 + i % 7,
+            f"Item {i % 997}", rng.randint(1, 4), taxable_value, cgst, sgst, igst,
+            round(taxable_value + cgst + sgst + igst, 2), place
+        ]
+
+def add_invoice_sheet(workbook, rng, rows, start_date, days):
+    """Detailed invoice sheet, one row per invoice"""
+    sheet = workbook.create_sheet('Invoices')
+    sheet.append(INVOICE_HEADER)
+    for row in invoice_rows(rng, rows, start_date, days):
+        sheet.append(row)
+
+def write_invoice_csv(path, rows, seed=0, start_date=datetime(2025, 4, 1), days=91):
+    """Write the detailed invoices of a 'detailed' workbook with the same seed as a CSV report"""
+    rng = random.Random(seed)
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(INVOICE_HEADER)
+        for row in invoice_rows(rng, rows, start_date, days):
+            row[0] = row[0].strftime('%Y-%m-%d')
+            writer.writerow(row)
+    return path
+
+def write_workbook(path, rows, variant='rtf', b2b_rows=None, seed=0, start_date=datetime(2025, 4, 1), days=91):
+    """Write a synthetic report to path.
+    
+    variant 'rtf' is a Ready to File workbook (GSTIN, B2C Small and B2B sheets, with
+    b2b_rows B2B invoices, defaulting to rows); 'detailed' is a single invoice sheet.
+    """
+    rng = random.Random(seed)
+    # Write-only workbooks stream rows to disk, so million-row sheets stay cheap
+    workbook = Workbook(write_only=True)
+    if variant == 'rtf':
+        add_gstin_sheet(workbook, 'Apr-Jun 2025')
+        add_b2c_small_sheet(workbook, rng, rows)
+        add_b2b_sheet(workbook, rng, rows if b2b_rows is None else b2b_rows, start_date, days)
+    elif variant == 'detailed':
+        add_invoice_sheet(workbook, rng, rows, start_date, days)
+    else:
+        raise ValueError(f"Unknown workbook variant: {variant}")
+    workbook.save(path)
+    return path
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=1000, help='rows per data sheet')
+    parser.add_argument('--b2b-rows', type=int, default=None, help='B2B invoices (rtf only; defaults to --rows)')
+    parser.add_argument('--variant', choices=['rtf', 'detailed', 'csv'], default='rtf',
+                        help="'csv' writes the detailed invoices as a CSV report")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', required=True, help='path of the .xlsx (or .csv) file to write')
+    args = parser.parse_args()
+    if args.variant == 'csv':
+        write_invoice_csv(args.out, args.rows, args.seed)
+    else:
+        write_workbook(args.out, args.rows, args.variant, args.b2b_rows, args.seed)
+    print(f"Wrote {args.variant} report with {args.rows} rows to {args.out}")
@@ -0,0 +1,195 @@
+"""Time and memory-profile each parsing stage on synthetic workbooks, writing JSON results"""
+import argparse
+import json
+import logging
+import os
+import platform
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime
+
+import numpy as np
+import openpyxl
+import pandas as pd
+
+import app
+from benchmarks.generate import write_invoice_csv, write_workbook
+
+BENCHMARK_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_SIZES = [1000, 100000, 1000000]
+
+def workbook_path(data_dir, variant, rows, seed):
+    """Generate a synthetic workbook (or CSV report) once and reuse it across runs"""
+    path = os.path.join(data_dir, f"{variant}_{rows}_seed{seed}.{'csv' if variant == 'csv' else 'xlsx'}")
+    if not os.path.exists(path):
+        print(f"Generating {variant} report with {rows} rows...")
+        start = time.perf_counter()
+        if variant == 'csv':
+            write_invoice_csv(path, rows, seed=seed)
+        else:
+            write_workbook(path, rows, variant, seed=seed)
+        print(f"  done in {time.perf_counter() - start:.1f}s")
+    return path
+
+def output_rows(result):
+    """Rows in a stage's output, whatever shape it comes in"""
+    if isinstance(result, dict) and 'data' in result:
+        return len(result['data'])
+    if hasattr(result, '__len__') and not isinstance(result, str):
+        return len(result)
+    return None
+
+def measure(func, repeat, profile_memory):
+    """Best and median wall time over repeat calls, plus peak traced memory of one extra call"""
+    timings = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        timings.append(time.perf_counter() - start)
+    
+    peak_memory_mb = None
+    if profile_memory:
+        # Tracing slows Python code down, so memory is measured on a separate, untimed call
+        tracemalloc.start()
+        try:
+            func()
+            peak_memory_mb = round(tracemalloc.get_traced_memory()[1] / (1024 * 1024), 3)
+        finally:
+            tracemalloc.stop()
+    
+    return {
+        'seconds_best': round(min(timings), 6),
+        'seconds_median': round(statistics.median(timings), 6),
+        'peak_memory_mb': peak_memory_mb,
+        'output_rows': output_rows(result)
+    }, result
+
+def write_csv(df, out_dir, name):
+    path = os.path.join(out_dir, name)
+    df.to_csv(path, index=False)
+    return df
+
+def stages_for(variant, path, out_dir):
+    """(stage name, callable) pairs in pipeline order; later stages use earlier results"""
+    results = {}
+    
+    def keep(name, func):
+        def call():
+            results[name] = func()
+            return results[name]
+        return call
+    
+    if variant == 'csv':
+        # The same invoices as the 'detailed' workbook, through the chunked CSV reader
+        return [
+            ('parse_b2cs', keep('b2cs', lambda: app.parse_csv_report(path, 'amazon')[1])),
+            ('stream_b2cs', lambda: app.parse_csv_report(path, 'amazon', streaming=True)[1]),
+            ('aggregate_b2cs', keep('b2cs_csv', lambda: app.generate_aggregated_b2cs(results['b2cs']))),
+            ('csv_write_b2cs', lambda: write_csv(results['b2cs_csv'], out_dir, 'b2cs.csv')),
+            ('upload_parse', lambda: app.parse_uploaded_file(path, 'amazon'))
+        ]
+    
+    stages = [('workbook_open', lambda: app.WorkbookSession(path).close())]
+    if variant == 'rtf':
+        stages.append(('gstin_extraction', lambda: app.extract_gstin_from_amazon_file(path)))
+    stages += [
+        ('parse_b2cs', keep('b2cs', lambda: app.parse_amazon_file(path))),
+        ('stream_b2cs', lambda: app.stream_amazon_file(path)),
+        ('aggregate_b2cs', keep('b2cs_csv', lambda: app.generate_aggregated_b2cs(results['b2cs']))),
+        ('csv_write_b2cs', lambda: write_csv(results['b2cs_csv'], out_dir, 'b2cs.csv'))
+    ]
+    if variant == 'rtf':
+        stages += [
+            ('parse_b2b', keep('b2b', lambda: app.parse_amazon_b2b(path))),
+            ('stream_b2b', lambda: app.stream_amazon_b2b(path)),
+            ('build_b2b_csv', keep('b2b_csv', lambda: app.generate_b2b_csv(results['b2b']))),
+            ('csv_write_b2b', lambda: write_csv(results['b2b_csv'], out_dir, 'b2b.csv'))
+        ]
+    stages.append(('upload_parse', lambda: app.parse_uploaded_file(path, 'amazon')))
+    return stages
+
+def run_benchmarks(sizes, variants, repeat, profile_memory, data_dir, seed):
+    """Run every stage for every variant and size; returns a list of result rows"""
+    rows = []
+    with tempfile.TemporaryDirectory() as out_dir:
+        for variant in variants:
+            for size in sizes:
+                path = workbook_path(data_dir, variant, size, seed)
+                # Big workbooks take long enough that a single timed call is representative
+                stage_repeat = repeat if size <= 100000 else 1
+                for stage_name, func in stages_for(variant, path, out_dir):
+                    stats, _ = measure(func, stage_repeat, profile_memory)
+                    row = {'variant': variant, 'rows': size, 'stage': stage_name, 'repeat': stage_repeat, **stats}
+                    rows.append(row)
+                    print(f"{variant:>8} {size:>9} {stage_name:<18} {stats['seconds_best']:>10.4f}s"
+                          f"  {stats['peak_memory_mb'] if stats['peak_memory_mb'] is not None else '-':>10} MB"
+                          f"  {stats['output_rows']} rows")
+    return rows
+
+def compare(results, baseline_path, tolerance):
+    """Stages slower than the baseline by more than tolerance (a fraction), as messages"""
+    with open(baseline_path) as f:
+        baseline = {(r['variant'], r['rows'], r['stage']): r for r in json.load(f)['results']}
+    regressions = []
+    for row in results:
+        before = baseline.get((row['variant'], row['rows'], row['stage']))
+        if before is None or before['seconds_best'] <= 0:
+            continue
+        ratio = row['seconds_best'] / before['seconds_best']
+        if ratio > 1 + tolerance:
+            regressions.append(
+                f"{row['variant']} {row['rows']} {row['stage']}: {before['seconds_best']:.4f}s -> "
+                f"{row['seconds_best']:.4f}s ({ratio:.2f}x)"
+            )
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='rows per data sheet')
+    parser.add_argument('--variants', nargs='+', choices=['rtf', 'detailed', 'csv'], default=['rtf', 'detailed', 'csv'])
+    parser.add_argument('--repeat', type=int, default=3, help='timed calls per stage (workbooks up to 100k rows)')
+    parser.add_argument('--no-memory', action='store_true', help='skip the tracemalloc pass')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--data-dir', default=os.path.join(BENCHMARK_DIR, 'data'), help='where generated workbooks are kept')
+    parser.add_argument('--output', default=None, help='results JSON path (default: benchmarks/results/<timestamp>.json)')
+    parser.add_argument('--baseline', default=None, help='earlier results JSON to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2, help='allowed slowdown against the baseline')
+    args = parser.parse_args()
+    
+    # Per-call parser logging would swamp the timings
+    logging.getLogger('sellersuite').setLevel(logging.WARNING)
+    os.makedirs(args.data_dir, exist_ok=True)
+    
+    results = run_benchmarks(args.sizes, args.variants, args.repeat, not args.no_memory, args.data_dir, args.seed)
+    
+    output = args.output or os.path.join(BENCHMARK_DIR, 'results', f"{datetime.now().strftime('%Y%m%d_%H%M%S')}.json")
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump({
+            'created_at': datetime.now().isoformat(),
+            'environment': {
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'cpu_count': os.cpu_count(),
+                'pandas': pd.__version__,
+                'numpy': np.__version__,
+                'openpyxl': openpyxl.__version__
+            },
+            'parser_version': app.PARSER_VERSION,
+            'results': results
+        }, f, indent=2)
+    print(f"Results written to {output}")
+    
+    if args.baseline:
+        regressions = compare(results, args.baseline, args.tolerance)
+        for message in regressions:
+            print(f"REGRESSION {message}")
+        if regressions:
+            sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,12 @@
+"""Shared setup: tests import app from the backend folder and run in a scratch directory.
+
+app creates its upload, output and dataset folders in the working directory
+when it is imported, so the tests move to a temporary one first.
+"""
+import os
+import sys
+import tempfile
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BACKEND_DIR)
+os.chdir(tempfile.mkdtemp(prefix='sellersuite-tests-'))
@@ -0,0 +1,33 @@
+"""Stored datasets and the frames derived from them"""
+import os
+import shutil
+import time
+
+import pandas as pd
+
+import app
+from benchmarks.generate import write_workbook
+
+def test_frames_round_trip_through_arrow(tmp_path):
+    path = write_workbook(str(tmp_path / 'rtf.xlsx'), 30, 'rtf')
+    b2b = app.parse_amazon_b2b(path)
+    dataset_id = app.save_dataset({'b2b': b2b[b2b['rate'] > 0]}, {'gstin': None})
+    assert os.path.exists(app.dataset_path(dataset_id, 'b2b'))
+    pd.testing.assert_frame_equal(app.load_dataset_frame(dataset_id, 'b2b'), b2b[b2b['rate'] > 0].reset_index(drop=True))
+
+def test_old_and_least_recently_used_datasets_are_evicted():
+    for name in os.listdir(app.DATASET_FOLDER):
+        shutil.rmtree(os.path.join(app.DATASET_FOLDER, name))
+    frame = pd.DataFrame({'taxable_value': [100.0] * 1000})
+    old, used, recent = (app.save_dataset({'sales': frame}, {'gstin': None}) for _ in range(3))
+    os.utime(os.path.join(app.dataset_path(old), 'meta.json'), (0, 0))
+    os.utime(os.path.join(app.dataset_path(used), 'meta.json'), (time.time() - 60, time.time() - 60))
+    app.evict_datasets()
+    assert app.load_dataset_meta(old) is None
+    
+    # Loading a dataset counts as using it, so the other one goes first
+    app.load_dataset_meta(used)
+    size = sum(entry.stat().st_size for entry in os.scandir(app.dataset_path(used)))
+    app.evict_datasets(max_bytes=size)
+    assert app.load_dataset_meta(recent) is None
+    assert app.load_dataset_meta(used) is not None
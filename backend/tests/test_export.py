@@ -0,0 +1,97 @@
+"""Streamed CSV, gzip, zip and GSTR-1 JSON exports, and consolidation across datasets"""
+import gzip
+import io
+import json
+import zipfile
+
+import pandas as pd
+import pytest
+
+import app
+from benchmarks.generate import SELLER_GSTIN, gstin_check_digit, write_workbook
+
+OTHER_GSTIN = '27AICPN1083C1Z' + gstin_check_digit('27AICPN1083C1Z')
+
+def upload_report(path, **form):
+    with open(path, 'rb') as f:
+        response = app.app.test_client().post('/api/upload', data={'file': (f, path.split('/')[-1]), 'portal': 'amazon', **form})
+    assert response.status_code == 200, response.json
+    return response.json['dataset_id']
+
+def export(**body):
+    response = app.app.test_client().post('/api/export', json=body)
+    assert response.status_code == 200, response.get_data(as_text=True)
+    return response
+
+def csv_bytes(df):
+    return df.to_csv(index=False).encode('utf-8')
+
+@pytest.fixture(scope='module')
+def rtf_dataset(tmp_path_factory):
+    return upload_report(write_workbook(str(tmp_path_factory.mktemp('rtf') / 'rtf.xlsx'), 60, 'rtf', seed=1))
+
+@pytest.fixture(scope='module')
+def detailed_datasets(tmp_path_factory):
+    folder = tmp_path_factory.mktemp('detailed')
+    return [upload_report(write_workbook(str(folder / f'detailed_{seed}.xlsx'), 300, 'detailed', seed=seed), gstin=gstin)
+            for seed, gstin in ((2, SELLER_GSTIN), (3, OTHER_GSTIN))]
+
+def test_csv_chunks_join_into_the_whole_csv():
+    frame = pd.DataFrame({'Place Of Supply': ['29-Karnataka'] * 25, 'Taxable Value': [i + 0.5 for i in range(25)]})
+    assert b''.join(app.iter_csv_chunks(frame, chunk_rows=7)) == csv_bytes(frame)
+
+def test_plain_and_gzip_exports_match_the_aggregated_csv(rtf_dataset):
+    expected = csv_bytes(app.generate_aggregated_b2cs(app.load_dataset_frame(rtf_dataset, 'sales')))
+    assert export(dataset_id=rtf_dataset, sections=['b2cs']).data == expected
+    assert gzip.decompress(export(dataset_id=rtf_dataset, sections=['b2cs'], compression='gzip').data) == expected
+
+def test_zip_export_holds_each_section(rtf_dataset):
+    response = export(dataset_id=rtf_dataset, sections=['b2cs', 'b2b'])
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        members = {name.split('_')[0]: archive.read(name) for name in archive.namelist()}
+    assert members['b2cs'] == csv_bytes(app.generate_aggregated_b2cs(app.load_dataset_frame(rtf_dataset, 'sales')))
+    assert members['b2b'] == csv_bytes(app.generate_b2b_csv(app.load_dataset_frame(rtf_dataset, 'b2b')))
+
+def test_gstr1_json_totals_match_the_aggregated_csv(detailed_datasets):
+    dataset_id = detailed_datasets[0]
+    response = export(dataset_id=dataset_id, sections=['b2cs'], format='gstr1', compression='gzip')
+    document = json.loads(gzip.decompress(response.data))
+    aggregated = app.generate_aggregated_b2cs(app.load_dataset_frame(dataset_id, 'sales'))
+    assert document['gstin'] == SELLER_GSTIN and document['fp'] == '062025'
+    assert {(entry['pos'], entry['rt']): entry['txval'] for entry in document['b2cs']} == {
+        (place[:2], rate): value for place, rate, value
+        in zip(aggregated['Place Of Supply'], aggregated['Rate'], aggregated['Taxable Value'])
+    }
+
+def test_artifact_downloads_are_conditional(rtf_dataset):
+    response = export(dataset_id=rtf_dataset, sections=['b2cs'], artifact=True)
+    content, etag = response.data, response.headers['ETag']
+    download = f"/api/download/{response.headers['X-Export-Filename']}"
+    client = app.app.test_client()
+    
+    assert client.get(download).data == content
+    assert client.get(download, headers={'If-None-Match': etag}).status_code == 304
+    ranged = client.get(download, headers={'Range': 'bytes=10-29'})
+    assert ranged.status_code == 206
+    assert ranged.data == content[10:30]
+    assert ranged.headers['Content-Range'] == f'bytes 10-29/{len(content)}'
+
+def test_consolidation_splits_each_dataset_by_gstin_and_month(detailed_datasets):
+    response = app.app.test_client().post('/api/consolidate', json={
+        'dataset_ids': detailed_datasets, 'sections': ['b2cs'], 'report_frequency': 'monthly'
+    })
+    assert response.status_code == 200, response.get_data(as_text=True)
+    with zipfile.ZipFile(io.BytesIO(response.data)) as archive:
+        files = {name: pd.read_csv(archive.open(name), dtype={'Place Of Supply': str}) for name in archive.namelist()}
+    
+    for dataset_id, gstin in zip(detailed_datasets, (SELLER_GSTIN, OTHER_GSTIN)):
+        months = sorted(name for name in files if name.startswith(f'{gstin}/'))
+        assert months == [f'{gstin}/b2cs_2025-0{month}.csv' for month in (4, 5, 6)]
+        # The months of one GSTIN add up to the aggregated CSV of its whole dataset
+        stacked = pd.concat([files[name] for name in months])
+        per_rate = stacked.groupby(['Place Of Supply', 'Rate'])['Taxable Value'].sum().round(2)
+        aggregated = app.generate_aggregated_b2cs(app.load_dataset_frame(dataset_id, 'sales'))
+        assert per_rate.to_dict() == aggregated.set_index(['Place Of Supply', 'Rate'])['Taxable Value'].to_dict()
+        
+        summary = files['summary.csv']
+        assert round(summary.loc[summary['GSTIN'] == gstin, 'Taxable Value'].sum(), 2) == round(aggregated['Taxable Value'].sum(), 2)
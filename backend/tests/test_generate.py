@@ -0,0 +1,64 @@
+"""/api/generate-csv request bodies: JSON rows or columns, NDJSON and Arrow IPC"""
+import io
+import json
+import os
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+import app
+
+RECORDS = pd.DataFrame({
+    'invoice_date': ['2025-05-02', '2025-05-03', '2025-05-04', '2025-05-05'],
+    'invoice_no': ['AMZ-1', 'AMZ-2', 'AMZ-3', 'AMZ-4'],
+    'taxable_value': [1000.0, 250.5, 99.99, 0.1],
+    'cgst_rate': [9.0, 0.0, 2.5, 9.0],
+    'sgst_rate': [9.0, 0.0, 2.5, 9.0],
+    'igst_rate': [0.0, 18.0, 0.0, 0.0],
+    'place_of_supply': ['29-Karnataka', '07-Delhi', '29-Karnataka', '29-Karnataka']
+})
+
+def generate(data, content_type, query='?format=aggregated'):
+    response = app.app.test_client().post(f'/api/generate-csv{query}', data=data, content_type=content_type)
+    assert response.status_code == 200, response.json
+    with open(os.path.join(app.OUTPUT_FOLDER, response.json['filename'])) as f:
+        return f.read()
+
+def arrow_body(write):
+    sink = io.BytesIO()
+    table = pa.Table.from_pandas(RECORDS, preserve_index=False)
+    with write(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+@pytest.fixture(scope='module')
+def expected():
+    body = json.dumps({'format': 'aggregated', 'data': RECORDS.to_dict('records')})
+    return generate(body, 'application/json', query='')
+
+def test_json_columns_match_json_rows(expected):
+    body = json.dumps({'format': 'aggregated', 'data': RECORDS.to_dict('list')})
+    assert generate(body, 'application/json', query='') == expected
+
+def test_ndjson_matches_json_rows(expected):
+    body = ''.join(json.dumps(row) + '\n' for row in RECORDS.to_dict('records'))
+    assert generate(body, 'application/x-ndjson') == expected
+
+def test_arrow_file_matches_json_rows(expected):
+    assert generate(arrow_body(pa.ipc.new_file), 'application/vnd.apache.arrow.file') == expected
+
+def test_arrow_stream_matches_json_rows(expected):
+    assert generate(arrow_body(pa.ipc.new_stream), 'application/vnd.apache.arrow.stream') == expected
+
+@pytest.mark.parametrize('content_type, body', [
+    ('application/json', '{"data": [1, 2'),
+    ('application/json', '[1, 2]'),
+    ('application/x-ndjson', '{"taxable_value": 1}\nnot json\n'),
+    ('application/vnd.apache.arrow.file', b'not arrow'),
+    ('application/vnd.apache.arrow.stream', b'not arrow either')
+])
+def test_malformed_body_is_a_bad_request(content_type, body):
+    response = app.app.test_client().post('/api/generate-csv', data=body, content_type=content_type)
+    assert response.status_code == 400
+    assert response.json['error'].startswith('Could not read request body')
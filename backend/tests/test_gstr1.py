@@ -0,0 +1,58 @@
+"""GSTR-1 JSON figures for B2CS sales worked out from detailed invoices"""
+import io
+import json
+from datetime import datetime
+
+import pytest
+from openpyxl import Workbook
+
+import app
+from benchmarks.generate import INVOICE_HEADER, SELLER_GSTIN
+
+def detailed_workbook(rows):
+    """An in-memory detailed invoice workbook"""
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'Invoices'
+    sheet.append(INVOICE_HEADER)
+    for row in rows:
+        sheet.append(row)
+    buffer = io.BytesIO()
+    workbook.save(buffer)
+    buffer.seek(0)
+    return buffer
+
+def export_b2cs(rows):
+    """Upload detailed invoices for the seller and return the b2cs entries of their GSTR-1 JSON"""
+    client = app.app.test_client()
+    upload = client.post('/api/upload', data={
+        'file': (detailed_workbook(rows), 'invoices.xlsx'), 'portal': 'amazon', 'gstin': SELLER_GSTIN
+    })
+    assert upload.status_code == 200, upload.json
+    export = client.post('/api/export', json={
+        'dataset_id': upload.json['dataset_id'], 'sections': ['b2cs'], 'format': 'gstr1', 'fp': '052025'
+    })
+    assert export.status_code == 200, export.get_data(as_text=True)
+    return json.loads(export.get_data())['b2cs']
+
+def test_intra_state_invoice_carries_the_whole_rate():
+    # Karnataka is the seller's state: 18% is paid as 9% CGST plus 9% SGST
+    entries = export_b2cs([
+        [datetime(2025, 5, 2), 'AMZ-1', 6109, 'Shirt', 1, 51837.75, 4665.4, 4665.4, 0, 61168.55, '29-Karnataka']
+    ])
+    assert entries == [{
+        'sply_ty': 'INTRA', 'rt': 18, 'typ': 'OE', 'pos': '29', 'txval': 51837.75,
+        'camt': 4665.4, 'samt': 4665.4, 'csamt': 0
+    }]
+
+@pytest.mark.parametrize('rate', [5, 12, 28])
+def test_intra_state_rates_match_inter_state_rates(rate):
+    # Tax amounts are rounded to paise, so the rate worked out from them is only near the slab
+    taxable_value = 333.33
+    half = round(taxable_value * rate / 200, 2)
+    entries = export_b2cs([
+        [datetime(2025, 5, 2), 'AMZ-1', 6109, 'Shirt', 1, taxable_value, half, half, 0, taxable_value + 2 * half, '29-Karnataka'],
+        [datetime(2025, 5, 3), 'AMZ-2', 6109, 'Shirt', 1, taxable_value, 0, 0, 2 * half, taxable_value + 2 * half, '07-Delhi']
+    ])
+    assert [(entry['pos'], entry['rt']) for entry in entries] == [('07', rate), ('29', rate)]
+    assert entries[1]['camt'] == entries[1]['samt'] == half
@@ -0,0 +1,35 @@
+"""Background jobs finish off the worker pool's manager thread"""
+import threading
+import time
+
+import app
+
+def wait_for(job_id):
+    while app.JOBS[job_id]['status'] == 'queued':
+        time.sleep(0.05)
+    return app.JOBS[job_id]
+
+def test_finish_runs_on_a_finisher_thread():
+    threads = []
+    
+    def finish(result):
+        threads.append(threading.current_thread().name)
+        return {'total': result}, 200
+    
+    job = wait_for(app.submit_job('sum', sum, [1, 2, 3], finish=finish))
+    assert job['status'] == 'done' and job['result'] == {'total': 6}
+    assert threads[0].startswith('job-finish')
+
+def test_failed_finish_fails_the_job():
+    job = wait_for(app.submit_job('sum', sum, [1], finish=lambda result: ({'error': 'no good'}, 400)))
+    assert job['status'] == 'failed' and job['error'] == 'no good'
+
+def test_cancelled_job_stays_cancelled():
+    job = app.JOBS[app.submit_job('sleep', time.sleep, 0.5)]
+    assert app.cancel_job(job)
+    assert not app.cancel_job(job)
+    # A job the pool had already started still runs; its result is dropped
+    if not job['future'].cancelled():
+        job['future'].result()
+    time.sleep(0.1)
+    assert job['status'] == 'cancelled' and job['result'] is None
@@ -0,0 +1,41 @@
+"""Rupee amounts added up in paise, GST rounding and per-section reconciliation"""
+import numpy as np
+import pandas as pd
+
+import app
+
+def b2cs_records(values, places=('29-Karnataka', '07-Delhi')):
+    """Aggregated B2CS records at 18%, cycling through places"""
+    return pd.DataFrame({
+        'place_of_supply': [places[i % len(places)] for i in range(len(values))],
+        'rate': 18,
+        'taxable_value': values
+    })
+
+def test_paise_sums_do_not_drift():
+    values = np.tile([0.1, 0.2], 5000)
+    assert sum(values.tolist()) != 1500
+    assert app.money_total(values) == 1500
+    
+    frame = pd.DataFrame({'state': np.tile(['29', '07'], 5000), 'taxable_value': values, 'invoices': 1})
+    sums = app.money_sums(frame, ['state'], ['taxable_value'], ['invoices'])
+    assert sums.set_index('state')['taxable_value'].to_dict() == {'07': 1000.0, '29': 500.0}
+    assert sums['invoices'].tolist() == [5000, 5000]
+
+def test_amounts_round_half_up_at_the_paisa():
+    # round() gives 1.0 and 2.67 (their binary values sit just below the half) and 0.12 (halves go to even)
+    assert app.round_values([1.005, 2.675, 0.125, -1.005, 0.004]).tolist() == [1.01, 2.68, 0.13, -1.01, 0.0]
+    assert app.to_paise([0.005, 10.115, np.nan]).tolist() == [1, 1012, 0]
+
+def test_sections_reconcile_to_the_paisa():
+    records = b2cs_records(np.tile([0.1, 0.2], 5000))
+    [check] = app.reconcile_sections({'b2cs': records}, {'b2cs': 1500.0})
+    assert check['parsed_taxable_value'] == check['exported_taxable_value'] == 1500.0
+    assert check['difference'] == 0 and check['reconciled']
+
+def test_reported_total_that_disagrees_fails_reconciliation():
+    records = b2cs_records([100.25, 200.5])
+    [check] = app.reconcile_sections({'b2cs': records}, {'b2cs': 300.74})
+    assert not check['reconciled']
+    assert check['reported_taxable_value'] == 300.74
+    assert check['exported_taxable_value'] == 300.75
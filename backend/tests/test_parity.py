@@ -0,0 +1,182 @@
+"""The vectorized Amazon parsers against the row-by-row loops they replaced.
+
+The baseline_* functions are the original iterrows implementations (logging
+dropped); their output is the reference every record has to match exactly.
+"""
+from datetime import datetime
+
+import pandas as pd
+import pytest
+from openpyxl import Workbook
+
+import app
+from benchmarks.generate import INVOICE_HEADER, write_workbook
+
+def baseline_b2cs_records(file_path):
+    """Original parse_amazon_file: aggregated B2C Small rows, or detailed invoices"""
+    xls = pd.ExcelFile(file_path)
+    b2c_sheet = next((name for name in xls.sheet_names if 'b2c' in name.lower() and 'small' in name.lower()), None)
+    if b2c_sheet:
+        df = pd.read_excel(file_path, sheet_name=b2c_sheet, skiprows=2)
+    else:
+        df = pd.read_excel(file_path, sheet_name=0)
+    
+    first_row_first_col = df.iloc[0, 0] if len(df) > 0 else None
+    data = []
+    if isinstance(first_row_first_col, str) and first_row_first_col.lower() == 'type':
+        for idx, row in df.iterrows():
+            if idx == 0:
+                continue
+            place_of_supply = str(row.iloc[1]) if len(row) > 1 else ''
+            if not place_of_supply or place_of_supply == 'nan' or place_of_supply == '':
+                continue
+            rate = row.iloc[3] if len(row) > 3 else 0
+            if rate > 0 and rate < 1:
+                rate = int(rate * 100)
+            else:
+                rate = int(rate)
+            taxable_val = row.iloc[4] if len(row) > 4 else 0
+            taxable_val = float(taxable_val or 0)
+            if taxable_val == 0:
+                continue
+            data.append({
+                'place_of_supply': place_of_supply,
+                'rate': rate,
+                'taxable_value': round(taxable_val, 2),
+                'portal': 'Amazon'
+            })
+        return data
+    
+    for _, row in df.iterrows():
+        if pd.isna(row.get('Invoice Date', '')) or row.get('Invoice Date', '') == '':
+            continue
+        invoice_date = row.get('Invoice Date', '')
+        if not pd.isna(invoice_date):
+            invoice_date = pd.to_datetime(invoice_date).strftime('%d/%m/%Y')
+        place_of_supply = str(row.get('Place Of Supply', '')) if not pd.isna(row.get('Place Of Supply', '')) else ''
+        taxable_val = float(row.get('Taxable Value', 0) or 0)
+        cgst_amt = float(row.get('CGST', 0) or 0)
+        sgst_amt = float(row.get('SGST', 0) or 0)
+        igst_amt = float(row.get('IGST', 0) or 0)
+        cgst_rate = 0
+        sgst_rate = 0
+        igst_rate = 0
+        if taxable_val > 0:
+            if cgst_amt > 0:
+                cgst_rate = (cgst_amt / taxable_val) * 100
+                sgst_rate = cgst_rate
+            elif igst_amt > 0:
+                igst_rate = (igst_amt / taxable_val) * 100
+        data.append({
+            'invoice_date': invoice_date,
+            'invoice_no': str(row.get('Invoice No', '')),
+            'hsn_code': str(row.get('HSN', '')),
+            'product_name': str(row.get('Description', '')),
+            'quantity': float(row.get('Quantity', 0) or 0),
+            'taxable_value': round(taxable_val, 2),
+            'cgst_rate': round(cgst_rate, 2),
+            'sgst_rate': round(sgst_rate, 2),
+            'igst_rate': round(igst_rate, 2),
+            'cgst_amount': round(cgst_amt, 2),
+            'sgst_amount': round(sgst_amt, 2),
+            'igst_amount': round(igst_amt, 2),
+            'total_amount': round(float(row.get('Total', 0) or 0), 2),
+            'place_of_supply': place_of_supply,
+            'portal': 'Amazon'
+        })
+    return data
+
+def baseline_b2b_records(file_path):
+    """Original parse_amazon_b2b"""
+    xls = pd.ExcelFile(file_path)
+    b2b_sheet = next((name for name in xls.sheet_names
+                      if 'b2b' in name.lower() and 'cn' not in name.lower() and 'cdnr' not in name.lower()), None)
+    if not b2b_sheet:
+        return []
+    df = pd.read_excel(file_path, sheet_name=b2b_sheet, skiprows=2)
+    if len(df) > 0:
+        first_cell = str(df.iloc[0, 0]) if len(df.columns) > 0 else ''
+        if first_cell and first_cell.lower() in ['buyer gstin', 'gstin/uin of recipient', 'gstin']:
+            df = df.iloc[1:].reset_index(drop=True)
+    
+    data = []
+    for _, row in df.iterrows():
+        first_col = row.iloc[0] if len(row) > 0 else None
+        if pd.isna(first_col) or first_col == '' or str(first_col).lower() == 'nan':
+            continue
+        gstin = str(row.iloc[0]) if len(row) > 0 else ''
+        if not gstin or gstin == 'nan':
+            continue
+        invoice_date = row.iloc[3] if len(row) > 3 else ''
+        if not pd.isna(invoice_date):
+            try:
+                dt = pd.to_datetime(invoice_date)
+                invoice_date = f"{dt.day}-{dt.strftime('%b')}-{dt.strftime('%y')}"
+            except Exception:
+                invoice_date = str(invoice_date)
+        else:
+            invoice_date = ''
+        invoice_no = str(row.iloc[2]) if len(row) > 2 else ''
+        invoice_value = float(row.iloc[4] if len(row) > 4 else 0 or 0)
+        place_of_supply = str(row.iloc[5]) if len(row) > 5 else ''
+        state_code = place_of_supply.split('-')[0] if place_of_supply and '-' in place_of_supply else ''
+        rate = float(row.iloc[10] if len(row) > 10 else 0 or 0)
+        if rate > 0 and rate < 1:
+            rate = rate * 100
+        rate = int(rate)
+        taxable_val = float(row.iloc[11] if len(row) > 11 else 0 or 0)
+        if invoice_value == 0:
+            continue
+        data.append({
+            'buyer_gstin': gstin,
+            'buyer_name': '',
+            'invoice_no': invoice_no,
+            'invoice_date': invoice_date,
+            'invoice_value': round(invoice_value, 2),
+            'place_of_supply': place_of_supply,
+            'state_code': state_code,
+            'reverse_charge': 'N',
+            'applicable_tax_rate': '',
+            'invoice_type': 'Regular B2B',
+            'ecommerce_gstin': '',
+            'rate': rate,
+            'taxable_value': round(taxable_val, 2),
+            'cess_amount': 0
+        })
+    return data
+
+def records(df):
+    """Plain records of a parsed frame, categories and numpy scalars included"""
+    return [{key: (value.item() if hasattr(value, 'item') else value) for key, value in record.items()}
+            for record in df.astype(object).to_dict('records')]
+
+@pytest.fixture(scope='module')
+def rtf_workbook(tmp_path_factory):
+    return write_workbook(str(tmp_path_factory.mktemp('rtf') / 'rtf.xlsx'), 60, 'rtf', b2b_rows=40)
+
+@pytest.fixture(scope='module')
+def detailed_workbook(tmp_path_factory):
+    """Generated invoices plus the awkward rows real reports have: blank dates and places, text dates"""
+    path = str(tmp_path_factory.mktemp('detailed') / 'detailed.xlsx')
+    write_workbook(path, 60, 'detailed')
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'Invoices'
+    source = pd.read_excel(path)
+    sheet.append(INVOICE_HEADER)
+    for row in source.itertuples(index=False):
+        sheet.append(list(row))
+    sheet.append([None, 'AMZ-BLANK', 6109, 'No date', 1, 100, 9, 9, 0, 118, '29-Karnataka'])
+    sheet.append(['2025-05-17', 'AMZ-TEXT', 6110, 'Text date', 2, 250.5, 0, 0, 45.09, 295.59, None])
+    sheet.append([datetime(2025, 6, 30), 'AMZ-ZERO', 6111, 'Zero value', 1, 0, 0, 0, 0, 0, '07-Delhi'])
+    workbook.save(path)
+    return path
+
+def test_aggregated_b2cs_matches_baseline(rtf_workbook):
+    assert records(app.parse_amazon_file(rtf_workbook)) == baseline_b2cs_records(rtf_workbook)
+
+def test_detailed_invoices_match_baseline(detailed_workbook):
+    assert records(app.parse_amazon_file(detailed_workbook)) == baseline_b2cs_records(detailed_workbook)
+
+def test_b2b_matches_baseline(rtf_workbook):
+    assert records(app.parse_amazon_b2b(rtf_workbook)) == baseline_b2b_records(rtf_workbook)
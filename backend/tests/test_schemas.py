@@ -0,0 +1,57 @@
+"""Invoice records extracted by each portal's compiled report schema"""
+import pandas as pd
+
+import app
+from benchmarks.generate import INVOICE_HEADER, SELLER_GSTIN
+
+def extract(portal, rows, columns):
+    return app.PORTAL_PARSERS[portal](pd.DataFrame(rows, columns=columns))
+
+def rates(records):
+    return records[['cgst_rate', 'sgst_rate', 'igst_rate']].values.tolist()
+
+def test_amazon_rates_come_from_tax_amounts():
+    records = extract('amazon', [
+        ['2025-05-02', 'AMZ-1', 6109, 'Shirt', 1, 1000.0, 90.0, 90.0, 0.0, 1180.0, '29-Karnataka'],
+        ['2025-05-03', 'AMZ-2', 6109, 'Shirt', 2, 500.0, 0.0, 0.0, 60.0, 560.0, '07-Delhi']
+    ], INVOICE_HEADER)
+    assert rates(records) == [[9.0, 9.0, 0.0], [0.0, 0.0, 12.0]]
+    assert records['invoice_date'].tolist() == ['02/05/2025', '03/05/2025']
+    assert records['portal'].unique().tolist() == ['Amazon']
+
+def test_flipkart_reads_percent_rates_and_day_first_dates():
+    records = extract('flipkart', [
+        ['02/05/2025', 'FK-1', 'Lamp', 1, 1000.0, 9, 9, 0, 90.0, 90.0, 0.0, 1180.0, 'Karnataka'],
+        ['03/05/2025', 'FK-2', 'Lamp', 1, 200.0, 0, 0, 5, 0.0, 0.0, 10.0, 210.0, 'Delhi']
+    ], ['date', 'invoice_id', 'product_title', 'quantity', 'selling_price', 'cgst', 'sgst', 'igst',
+        'cgst_value', 'sgst_value', 'igst_value', 'total_price', 'state'])
+    assert rates(records) == [[9.0, 9.0, 0.0], [0.0, 0.0, 5.0]]
+    assert records['invoice_date'].tolist() == ['02/05/2025', '03/05/2025']
+    assert records['taxable_value'].tolist() == [1000.0, 200.0]
+    assert records['place_of_supply'].tolist() == ['Karnataka', 'Delhi']
+
+def test_pepperfry_reads_fractional_split_rates():
+    records = extract('pepperfry', [
+        ['02/05/2025', 'PF-1', 1000.0, 0.09, 0.09, 0, '29-Karnataka'],
+        ['03/05/2025', 'PF-2', 400.0, 0, 0, 0.28, '07-Delhi']
+    ], ['Order Date', 'Order ID', 'Taxable Amount', 'CGST %', 'SGST %', 'IGST %', 'Place Of Supply'])
+    assert rates(records) == [[9.0, 9.0, 0.0], [0.0, 0.0, 28.0]]
+    assert records[['cgst_amount', 'sgst_amount', 'igst_amount']].values.tolist() == [[90.0, 90.0, 0.0], [0.0, 0.0, 112.0]]
+    assert records['portal'].unique().tolist() == ['Pepperfry']
+
+def test_custom_whole_rate_is_split_by_tax_amounts():
+    records = extract('custom', [
+        ['02/05/2025', 1000.0, 18, 90.0, 90.0, 0.0, '29-Karnataka'],
+        ['03/05/2025', 500.0, 18, 0.0, 0.0, 90.0, '07-Delhi']
+    ], ['Invoice Date', 'Taxable Value', 'GST Rate', 'CGST', 'SGST', 'IGST', 'Place Of Supply'])
+    assert rates(records) == [[9.0, 9.0, 0.0], [0.0, 0.0, 18.0]]
+
+def test_custom_whole_rate_is_split_by_place_of_supply(tmp_path):
+    path = tmp_path / 'sales.csv'
+    path.write_text('GSTIN,Invoice Date,Taxable Value,Rate,Place Of Supply\n'
+                    f'{SELLER_GSTIN},02/05/2025,1000,0.18,29-Karnataka\n'
+                    f'{SELLER_GSTIN},03/05/2025,500,12,07-Delhi\n')
+    records = app.parse_uploaded_file(str(path), 'custom')['data']
+    assert rates(records) == [[9.0, 9.0, 0.0], [0.0, 0.0, 12.0]]
+    assert records[['cgst_amount', 'sgst_amount', 'igst_amount']].values.tolist() == [[90.0, 90.0, 0.0], [0.0, 0.0, 60.0]]
+    assert app.generate_aggregated_b2cs(records)['Rate'].tolist() == [12, 18]
@@ -0,0 +1,88 @@
+"""Dashboard and period totals from the summary index and monthly partials, and /api/metrics"""
+from datetime import datetime
+
+import pytest
+from openpyxl import Workbook
+
+import app
+from benchmarks.generate import INVOICE_HEADER, gstin_check_digit
+
+GSTIN = '29ABCDE1234F1Z' + gstin_check_digit('29ABCDE1234F1Z')
+
+# Two months of invoices: 18% in Karnataka and Delhi, 5% in Delhi
+INVOICES = [
+    [datetime(2024, 1, 10), 'INV-1', 6109, 'Shirt', 1, 1000.0, 90.0, 90.0, 0.0, 1180.0, '29-Karnataka'],
+    [datetime(2024, 1, 15), 'INV-2', 6109, 'Shirt', 1, 500.25, 0.0, 0.0, 25.01, 525.26, '07-Delhi'],
+    [datetime(2024, 2, 3), 'INV-3', 6109, 'Shirt', 1, 200.0, 0.0, 0.0, 36.0, 236.0, '07-Delhi'],
+    [datetime(2024, 2, 20), 'INV-4', 6109, 'Shirt', 1, 300.5, 27.05, 27.05, 0.0, 354.6, '29-Karnataka']
+]
+
+@pytest.fixture(scope='module')
+def dataset_id(tmp_path_factory):
+    path = tmp_path_factory.mktemp('summary') / 'invoices.xlsx'
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'Invoices'
+    sheet.append(INVOICE_HEADER)
+    for row in INVOICES:
+        sheet.append(row)
+    workbook.save(path)
+    with open(path, 'rb') as f:
+        response = app.app.test_client().post('/api/upload', data={
+            'file': (f, 'invoices.xlsx'), 'portal': 'amazon', 'gstin': GSTIN
+        })
+    assert response.status_code == 200, response.json
+    return response.json['dataset_id']
+
+def summary(dataset_id, **query):
+    response = app.app.test_client().get('/api/summary', query_string={'dataset_id': dataset_id, **query})
+    assert response.status_code == 200, response.json
+    return response.json
+
+def grouped(body, key):
+    return {group[key]: (group['taxable_value'], group['invoices']) for group in body['groups']}
+
+def test_summary_totals_by_state_rate_month_and_section(dataset_id):
+    body = summary(dataset_id)
+    assert body['months'] == ['2024-01', '2024-02']
+    assert body['totals']['taxable_value'] == 2000.75 and body['totals']['invoices'] == 4
+    assert body['sections']['b2cs']['taxable_value'] == 2000.75
+    assert body['sections']['b2b'] == {'taxable_value': 0.0, 'cess_amount': 0.0, 'invoices': 0, 'records': 0}
+    
+    assert grouped(summary(dataset_id, group_by='state_code'), 'state_code') == {'07': (700.25, 2), '29': (1300.5, 2)}
+    assert grouped(summary(dataset_id, group_by='rate'), 'rate') == {5: (500.25, 1), 18: (1500.5, 3)}
+    assert grouped(summary(dataset_id, group_by='month'), 'month') == {'2024-01': (1500.25, 2), '2024-02': (500.5, 2)}
+    assert grouped(summary(dataset_id, group_by='section'), 'section') == {'b2cs': (2000.75, 4)}
+
+def test_summary_filters(dataset_id):
+    assert summary(dataset_id, state='7')['totals']['taxable_value'] == 700.25
+    assert summary(dataset_id, rate='18', from_month='2024-02')['totals']['taxable_value'] == 500.5
+    assert summary(dataset_id, section='b2b')['totals']['invoices'] == 0
+
+def test_period_summary_merges_monthly_partials(dataset_id):
+    client = app.app.test_client()
+    body = client.post('/api/period-summary', json={'gstin': GSTIN, 'from_month': '2024-01', 'to_month': '2024-02'}).json
+    assert body['months'] == ['2024-01', '2024-02']
+    assert body['total_taxable_value'] == 2000.75 and body['invoices'] == 4
+    assert {(row['Place Of Supply'], row['Rate']): row['Taxable Value'] for row in body['b2cs']} == {
+        ('07-Delhi', 5): 500.25, ('07-Delhi', 18): 200.0, ('29-Karnataka', 18): 1300.5
+    }
+    
+    february = client.post('/api/period-summary', json={'gstin': GSTIN, 'from_month': '2024-02'}).json
+    assert february['months'] == ['2024-02'] and february['total_taxable_value'] == 500.5
+
+def test_metrics_count_requests_in_monotonic_histograms():
+    client = app.app.test_client()
+    before = client.get('/api/metrics').json['timings'].get('request.GET /api/health', {'count': 0})['count']
+    for _ in range(3):
+        client.get('/api/health')
+    client.get('/api/jobs/unknown')
+    
+    metrics = client.get('/api/metrics').json
+    health = metrics['timings']['request.GET /api/health']
+    assert health['count'] == before + 3
+    assert metrics['counters']['responses.GET /api/jobs/<job_id>.404'] >= 1
+    for timing in metrics['timings'].values():
+        counts = [bucket['count'] for bucket in timing['histogram']]
+        assert counts == sorted(counts)
+        assert timing['histogram'][-1] == {'le': '+Inf', 'count': timing['count']}
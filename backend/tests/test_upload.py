@@ -0,0 +1,135 @@
+"""Uploads (single, batch and chunked) and the JSON errors they answer bad files with"""
+import hashlib
+import io
+import os
+import shutil
+import zipfile
+
+import app
+from benchmarks.generate import write_workbook
+
+def upload(content, filename, **form):
+    client = app.app.test_client()
+    return client.post('/api/upload', data={'file': (io.BytesIO(content), filename), 'portal': 'amazon', **form})
+
+def test_corrupt_workbook_is_a_json_error():
+    response = upload(b'not a zip archive', 'report.xlsx')
+    assert response.status_code == 400
+    assert response.json['error'].startswith('Not a readable Excel workbook')
+
+def test_legacy_xls_is_refused():
+    response = upload(b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1', 'report.xls')
+    assert response.status_code == 400
+    assert response.json == {'error': 'Invalid file type'}
+
+def test_repeat_upload_reuses_its_dataset(tmp_path):
+    path = write_workbook(str(tmp_path / 'rtf.xlsx'), 30, 'rtf')
+    with open(path, 'rb') as f:
+        content = f.read()
+    first = upload(content, 'rtf.xlsx').json
+    again = upload(content, 'rtf.xlsx').json
+    assert again['dataset_id'] == first['dataset_id']
+    assert again['validation'] == first['validation'] and again['reconciliation'] == first['reconciliation']
+    
+    # Other options are another dataset, and a dataset that has gone is stored again
+    monthly = upload(content, 'rtf.xlsx', report_period='monthly').json
+    assert monthly['dataset_id'] != first['dataset_id']
+    shutil.rmtree(app.dataset_path(first['dataset_id']))
+    rebuilt = upload(content, 'rtf.xlsx').json
+    assert rebuilt['dataset_id'] not in (first['dataset_id'], monthly['dataset_id'])
+    assert upload(content, 'rtf.xlsx').json['dataset_id'] == rebuilt['dataset_id']
+
+def test_seller_gstin_csv_is_not_b2b(tmp_path):
+    path = tmp_path / 'sales.csv'
+    path.write_text('GSTIN,Invoice Date,Invoice No,Taxable Value,IGST,Place Of Supply\n'
+                    '29AICPN1083C1ZI,2025-05-02,INV-1,1000,180,07-Delhi\n'
+                    '29AICPN1083C1ZI,2025-05-03,INV-2,500,90,27-Maharashtra\n')
+    parsed = app.parse_uploaded_file(str(path), 'custom')
+    assert len(parsed['data']) == 2
+    assert parsed.get('b2b') is None or parsed['b2b'].empty
+
+def test_probe_rows_must_be_a_positive_number(tmp_path):
+    path = write_workbook(str(tmp_path / 'rtf.xlsx'), 5, 'rtf')
+    client = app.app.test_client()
+    
+    def probe(rows):
+        with open(path, 'rb') as f:
+            return client.post(f'/api/probe?rows={rows}', data={'file': (f, 'rtf.xlsx')})
+    
+    for rows in ('abc', '-3', '0', '2.5'):
+        response = probe(rows)
+        assert response.status_code == 400 and 'error' in response.json
+    assert probe('5').status_code == 200
+    assert probe('10000000').status_code == 200
+
+def test_unknown_csv_layout_is_refused():
+    response = upload(b'foo,bar\n1,2\n', 'report.csv', portal='custom')
+    assert response.status_code == 400
+    assert response.json['error'].startswith('Unrecognised CSV layout')
+    assert "'Taxable Value'" in response.json['error']
+
+def test_oversized_batch_is_refused_before_any_work(monkeypatch):
+    monkeypatch.setattr(app, 'MAX_BATCH_FILES', 2)
+    archive = io.BytesIO()
+    with zipfile.ZipFile(archive, 'w') as bundle:
+        bundle.writestr('a.csv', 'foo\n')
+        bundle.writestr('b.csv', 'foo\n')
+    archive.seek(0)
+    saved = set(os.listdir(app.UPLOAD_FOLDER))
+    response = app.app.test_client().post('/api/upload-batch', data={
+        'portal': 'custom', 'files': [(io.BytesIO(b'foo\n'), 'first.csv'), (archive, 'bundle.zip')]
+    }, content_type='multipart/form-data')
+    assert response.status_code == 400 and 'at most 2' in response.json['error']
+    assert set(os.listdir(app.UPLOAD_FOLDER)) == saved
+
+def start_chunked_upload(client, content, **form):
+    response = client.post('/api/upload/init', json={'filename': 'rtf.xlsx', 'portal': 'amazon', 'size': len(content), **form})
+    assert response.status_code == 200
+    return response.json['upload_id']
+
+def append_chunk(client, upload_id, chunk, offset, length=None):
+    return client.post(f'/api/upload/{upload_id}/append', input_stream=io.BytesIO(chunk), headers={
+        'Upload-Offset': str(offset), 'Content-Length': str(len(chunk) if length is None else length)
+    })
+
+def test_chunked_upload_resumes_after_a_dropped_chunk(tmp_path):
+    path = write_workbook(str(tmp_path / 'chunked.xlsx'), 40, 'rtf')
+    with open(path, 'rb') as f:
+        content = f.read()
+    client = app.app.test_client()
+    upload_id = start_chunked_upload(client, content)
+    half = len(content) // 2
+    
+    # The connection drops partway through the first chunk; the bytes that arrived are kept
+    dropped = append_chunk(client, upload_id, content[:1000], 0, length=half)
+    assert dropped.json['offset'] == 1000
+    assert client.get(f'/api/upload/{upload_id}').json['offset'] == 1000
+    assert append_chunk(client, upload_id, content[1000:half], 1000).json['offset'] == half
+    assert append_chunk(client, upload_id, content[half:], half).json['offset'] == len(content)
+    
+    response = client.post(f'/api/upload/{upload_id}/complete', json={'sha256': hashlib.sha256(content).hexdigest()})
+    assert response.status_code == 200
+    assert response.json['rows_processed'] == upload(content, 'chunked.xlsx').json['rows_processed'] > 0
+    assert client.get(f'/api/upload/{upload_id}').status_code == 404
+
+def test_chunk_at_the_wrong_offset_is_a_conflict():
+    client = app.app.test_client()
+    upload_id = start_chunked_upload(client, b'x' * 100)
+    append_chunk(client, upload_id, b'x' * 40, 0)
+    response = append_chunk(client, upload_id, b'x' * 40, 60)
+    assert response.status_code == 409
+    assert response.json['offset'] == 40
+
+def test_complete_with_the_wrong_sha256_discards_the_upload():
+    client = app.app.test_client()
+    upload_id = start_chunked_upload(client, b'x' * 100)
+    append_chunk(client, upload_id, b'x' * 100, 0)
+    response = client.post(f'/api/upload/{upload_id}/complete', json={'sha256': hashlib.sha256(b'y' * 100).hexdigest()})
+    assert response.status_code == 400
+    assert response.json['sha256'] == hashlib.sha256(b'x' * 100).hexdigest()
+    assert client.get(f'/api/upload/{upload_id}').status_code == 404
+
+def test_complete_of_an_unknown_upload_is_not_found():
+    response = app.app.test_client().post(f'/api/upload/{"0" * 32}/complete', json={})
+    assert response.status_code == 404
+    assert response.json == {'error': 'Upload not found'}
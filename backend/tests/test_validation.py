@@ -0,0 +1,35 @@
+"""Row-level validation of parsed detailed invoices"""
+from datetime import datetime
+
+from openpyxl import Workbook
+
+import app
+from benchmarks.generate import INVOICE_HEADER, SELLER_GSTIN
+
+def parse_invoices(path, rows):
+    """Write detailed invoice rows to a workbook at path and parse them"""
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.title = 'Invoices'
+    sheet.append(INVOICE_HEADER)
+    for row in rows:
+        sheet.append(row)
+    workbook.save(path)
+    return app.parse_amazon_file(str(path))
+
+def test_clean_intra_state_invoices_have_no_issues(tmp_path):
+    # CGST + SGST make up the slab: 2.5 + 2.5, 6 + 6, 9 + 9 and 14 + 14
+    records = parse_invoices(tmp_path / 'clean.xlsx', [
+        [datetime(2025, 5, 2), f'AMZ-{rate}', 6109, 'Shirt', 1, 1000, rate * 5, rate * 5, 0, 1000 + rate * 10, '29-Karnataka']
+        for rate in (5, 12, 18, 28)
+    ])
+    report = app.validation_report({'b2cs': records}, SELLER_GSTIN)
+    assert report.empty, report.to_dict('records')
+
+def test_intra_state_rate_off_the_slabs_is_an_error(tmp_path):
+    # 6.5% CGST + 6.5% SGST is 13%, which is no GST rate; 6.5 alone would not be one either
+    records = parse_invoices(tmp_path / 'off_slab.xlsx', [
+        [datetime(2025, 5, 2), 'AMZ-1', 6109, 'Shirt', 1, 1000, 65, 65, 0, 1130, '29-Karnataka']
+    ])
+    report = app.validation_report({'b2cs': records}, SELLER_GSTIN)
+    assert report[['row', 'code', 'value']].to_dict('records') == [{'row': 1, 'code': 'rate_slab', 'value': '13'}]
@@ -26,6 +26,55 @@ const API_BASE_URL = process.env.REACT_APP_API_URL || 'http://localhost:5000/api
 // Debug: Log the API URL being used
 console.log('Using API URL:', API_BASE_URL);
 
+// Uploads and B2B generation run as background jobs on the server; poll until one finishes
+const waitForJob = async (jobId) => {
+  for (;;) {
+    const { data: job } = await axios.get(`${API_BASE_URL}/jobs/${jobId}`);
+    if (job.status === 'done') {
+      return job.result;
+    }
+    if (job.status === 'failed' || job.status === 'cancelled') {
+      throw new Error(job.error || `Job ${job.status}`);
+    }
+    await new Promise((resolve) => setTimeout(resolve, 1000));
+  }
+};
+
+// Files above this size go up in chunks, which survive a dropped connection
+const CHUNKED_UPLOAD_THRESHOLD = 25 * 1024 * 1024;
+const CHUNK_RETRIES = 5;
+
+// Send a file through /upload/init, /append and /complete, resuming from the server's offset after a failure
+const uploadInChunks = async (file, fields) => {
+  const { data: session } = await axios.post(`${API_BASE_URL}/upload/init`, {
+    ...fields,
+    filename: file.name,
+    size: file.size,
+  });
+  let offset = 0;
+  let failures = 0;
+  while (offset < file.size) {
+    try {
+      const { data } = await axios.post(
+        `${API_BASE_URL}/upload/${session.upload_id}/append`,
+        file.slice(offset, offset + session.chunk_bytes),
+        { headers: { 'Content-Type': 'application/octet-stream', 'Upload-Offset': String(offset) } },
+      );
+      offset = data.offset;
+      failures = 0;
+    } catch (err) {
+      failures += 1;
+      if (failures > CHUNK_RETRIES || (err.response && err.response.status !== 409)) {
+        throw err;
+      }
+      await new Promise((resolve) => setTimeout(resolve, 1000 * failures));
+      const { data } = await axios.get(`${API_BASE_URL}/upload/${session.upload_id}`);
+      offset = data.offset;
+    }
+  }
+  return axios.post(`${API_BASE_URL}/upload/${session.upload_id}/complete`);
+};
+
 function B2CSales() {
   const [portal, setPortal] = useState('amazon');
   const [uploadedFiles, setUploadedFiles] = useState([]);
@@ -34,7 +83,6 @@ function B2CSales() {
   const [success, setSuccess] = useState(null);
   const [csvFilename, setCsvFilename] = useState(null);
   const [b2bFilename, setB2bFilename] = useState(null);
-  const [previewData, setPreviewData] = useState([]);
   const [b2csRowCount, setB2csRowCount] = useState(0);
   const [b2bRowCount, setB2bRowCount] = useState(0);
   const [b2csTaxableValue, setB2csTaxableValue] = useState(0);
@@ -50,35 +98,52 @@ function B2CSales() {
     setLoading(true);
 
     try {
-      const formData = new FormData();
-      formData.append('file', file);
-      formData.append('portal', portal);
-
       console.log('Uploading to:', `${API_BASE_URL}/upload`);
 
-      const response = await axios.post(`${API_BASE_URL}/upload`, formData, {
-        headers: {
-          'Content-Type': 'multipart/form-data',
-        },
-      });
+      let response;
+      if (file.size > CHUNKED_UPLOAD_THRESHOLD) {
+        response = await uploadInChunks(file, { portal, async: 'true' });
+      } else {
+        const formData = new FormData();
+        formData.append('file', file);
+        formData.append('portal', portal);
+        formData.append('async', 'true');
+
+        response = await axios.post(`${API_BASE_URL}/upload`, formData, {
+          headers: {
+            'Content-Type': 'multipart/form-data',
+          },
+        });
+      }
+      // Repeat uploads are answered straight from the server's cache
+      const result = response.data.job_id ? await waitForJob(response.data.job_id) : response.data;
 
-      if (response.data.success) {
-        const reportFreq = response.data.report_frequency || 'monthly';
-        setSuccess(`File uploaded successfully! ${response.data.rows_processed} rows processed. (${reportFreq} report)`);
+      if (result.success) {
+        const reportFreq = result.report_frequency || 'monthly';
+        setSuccess(`File uploaded successfully! ${result.rows_processed} rows processed. (${reportFreq} report)`);
         setUploadedFiles([...uploadedFiles, {
-          filename: response.data.filename,
+          filename: result.filename,
           portal,
           originalName: file.name,
-          rows: response.data.rows_processed,
+          rows: result.rows_processed,
           reportFrequency: reportFreq,
-          gstin: response.data.gstin, // Store GSTIN
+          gstin: result.gstin, // Store GSTIN
+          datasetId: result.dataset_id, // Parsed data is kept server-side under this id
         }]);
-        setPreviewData(response.data.data);
-        
+
+        // Totals come from the dataset's summary index, so they show before any CSV is generated
+        const { data: summary } = await axios.get(`${API_BASE_URL}/summary`, {
+          params: { dataset_id: result.dataset_id, group_by: 'section,state_code,rate' },
+        });
+        setB2csRowCount(summary.groups.filter((group) => group.section === 'b2cs').length);
+        setB2csTaxableValue(summary.sections.b2cs.taxable_value);
+        setB2bRowCount(summary.sections.b2b.records);
+        setB2bTaxableValue(summary.sections.b2b.taxable_value);
+
         // Show debug info if available
-        if (response.data.debug_info && response.data.debug_info.length > 0) {
-          console.log('Debug Info:', response.data.debug_info);
-          alert('Debug Info:\n' + response.data.debug_info.join('\n'));
+        if (result.debug_info && result.debug_info.length > 0) {
+          console.log('Debug Info:', result.debug_info);
+          alert('Debug Info:\n' + result.debug_info.join('\n'));
         }
       }
     } catch (err) {
@@ -97,7 +162,6 @@ function B2CSales() {
     onDrop,
     accept: {
       'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet': ['.xlsx'],
-      'application/vnd.ms-excel': ['.xls'],
       'text/csv': ['.csv'],
     },
     multiple: false,
@@ -118,8 +182,11 @@ function B2CSales() {
       const reportFreq = uploadedFiles[0]?.reportFrequency || 'monthly';
       const gstin = uploadedFiles[0]?.gstin || null;
       
+      const datasetId = uploadedFiles[0]?.datasetId;
+      
       const response = await axios.post(`${API_BASE_URL}/generate-csv`, {
-        data: previewData, // In production, this would be the full merged data
+        // Send the server-side dataset id; the parsed records never leave the server
+        dataset_id: datasetId,
         report_frequency: reportFreq,
         gstin: gstin, // Include GSTIN in request
       });
@@ -153,19 +220,22 @@ function B2CSales() {
       const gstin = uploadedFiles[0]?.gstin || null;
       
       const response = await axios.post(`${API_BASE_URL}/generate-b2b`, {
+        dataset_id: uploadedFiles[0].datasetId,
         filename: uploadedFiles[0].filename,
         report_frequency: reportFreq,
         gstin: gstin, // Include GSTIN in request
+        async: true,
       });
+      const result = response.data.job_id ? await waitForJob(response.data.job_id) : response.data;
 
-      if (response.data.success) {
-        setSuccess(`B2B CSV generated successfully! ${response.data.rows} rows.`);
-        setB2bFilename(response.data.filename);
-        setB2bRowCount(response.data.rows || 0);
-        setB2bTaxableValue(response.data.total_taxable_value || 0);
+      if (result.success) {
+        setSuccess(`B2B CSV generated successfully! ${result.rows} rows.`);
+        setB2bFilename(result.filename);
+        setB2bRowCount(result.rows || 0);
+        setB2bTaxableValue(result.total_taxable_value || 0);
       }
     } catch (err) {
-      setError(err.response?.data?.error || 'Failed to generate B2B CSV');
+      setError(err.response?.data?.error || err.message || 'Failed to generate B2B CSV');
     } finally {
       setLoading(false);
     }
@@ -226,7 +296,6 @@ function B2CSales() {
   const handleRemoveFile = (filename) => {
     setUploadedFiles(uploadedFiles.filter(f => f.filename !== filename));
     if (uploadedFiles.length === 1) {
-      setPreviewData([]);
       // Clear generated CSV states
       setCsvFilename(null);
       setB2bFilename(null);
@@ -299,7 +368,7 @@ function B2CSales() {
               or click to browse
             </Typography>
             <Typography variant="caption" color="text.secondary" sx={{ display: 'block', mt: 1 }}>
-              Supports: .xlsx, .xls, .csv
+              Supports: .xlsx, .csv
             </Typography>
           </Box>
 